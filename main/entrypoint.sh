@@ -13,6 +13,7 @@ fi
 
 python manage.py flush --no-input
 python manage.py migrate
+python manage.py createcachetable
 python manage.py collectstatic --no-input --clear
 python manage.py createsuperuser --no-input --clear
 
@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for serving the ASGI application with uvicorn workers:
+
+    gunicorn main.asgi:application -c gunicorn_asgi.py
+
+Each worker runs an event loop that handles many connections at once. The
+database work does not overlap, though: Django 4.2 runs the async ORM, and
+sync views, through thread-sensitive sync_to_async, one call at a time per
+worker. Queries across workers run in parallel as usual.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+# One event loop per core; each runs one query at a time (see above)
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Read by the app at startup to check the response cache is safe to share
+os.environ["WEB_CONCURRENCY"] = str(workers)
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = timeout
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG")
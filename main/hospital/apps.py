@@ -1,6 +1,33 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_indexes(using, **kwargs):
+    # Migrations that rebuild a SQLite table drop its search triggers with it
+    from .search import install_search_indexes
+
+    install_search_indexes(connections[using])
 
 
 class HospitalConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "hospital"
+
+    def ready(self):
+        from .availability import track_availability_writes
+        from .cache import check_version_cache, track_writes
+
+        check_version_cache()
+        track_writes()
+        track_availability_writes()
+        post_migrate.connect(ensure_search_indexes, sender=self)
+        from .metrics import install_query_timer
+
+        connection_created.connect(install_query_timer)
+        if getattr(settings, "DASHBOARD_COUNTERS", False):
+            from .dashboard import connect_counter_signals
+
+            connect_counter_signals()
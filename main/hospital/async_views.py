@@ -0,0 +1,121 @@
+"""
+Async read endpoints for doctors, patients and appointments.
+
+They return the same payloads as the GET handlers in views.py, but are
+plain Django views with async handlers for an ASGI server (see
+gunicorn_asgi.py). Counts and lookups use acount()/aget(); pages are
+evaluated with async for, which runs the query and its prefetches in a
+thread. In Django 4.2 every async ORM call goes through thread-sensitive
+sync_to_async, so a worker process still runs one query at a time: while
+a query runs, the event loop can accept connections and read or write other
+requests, but their queries wait for it. Database concurrency comes from
+the number of workers, as with sync workers.
+"""
+
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound, ParseError
+from rest_framework.request import Request
+
+from .models import Appointment, Patient
+from .pagination import APPOINTMENT_ORDERING, HospitalPagination, KeysetPagination
+from .renderers import FastJSONRenderer
+from .serializers import AppointmentSerializer, DoctorSerializer, PatientSerializer
+from .views import DoctorAPIView, PatientAPIView, filter_dates
+
+
+def render_json(data, status=200):
+    return HttpResponse(
+        FastJSONRenderer().render(data), status=status, content_type="application/json"
+    )
+
+
+class AsyncListView(View):
+    """
+    Subclasses set queryset, or override get_queryset to filter on the
+    request, and serializer_class
+    """
+
+    pagination_class = HospitalPagination
+    queryset = None
+    serializer_class = None
+
+    async def get_queryset(self):
+        # all() so each request gets a fresh, unevaluated queryset
+        return self.queryset.all()
+
+    async def get(self, request, *args, **kwargs):
+        # DRF's paginators read query_params, which needs a DRF request
+        request = Request(request)
+        try:
+            queryset = await self.get_queryset()
+            paginator = self.get_paginator()
+            page = await paginator.apaginate_queryset(queryset, request, view=self)
+        except APIException as error:
+            return render_json({"detail": error.detail}, status=error.status_code)
+        data = self.get_serializer(page).data
+        return render_json(paginator.get_paginated_response(data).data)
+
+    def get_paginator(self):
+        return self.pagination_class()
+
+    def get_serializer(self, page):
+        return self.serializer_class(page, many=True)
+
+
+class AsyncSparseListView(AsyncListView):
+    """A list whose serializer takes ?fields= and ?expand= like the sync view"""
+
+    def get_selection(self):
+        # Stored for get_serializer, which runs after get_queryset
+        self.fields, self.expand = self.serializer_class.get_selection(self.request.GET)
+        return self.fields, self.expand
+
+    def get_serializer(self, page):
+        return self.serializer_class(
+            page,
+            many=True,
+            fields=self.fields,
+            expand=self.expand,
+            context={"request": self.request},
+        )
+
+
+class AsyncDoctorView(AsyncSparseListView):
+    serializer_class = DoctorSerializer
+
+    async def get_queryset(self):
+        # Same filters as the sync view; building a queryset runs no query
+        view = DoctorAPIView(request=self.request, kwargs=self.kwargs)
+        return DoctorSerializer.setup_eager_loading(
+            view.get_queryset(), *self.get_selection()
+        )
+
+
+class AsyncPatientView(AsyncSparseListView):
+    serializer_class = PatientSerializer
+
+    async def get_queryset(self):
+        view = PatientAPIView(request=self.request, kwargs=self.kwargs)
+        return PatientSerializer.setup_eager_loading(
+            view.get_queryset(), *self.get_selection()
+        )
+
+
+class AsyncAppointmentView(AsyncListView):
+    queryset = Appointment.objects.all()
+    serializer_class = AppointmentSerializer
+
+    def get_paginator(self):
+        return KeysetPagination(APPOINTMENT_ORDERING)
+
+    async def get_queryset(self):
+        try:
+            patient = await Patient.objects.only("id").aget(slug=self.kwargs["slug"])
+        except Patient.DoesNotExist:
+            raise NotFound("Patient not found")
+        try:
+            queryset = await super().get_queryset()
+            return filter_dates(queryset.filter(patient=patient), self.request, "date")
+        except ValueError:
+            raise ParseError("from and to must be dates (YYYY-MM-DD)")
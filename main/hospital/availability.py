@@ -0,0 +1,266 @@
+"""
+In-memory index of doctors' weekly availability.
+
+Slots are keyed by (doctor_id, weekday) and held as sorted, merged
+[start, end) time-of-day intervals, so checking whether a datetime falls
+inside a slot is a bisect. A doctor's rows are loaded on first use; an
+update through DoctorAPIView rebuilds only the weekdays it changed and
+records the version it bumped to, so the next lookup keeps the rest.
+
+The index is per process, so each doctor also has an availability version
+in the shared version cache (see hospital.cache), bumped after every
+committed change to their rows. A lookup reads that version and reloads the
+doctor from the database when it differs from the one their slots were
+loaded at, or was evicted, so writes made by any worker are seen by the
+next booking in every other. Without a version cache every lookup reloads.
+"""
+
+import threading
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .cache import entity_versions, invalidate
+from .enum import DayOfWeek
+from .models import DoctorAvailability
+
+
+def _version_entity(doctor_id):
+    return f"availability:{doctor_id}"
+
+
+def availability_version(doctor_id):
+    """The doctor's shared availability version, None without a version cache"""
+    versions = entity_versions(_version_entity(doctor_id))
+    return versions[0] if versions else None
+
+
+def availability_changed(doctor_id):
+    """Bump the doctor's availability version once the transaction commits"""
+    transaction.on_commit(lambda: invalidate(_version_entity(doctor_id)))
+
+
+def _row_written(sender, instance, **kwargs):
+    availability_changed(instance.doctor_id)
+
+
+def track_availability_writes():
+    # Single-row saves and deletes, such as the admin's or a cascade from
+    # the doctor; bulk writes call availability_changed() themselves
+    post_save.connect(_row_written, sender=DoctorAvailability)
+    post_delete.connect(_row_written, sender=DoctorAvailability)
+
+
+def _time_of_day(value):
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.time()
+
+
+def _merge(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def weekly_slots(availabilities):
+    """
+    {weekday: (sorted starts, matching ends)} of merged time-of-day
+    intervals for the given DoctorAvailability rows
+    """
+    by_day = {}
+    for availability in availabilities:
+        start = _time_of_day(availability.start_time)
+        end = _time_of_day(availability.end_time)
+        if end > start:
+            by_day.setdefault(availability.day, []).append((start, end))
+        else:
+            # Overnight shift: runs to midnight and carries into the next day
+            next_day = availability.day % 7 + 1
+            by_day.setdefault(availability.day, []).append((start, time.max))
+            by_day.setdefault(next_day, []).append((time.min, end))
+    slots = {}
+    for day, intervals in by_day.items():
+        merged = _merge(intervals)
+        slots[day] = ([start for start, _ in merged], [end for _, end in merged])
+    return slots
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (doctor_id, day) -> (sorted starts, matching ends)
+        self._slots = {}
+        # doctor_id -> availability version the slots were loaded at
+        self._doctors = {}
+
+    def clear(self):
+        with self._lock:
+            self._slots.clear()
+            self._doctors.clear()
+
+    def discard(self, doctor_id):
+        with self._lock:
+            self._discard(doctor_id)
+
+    def _discard(self, doctor_id):
+        self._doctors.pop(doctor_id, None)
+        for key in [key for key in self._slots if key[0] == doctor_id]:
+            del self._slots[key]
+
+    def set_doctor(self, doctor_id, availabilities, version=None):
+        """
+        Replace a doctor's slots with the given DoctorAvailability rows, read
+        at the given availability version
+        """
+        slots = weekly_slots(availabilities)
+        with self._lock:
+            self._discard(doctor_id)
+            for day, day_slots in slots.items():
+                self._slots[(doctor_id, day)] = day_slots
+            self._doctors[doctor_id] = version
+
+    def refresh_days(self, doctor_id, availabilities, days, previous, version):
+        """
+        Rebuild only the given weekdays of a loaded doctor from their full,
+        current list of DoctorAvailability rows, written when the shared
+        version was previous and bumped to version since. The doctor's other
+        days are only known to be current if they were loaded at previous;
+        otherwise they keep their old version and the next lookup reloads.
+        """
+        slots = weekly_slots(availabilities)
+        with self._lock:
+            if doctor_id not in self._doctors:
+                return
+            for day in days:
+                if day in slots:
+                    self._slots[(doctor_id, day)] = slots[day]
+                else:
+                    self._slots.pop((doctor_id, day), None)
+            if self._doctors[doctor_id] == previous:
+                self._doctors[doctor_id] = version
+
+    def load(self, doctor_id, version=None):
+        if version is None:
+            version = availability_version(doctor_id)
+        # The version is read before the rows: a change committed in between
+        # leaves it stale, and the next lookup loads the rows again
+        self.set_doctor(
+            doctor_id, DoctorAvailability.objects.filter(doctor_id=doctor_id), version
+        )
+
+    def is_available(self, doctor_id, moment, minutes=0):
+        """
+        Whether moment falls inside one of the doctor's weekly slots; given
+        minutes, whether all of [moment, moment + minutes) does
+        """
+        version = availability_version(doctor_id)
+        if version is None or self._doctors.get(doctor_id) != version:
+            self.load(doctor_id, version)
+        slots = self._slots.get((doctor_id, moment.isoweekday()))
+        if slots is None:
+            return False
+        starts, ends = slots
+        moment_time = _time_of_day(moment)
+        position = bisect_right(starts, moment_time) - 1
+        if position < 0:
+            return False
+        end = ends[position]
+        if not minutes:
+            return moment_time < end
+        # On one arbitrary day, with time.max standing for the next midnight
+        finish = datetime.combine(date.min, moment_time) + timedelta(minutes=minutes)
+        if end == time.max:
+            return finish <= datetime.combine(date.min + timedelta(days=1), time.min)
+        return finish <= datetime.combine(date.min, end)
+
+
+availability_index = AvailabilityIndex()
+
+
+def parse_availability(availability_data):
+    """
+    Map a {"monday": {"start_time": ..., "end_time": ...}} payload to
+    {day: (start_time, end_time)}; raises ValueError on malformed input.
+    """
+    start_field = DoctorAvailability._meta.get_field("start_time")
+    end_field = DoctorAvailability._meta.get_field("end_time")
+    schedule = {}
+    try:
+        for day, timing in availability_data.items():
+            start = start_field.to_python(timing["start_time"])
+            end = end_field.to_python(timing["end_time"])
+            if timezone.is_naive(start):
+                start = timezone.make_aware(start)
+            if timezone.is_naive(end):
+                end = timezone.make_aware(end)
+            schedule[DayOfWeek.from_string(day).value] = (start, end)
+    except (AttributeError, KeyError, TypeError, ValidationError) as error:
+        raise ValueError("Invalid availability data") from error
+    return schedule
+
+
+def update_availability(doctor_id, schedule):
+    """
+    Make the doctor's rows match schedule with the fewest writes: one UPDATE
+    for days whose times changed, one DELETE for days dropped (and duplicate
+    rows), one INSERT for new days. Call inside a transaction. Returns the
+    weekdays that changed.
+    """
+    existing = {}
+    to_delete = []
+    for availability in DoctorAvailability.objects.filter(doctor_id=doctor_id):
+        if availability.day in existing or availability.day not in schedule:
+            to_delete.append(availability)
+        else:
+            existing[availability.day] = availability
+
+    now = timezone.now()
+    to_update, to_create = [], []
+    for day, (start, end) in schedule.items():
+        availability = existing.get(day)
+        if availability is None:
+            to_create.append(
+                DoctorAvailability(
+                    doctor_id=doctor_id, day=day, start_time=start, end_time=end
+                )
+            )
+        elif (availability.start_time, availability.end_time) != (start, end):
+            availability.start_time, availability.end_time = start, end
+            availability.updated_at = now
+            to_update.append(availability)
+
+    if to_delete:
+        DoctorAvailability.objects.filter(
+            id__in=[availability.id for availability in to_delete]
+        ).delete()
+    if to_update:
+        DoctorAvailability.objects.bulk_update(
+            to_update, ["start_time", "end_time", "updated_at"]
+        )
+    if to_create:
+        DoctorAvailability.objects.bulk_create(to_create)
+
+    changed = {availability.day for availability in to_delete + to_update + to_create}
+    if changed:
+        # Read under the caller's lock on the doctor, so it is the version
+        # of the rows this update started from
+        previous = availability_version(doctor_id)
+        rows = list(existing.values()) + to_create
+        # An overnight shift also covers the start of the next day
+        days = changed | {day % 7 + 1 for day in changed}
+
+        def refresh():
+            version = invalidate(_version_entity(doctor_id))
+            availability_index.refresh_days(doctor_id, rows, days, previous, version)
+
+        transaction.on_commit(refresh)
+    return changed
@@ -0,0 +1,241 @@
+"""
+Repeatable endpoint benchmarks.
+
+Each scenario is a GET against a real route in hospital/urls.py, with the
+slugs filled in from the current database (see hospital.dataset for
+generating one). A scenario is sent `requests` times, after `warmup`
+unmeasured requests, and reports throughput, latency percentiles and
+queries per request.
+
+In-process runs go through Django's test client and the full middleware
+stack, without a server or network, so they are dominated by the code under
+test. HTTP runs drive a running deployment with hospital.loadtest. Both
+read the query count from the Server-Timing header that
+PerformanceMiddleware adds to one extra request. Results are plain JSON, so
+runs can be stored and compared.
+"""
+
+import asyncio
+import platform
+import re
+import time
+from datetime import timedelta
+from urllib.request import urlopen
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from .flat import doctor_rows, patient_rows, serialize_doctors, serialize_patients
+from .loadtest import run, summarize
+from .models import Appointment, Department, Doctor, MedicalHistory, Patient
+from .renderers import FastJSONRenderer
+from .serializers import DoctorSerializer, PatientSerializer
+
+# name -> path; {doctor}, {patient}, {ward}, {today} and {fortnight} (the last
+# day of two weeks from today) are filled in per run
+SCENARIOS = {
+    "department-list": "/api/department/",
+    "department-dashboard": "/api/department/dashboard/?days=7",
+    "doctor-list": "/api/doctor/",
+    "doctor-list-expanded": "/api/doctor/?expand={doctor_relations}",
+    "doctor-list-cursor": "/api/doctor/?cursor=",
+    "doctor-search": "/api/doctor/?search=smith",
+    "doctor-detail": "/api/doctor/{doctor}/?expand={doctor_relations}",
+    "doctor-slots": "/api/doctor/{doctor}/slots/?from={today}&to={fortnight}",
+    "doctor-patients": "/api/doctor/{doctor}/patients/",
+    "patient-list": "/api/patient/",
+    "patient-list-expanded": "/api/patient/?expand={patient_relations}",
+    "patient-list-no-count": "/api/patient/?count=false",
+    "patient-search": "/api/patient/?search=patel",
+    "patient-detail": "/api/patient/{patient}/?expand={patient_relations}",
+    "patient-appointments": "/api/patient/{patient}/appointments/",
+    "patient-batch": "/api/patient/batch/?slugs={ward}&expand={patient_relations}",
+}
+# Patients fetched together by the batch scenario, a ward's worth
+WARD_SIZE = 25
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def scenario_paths(names=None):
+    """{name: path} for the selected scenarios, all of them by default"""
+    unknown = set(names or ()) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    # The busiest doctor and a patient with appointments exercise the most code
+    patient = (
+        Patient.objects.filter(appointment__isnull=False, doctor__isnull=False)
+        .select_related("doctor")
+        .order_by("id")
+        .first()
+    )
+    if patient is None:
+        raise ValueError(
+            "The database has no patients with appointments; "
+            "run generate_dataset first"
+        )
+    today = timezone.localdate()
+    values = {
+        "doctor": patient.doctor.slug,
+        "patient": patient.slug,
+        "ward": ",".join(
+            Patient.objects.order_by("id").values_list("slug", flat=True)[:WARD_SIZE]
+        ),
+        "today": today.isoformat(),
+        "fortnight": (today + timedelta(days=13)).isoformat(),
+        "doctor_relations": ",".join(DoctorSerializer.expandable_fields),
+        "patient_relations": ",".join(PatientSerializer.expandable_fields),
+    }
+    return {
+        name: path.format(**values)
+        for name, path in SCENARIOS.items()
+        if not names or name in names
+    }
+
+
+def dataset_size():
+    return {
+        model._meta.model_name: model.objects.count()
+        for model in (Department, Doctor, Patient, MedicalHistory, Appointment)
+    }
+
+
+def environment():
+    """What a result depends on besides the code: versions, database, size"""
+    return {
+        "timestamp": timezone.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "rows": dataset_size(),
+        "page_size": settings.REST_FRAMEWORK["PAGE_SIZE"],
+        "response_cache": settings.RESPONSE_CACHE_ALIAS,
+    }
+
+
+def queries_per_request(server_timing):
+    """Query count from PerformanceMiddleware's header; None without it"""
+    match = SERVER_TIMING_QUERIES.search(server_timing)
+    return int(match.group(1)) if match else None
+
+
+def run_in_process(path, requests, warmup):
+    client = Client()
+    for _ in range(warmup):
+        client.get(path)
+    queries = queries_per_request(client.get(path).get("Server-Timing", ""))
+
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        response = client.get(path)
+        if response.status_code < 400:
+            latencies.append(time.perf_counter() - request_started)
+        else:
+            errors += 1
+    result = summarize(latencies, errors, time.perf_counter() - started)
+    result["queries"] = queries
+    return result
+
+
+def run_http(base_url, path, requests, warmup, concurrency):
+    url = base_url.rstrip("/") + path
+    if warmup:
+        asyncio.run(run(url, warmup, min(concurrency, warmup)))
+    with urlopen(url) as response:
+        queries = queries_per_request(response.headers.get("Server-Timing", ""))
+    result = asyncio.run(run(url, requests, concurrency))
+    result["queries"] = queries
+    return result
+
+
+def best_time(function, repeat):
+    """Fastest of `repeat` calls in ms, with the last call's result"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return round(min(times) * 1000, 2), result
+
+
+def serialization_benchmark(limit=None, repeat=5):
+    """
+    One page of doctors and one of patients, with every relation expanded,
+    built and encoded both ways: model instances through
+    DoctorSerializer/PatientSerializer and DRF's JSONRenderer, and .values()
+    rows through hospital.flat and FastJSONRenderer. Queries are included in
+    the build times. "identical" compares the encoded bytes.
+    """
+    limit = limit or settings.REST_FRAMEWORK["PAGE_SIZE"]
+    paths = {
+        "doctor": (Doctor, DoctorSerializer, doctor_rows, serialize_doctors),
+        "patient": (Patient, PatientSerializer, patient_rows, serialize_patients),
+    }
+    results = {}
+    for name, (model, serializer_class, rows, serialize) in paths.items():
+        queryset = model.objects.order_by("created_at", "id")
+        # The full payload, every relation expanded
+        fields, expand = None, serializer_class.expandable_fields
+        eager = serializer_class.setup_eager_loading(queryset, fields, expand)
+        serializer_ms, data = best_time(
+            lambda: serializer_class(
+                list(eager[:limit]), many=True, expand=expand
+            ).data,
+            repeat,
+        )
+        flat_ms, flat_data = best_time(
+            lambda: serialize(
+                list(rows(queryset, fields, expand)[:limit]), fields, expand
+            ),
+            repeat,
+        )
+        json_ms, encoded = best_time(lambda: JSONRenderer().render(data), repeat)
+        fast_ms, fast_encoded = best_time(
+            lambda: FastJSONRenderer().render(flat_data), repeat
+        )
+        results[name] = {
+            "rows": len(data),
+            "serializer_ms": serializer_ms,
+            "flat_ms": flat_ms,
+            "json_renderer_ms": json_ms,
+            "fast_renderer_ms": fast_ms,
+            "speedup": (
+                round((serializer_ms + json_ms) / (flat_ms + fast_ms), 1)
+                if flat_ms + fast_ms
+                else None
+            ),
+            "identical": encoded == fast_encoded,
+        }
+    return results
+
+
+def compare(results, baseline):
+    """
+    Relative change per scenario against an earlier run: positive rps and
+    negative latency changes are improvements.
+    """
+    changes = {}
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes[name] = {
+            key: (
+                round((result[key] - before[key]) / before[key] * 100, 1)
+                if result.get(key) is not None and before.get(key)
+                else None
+            )
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+        }
+        changes[name]["queries"] = (
+            None
+            if result.get("queries") is None or before.get("queries") is None
+            else result["queries"] - before["queries"]
+        )
+    return changes
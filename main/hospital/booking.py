@@ -0,0 +1,112 @@
+"""
+Appointment booking engine.
+
+The day is cut into fixed-length slots (settings.APPOINTMENT_SLOT_MINUTES)
+and each slot has APPOINTMENT_SLOT_CAPACITY numbered seats. A booking takes
+the first free seat of its slot. The (doctor, slot_start, seat) unique
+constraint makes double-booking impossible at the database level, and the
+doctor row is locked for the duration of the booking. Bookings for the same
+doctor are therefore serialized, while bookings for different doctors never
+wait on each other.
+"""
+
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+
+from .availability import availability_index
+from .models import Appointment, Doctor
+
+
+class BookingError(Exception):
+    status_code = 400
+
+
+class DoctorUnavailable(BookingError):
+    pass
+
+
+class SlotFull(BookingError):
+    status_code = 409
+
+
+class BookingConflict(BookingError):
+    status_code = 409
+
+
+class BookingBusy(BookingError):
+    status_code = 503
+
+
+def get_slot_start(moment):
+    """Start of the slot that contains moment"""
+    slot_minutes = settings.APPOINTMENT_SLOT_MINUTES
+    minutes = moment.hour * 60 + moment.minute
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start + timedelta(minutes=minutes - minutes % slot_minutes)
+
+
+def book_appointment(patient, moment, details):
+    """Book patient with their doctor in the slot containing moment"""
+    if patient.doctor_id is None:
+        raise BookingError("Patient has no assigned doctor")
+
+    slot_start = get_slot_start(moment)
+    for attempt in range(settings.APPOINTMENT_BOOKING_RETRIES):
+        try:
+            # The whole slot must lie inside the schedule, as in free_slots()
+            if not availability_index.is_available(
+                patient.doctor_id, slot_start, settings.APPOINTMENT_SLOT_MINUTES
+            ):
+                raise DoctorUnavailable("Doctor is not available at the requested time")
+            return _book_seat(patient, moment, slot_start, details)
+        except OperationalError:
+            # Lock contention (a deadlock victim, or a busy SQLite database)
+            time.sleep(random.uniform(0, min(0.01 * 2**attempt, 0.1)))
+    raise BookingBusy("Too many concurrent bookings, please retry")
+
+
+def _book_seat(patient, moment, slot_start, details):
+    capacity = settings.APPOINTMENT_SLOT_CAPACITY
+    with transaction.atomic():
+        # Row lock on the doctor serializes bookings per doctor
+        list(
+            Doctor.objects.select_for_update()
+            .filter(pk=patient.doctor_id)
+            .values_list("pk")
+        )
+        booked = Appointment.objects.filter(
+            doctor_id=patient.doctor_id, slot_start=slot_start
+        ).values_list("patient_id", "seat")
+
+        taken = set()
+        for patient_id, seat in booked:
+            if patient_id == patient.id:
+                raise BookingConflict("Patient already has an appointment in this slot")
+            taken.add(seat)
+
+        for seat in range(capacity):
+            if seat in taken:
+                continue
+            try:
+                with transaction.atomic():
+                    return Appointment.objects.create(
+                        patient=patient,
+                        doctor_id=patient.doctor_id,
+                        date=moment,
+                        slot_start=slot_start,
+                        seat=seat,
+                        details=details,
+                    )
+            except IntegrityError:
+                # Taken concurrently on a backend without row locks; try the next seat
+                if Appointment.objects.filter(
+                    patient=patient, slot_start=slot_start
+                ).exists():
+                    raise BookingConflict(
+                        "Patient already has an appointment in this slot"
+                    )
+        raise SlotFull("No free seats left in the requested slot")
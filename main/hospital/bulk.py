@@ -0,0 +1,308 @@
+"""
+Bulk patient import and export.
+
+Uploads are read line by line and handled in fixed-size batches, so memory
+use depends on the batch size rather than on the size of the upload. Each
+batch resolves its doctor references with one query and inserts patients
+and medical histories with one bulk_create each inside its own
+transaction; slugs are allocated without touching the database. A batch
+the database rejects is saved again row by row to find the rows at fault.
+The upload is first copied to a spooled temporary file and checked, so one
+that is not valid UTF-8 is rejected as a whole, naming the first bad line,
+before any batch commits.
+
+Exports walk the patient table with iterator(chunk_size=...), which uses a
+server-side cursor on PostgreSQL, and load doctors, medical histories and
+appointments in bulk for each chunk. Rows are yielded as they are encoded.
+"""
+
+import csv
+import json
+import tempfile
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import Prefetch, Q
+
+from .models import Appointment, Doctor, MedicalHistory, Patient
+
+PATIENT_FIELDS = ("name", "age", "gender", "contact_information")
+HISTORY_FIELDS = ("previous_diagnoses", "allergies", "medications")
+EXPORT_COLUMNS = (
+    ("slug", "name", "age", "gender", "contact_information", "doctor")
+    + HISTORY_FIELDS
+    + ("appointments",)
+)
+
+
+# Uploads up to this size are spooled in memory, larger ones on disk
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+class ImportRowError(Exception):
+    pass
+
+
+class UndecodableLine(Exception):
+    def __init__(self, line_number):
+        super().__init__(f"Line {line_number} is not valid UTF-8")
+        self.line_number = line_number
+
+
+def decode_line(line, line_number):
+    try:
+        return line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+    except UnicodeDecodeError:
+        raise UndecodableLine(line_number)
+
+
+def decode_lines(lines):
+    """Decode a stream of byte lines as UTF-8, skipping a leading byte order mark"""
+    for line_number, line in enumerate(lines, start=1):
+        yield decode_line(line, line_number)
+
+
+def spool_upload(lines, max_size=SPOOL_MAX_SIZE):
+    """
+    Copy a stream of byte lines to a temporary file, rewound, checking that
+    each one decodes; raises UndecodableLine for the first that does not.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            decode_line(line, line_number)
+            spool.write(line)
+    except UndecodableLine:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def parse_jsonl(lines):
+    """Yield (line number, row) for each JSON object in a JSON Lines stream"""
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, ImportRowError("Invalid JSON")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ImportRowError("Expected a JSON object")
+            continue
+        yield line_number, row
+
+
+def parse_csv(lines):
+    """
+    Yield (line number, row) for each CSV record; medical history columns
+    are folded into a nested medical_history object like the JSON payload.
+    Blank cells are kept as empty strings; a record with every history cell
+    blank, like a JSON row without medical_history, has no history.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        # Cells missing from a short record are None
+        history = {
+            field: row.pop(field)
+            for field in HISTORY_FIELDS
+            if row.get(field) is not None
+        }
+        if any(history.values()):
+            row["medical_history"] = history
+        if not row.get("assigned_doctor"):
+            row.pop("assigned_doctor", None)
+        yield reader.line_num, row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class PatientImporter:
+    def __init__(self, batch_size=500, max_errors=1000):
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.failed += 1
+        # Keep the report bounded however broken the upload is
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": line_number, "error": message})
+
+    def run(self, rows):
+        for batch in batched(rows, self.batch_size):
+            self.import_batch(batch)
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+    def resolve_doctors(self, batch):
+        """Map every assigned_doctor reference (id or slug) in the batch to a doctor id"""
+        references = {
+            str(row["assigned_doctor"])
+            for _, row in batch
+            if isinstance(row, dict) and row.get("assigned_doctor") is not None
+        }
+        if not references:
+            return {}
+        ids = [reference for reference in references if reference.isdigit()]
+        doctors = Doctor.objects.filter(Q(id__in=ids) | Q(slug__in=references))
+        resolved = {}
+        for doctor_id, slug in doctors.values_list("id", "slug"):
+            resolved[str(doctor_id)] = doctor_id
+            resolved[slug] = doctor_id
+        return resolved
+
+    def build_patient(self, row, doctors):
+        missing = [field for field in PATIENT_FIELDS if row.get(field) in (None, "")]
+        if missing:
+            raise ImportRowError(f"Missing fields: {', '.join(missing)}")
+
+        doctor_id = None
+        if row.get("assigned_doctor") is not None:
+            doctor_id = doctors.get(str(row["assigned_doctor"]))
+            if doctor_id is None:
+                raise ImportRowError("Unknown assigned_doctor")
+
+        patient = Patient(
+            name=row["name"],
+            age=row["age"],
+            gender=row["gender"],
+            contact_information=row["contact_information"],
+            doctor_id=doctor_id,
+        )
+        try:
+            patient.clean_fields(exclude=["slug", "doctor"])
+        except ValidationError as error:
+            raise ImportRowError(
+                "; ".join(
+                    f"{field}: {' '.join(messages)}"
+                    for field, messages in error.message_dict.items()
+                )
+            )
+
+        history = row.get("medical_history")
+        if history is not None:
+            if not isinstance(history, dict) or any(
+                field not in history for field in HISTORY_FIELDS
+            ):
+                raise ImportRowError("Invalid medical_history")
+            history = MedicalHistory(
+                **{field: history[field] for field in HISTORY_FIELDS}
+            )
+        return patient, history
+
+    def import_batch(self, batch):
+        doctors = self.resolve_doctors(batch)
+        candidates = []
+        for line_number, row in batch:
+            if isinstance(row, ImportRowError):
+                self.add_error(line_number, str(row))
+                continue
+            try:
+                patient, history = self.build_patient(row, doctors)
+            except ImportRowError as error:
+                self.add_error(line_number, str(error))
+                continue
+            candidates.append((line_number, patient, history))
+
+        if not candidates:
+            return
+
+        try:
+            self.save(candidates)
+        except DatabaseError:
+            # Save the rows one at a time to find the ones at fault
+            for candidate in candidates:
+                try:
+                    self.save([candidate])
+                except DatabaseError:
+                    self.add_error(candidate[0], "Row could not be saved")
+
+    def save(self, candidates):
+        """Insert the (line number, patient, history) candidates in one transaction"""
+        with transaction.atomic():
+            patients = Patient.objects.bulk_create(
+                [patient for _, patient, _ in candidates]
+            )
+            histories = []
+            for patient, (_, _, history) in zip(patients, candidates):
+                if history is not None:
+                    history.patient = patient
+                    histories.append(history)
+            MedicalHistory.objects.bulk_create(histories)
+        self.created += len(patients)
+
+
+def export_rows(chunk_size=2000):
+    """Yield one dict per patient with their doctor, medical history and appointments"""
+    patients = (
+        Patient.objects.select_related("doctor")
+        .prefetch_related(
+            "medicalhistory_set",
+            Prefetch("appointment_set", queryset=Appointment.objects.order_by("date")),
+        )
+        .order_by("id")
+    )
+    for patient in patients.iterator(chunk_size=chunk_size):
+        histories = patient.medicalhistory_set.all()
+        history = histories[0] if histories else None
+        yield {
+            "slug": patient.slug,
+            "name": patient.name,
+            "age": patient.age,
+            "gender": patient.gender,
+            "contact_information": patient.contact_information,
+            "doctor": patient.doctor.slug if patient.doctor else None,
+            "medical_history": (
+                {field: getattr(history, field) for field in HISTORY_FIELDS}
+                if history
+                else None
+            ),
+            "appointments": [
+                {"date": appointment.date.isoformat(), "details": appointment.details}
+                for appointment in patient.appointment_set.all()
+            ],
+        }
+
+
+def export_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        history = row["medical_history"] or {}
+        yield writer.writerow(
+            [row[column] for column in EXPORT_COLUMNS[:6]]
+            + [history.get(field, "") for field in HISTORY_FIELDS]
+            + [json.dumps(row["appointments"])]
+        )
+
+
+EXPORTERS = {
+    "jsonl": (export_jsonl, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
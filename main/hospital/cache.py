@@ -0,0 +1,244 @@
+"""
+Versioned read-through cache for GET responses.
+
+Entries live in the cache named by settings.RESPONSE_CACHE_ALIAS (local
+memory with LRU culling and a TTL by default; any Django cache backend can
+be swapped in). Each key embeds the current version of every entity the
+payload depends on, so a write only has to bump its entity's version for
+all stale entries to stop matching; they then age out on their own.
+
+The versions live in the cache named by settings.VERSION_CACHE_ALIAS, the
+database by default, which every worker process shares. Responses can then
+stay in each worker's memory: a write in one worker changes the versions all
+of them build keys from. Several workers with versions in local memory would
+each keep their own, so check_version_cache() refuses to start them.
+
+Besides the views that write, track_writes() bumps the entity of every row
+saved or deleted through the ORM once its transaction commits, so writes
+from the admin or a shell count too. Rows embedded in a payload, such as a
+doctor's availability, bump the entity they are embedded in. The versions
+are kept even with response caching off, because the ETags are built from
+them as well.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework import status
+from rest_framework.response import Response
+
+from .idempotency import REPLAYED_HEADER
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+# Entity whose version a write to each model bumps
+MODEL_ENTITIES = {
+    "Department": "department",
+    "Doctor": "doctor",
+    "DoctorAvailability": "doctor",
+    "Patient": "patient",
+    "MedicalHistory": "patient",
+    "Appointment": "appointment",
+}
+
+
+def get_response_cache():
+    alias = getattr(settings, "RESPONSE_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def get_version_cache():
+    alias = getattr(settings, "VERSION_CACHE_ALIAS", None)
+    return caches[alias] if alias else get_response_cache()
+
+
+def check_version_cache():
+    """
+    Raise ImproperlyConfigured if several worker processes (WEB_CONCURRENCY,
+    as read by gunicorn) would each keep entity versions in local memory
+    """
+    workers = int(os.environ.get("WEB_CONCURRENCY") or 1)
+    if workers > 1 and isinstance(get_version_cache(), LocMemCache):
+        raise ImproperlyConfigured(
+            f"{workers} workers cannot share response cache versions kept in "
+            "local memory; point VERSION_CACHE_ALIAS at a shared cache"
+        )
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def _version_key(entity):
+    return f"version:{entity}"
+
+
+def new_version():
+    # From the clock, so an evicted version is never reused
+    return time.time_ns()
+
+
+def get_versions(entities):
+    cache = get_version_cache()
+    keys = [_version_key(entity) for entity in entities]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = new_version()
+            versions[key] = (
+                version if cache.add(key, version, timeout=None) else cache.get(key)
+            )
+    return [versions[key] for key in keys]
+
+
+def invalidate(*entities):
+    """
+    Bump the version of each entity, orphaning every cached response built on
+    it; returns the new version, None without a version cache
+    """
+    cache = get_version_cache()
+    if cache is None:
+        return None
+    # A fresh value rather than incr(), which is not atomic on every backend
+    version = new_version()
+    cache.set_many({_version_key(entity): version for entity in entities}, timeout=None)
+    return version
+
+
+def entity_versions(*entities):
+    """Current versions of the entities, or an empty list without a version cache"""
+    if get_version_cache() is None:
+        return []
+    return get_versions(entities)
+
+
+def request_versions(request, entities):
+    """
+    entity_versions() remembered on the request, so the decorators and the
+    paginator of one view share a single round trip to the version cache
+    """
+    remembered = getattr(request, "_entity_versions", None)
+    if remembered is None:
+        remembered = request._entity_versions = {}
+    missing = [entity for entity in entities if entity not in remembered]
+    if missing:
+        versions = entity_versions(*missing)
+        if not versions:
+            return []
+        remembered.update(zip(missing, versions))
+    return [remembered[entity] for entity in entities]
+
+
+def cached_count(queryset, entity, request=None):
+    """
+    queryset.count(), kept in the response cache until the entity changes, so
+    a listing is counted once per version rather than on every page
+    """
+    cache = get_response_cache()
+    if request is None:
+        versions = entity_versions(entity)
+    else:
+        versions = request_versions(request, [entity])
+    if cache is None or not versions or queryset.query.is_empty():
+        return queryset.count()
+    raw = f"{queryset.query}#{versions}"
+    key = "count:" + hashlib.md5(raw.encode("utf-8")).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count)
+    return count
+
+
+def _row_written(sender, **kwargs):
+    entity = MODEL_ENTITIES[sender.__name__]
+    # After the commit, so no reader can pair the new version with old rows
+    transaction.on_commit(lambda: invalidate(entity))
+
+
+def track_writes():
+    from . import models
+
+    for name in MODEL_ENTITIES:
+        model = getattr(models, name)
+        post_save.connect(_row_written, sender=model, dispatch_uid=f"version:{name}")
+        post_delete.connect(_row_written, sender=model, dispatch_uid=f"version:{name}")
+
+
+def normalized_query(request):
+    return sorted(
+        (key, value) for key, values in request.query_params.lists() for value in values
+    )
+
+
+def build_cache_key(request, versions):
+    raw = f"{request.path}?{normalized_query(request)}#{versions}"
+    return "response:" + hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def cached_response(*entities):
+    """
+    Cache a view's successful GET responses until one of the given entities
+    is invalidated.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            cache = get_response_cache()
+            if cache is None:
+                return method(view, request, *args, **kwargs)
+
+            key = build_cache_key(request, request_versions(request, entities))
+            data = cache.get(key)
+            if data is not None:
+                _record("hits")
+                response = Response(data)
+                response["X-Cache"] = "HIT"
+                return response
+
+            _record("misses")
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data)
+            response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def invalidates(*entities):
+    """Invalidate the given entities after a view method succeeds"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            response = method(view, request, *args, **kwargs)
+            # A replayed idempotent POST wrote nothing this time
+            if status.is_success(response.status_code) and not response.has_header(
+                REPLAYED_HEADER
+            ):
+                invalidate(*entities)
+            return response
+
+        return wrapper
+
+    return decorator
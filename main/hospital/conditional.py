@@ -0,0 +1,68 @@
+"""
+Conditional GET support (ETag, Last-Modified) for the read endpoints.
+
+The ETag is built from the path, the query string and the versions of every
+entity the payload embeds, kept in the shared version cache and bumped after
+each committed write to any of their tables (see hospital.cache). It is the
+same in every worker and costs no query against the listed tables, so a
+matching If-None-Match short-circuits to 304 before anything is read or
+serialized.
+
+The versions are nanosecond timestamps of those writes, so the newest of
+them is also the payload's Last-Modified, and If-Modified-Since is answered
+from it when the request has no If-None-Match. HTTP dates only have whole
+seconds, so no Last-Modified is sent while the newest version is in the
+current second: a write later in that second would otherwise carry the
+same date and a client would keep the stale copy.
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import normalized_query, request_versions
+
+
+def get_etag(request, versions):
+    raw = f"{request.path}?{normalized_query(request)}#{versions}"
+    return '"%s"' % hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def get_last_modified(versions):
+    """The newest version in whole seconds, or None while it is this second's"""
+    last_modified = max(versions) // 1_000_000_000
+    if last_modified >= int(time.time()):
+        return None
+    return last_modified
+
+
+def conditional_response(*entities):
+    """
+    Answer If-None-Match, or If-Modified-Since, with 304 when none of the
+    given entities has changed since the response was issued.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            versions = request_versions(request, entities)
+            if not versions:
+                return method(view, request, *args, **kwargs)
+            etag = get_etag(request, versions)
+            last_modified = get_last_modified(versions)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+            response.headers.setdefault("ETag", etag)
+            if last_modified is not None:
+                response.headers.setdefault("Last-Modified", http_date(last_modified))
+            return response
+
+        return wrapper
+
+    return decorator
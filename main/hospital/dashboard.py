@@ -0,0 +1,420 @@
+"""
+Department dashboard: doctor and patient counts, appointments per day for
+the coming days, and utilisation of the doctors' bookable seats.
+
+By default every figure comes from a grouped aggregate query (one per
+figure, whatever the number of departments). With
+settings.DASHBOARD_COUNTERS the figures are instead read from the
+DepartmentCounter, DepartmentDailyAppointments and DepartmentWeekdaySeats
+rows. Signal handlers on Doctor, DoctorAvailability, Patient and
+Appointment, connected only when the setting is on, keep those rows current
+by recounting just the departments and days a write changed. The recounts
+run once the write's transaction commits, so a booking holds its doctor's
+row lock no longer than it needs to. Each recount locks its departments'
+rows, so recounts of one department run one after the other and the last
+one sees every committed write; it upserts the counter rows, so two of them
+never collide on the unique constraints. A recount that fails is logged and
+left to the next one or to a rebuild; it never fails the committed write.
+
+Writes that skip signals (bulk_create, QuerySet.update) need
+rebuild_counters(), or the rebuild_dashboard_counters command, afterwards;
+the views' own bulk writes call the refresh functions themselves. A change
+to the slot settings needs a rebuild too.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .availability import weekly_slots
+from .enum import DayOfWeek
+from .models import (
+    Appointment,
+    Department,
+    DepartmentCounter,
+    DepartmentDailyAppointments,
+    DepartmentWeekdaySeats,
+    Doctor,
+    DoctorAvailability,
+    Patient,
+)
+from .schedule import slot_starts
+
+
+def counters_enabled():
+    return getattr(settings, "DASHBOARD_COUNTERS", False)
+
+
+def count_by_department(department_ids=None):
+    """{department_id: (doctor count, patient count)}, two grouped queries"""
+    doctors = Doctor.objects.all()
+    patients = Patient.objects.all()
+    if department_ids is not None:
+        doctors = doctors.filter(department_id__in=department_ids)
+        patients = patients.filter(doctor__department_id__in=department_ids)
+    doctor_counts = dict(
+        doctors.values_list("department_id").annotate(count=Count("id")).order_by()
+    )
+    patient_counts = dict(
+        patients.values_list("doctor__department_id")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    return {
+        department_id: (
+            doctor_counts.get(department_id, 0),
+            patient_counts.get(department_id, 0),
+        )
+        for department_id in set(doctor_counts) | set(patient_counts)
+        if department_id is not None
+    }
+
+
+def appointments_by_day(first_day, last_day, department_ids=None):
+    """{(department_id, date): booked appointments}, one grouped query"""
+    appointments = Appointment.objects.filter(
+        doctor__department_id__isnull=False, slot_start__isnull=False
+    )
+    if first_day is not None:
+        appointments = appointments.filter(
+            slot_start__gte=timezone.make_aware(datetime.combine(first_day, time.min)),
+            slot_start__lt=timezone.make_aware(
+                datetime.combine(last_day + timedelta(days=1), time.min)
+            ),
+        )
+    if department_ids is not None:
+        appointments = appointments.filter(doctor__department_id__in=department_ids)
+    rows = (
+        appointments.annotate(day=TruncDate("slot_start"))
+        .values_list("doctor__department_id", "day")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    return {(department_id, day): count for department_id, day, count in rows}
+
+
+def seats_by_weekday(department_ids=None):
+    """{(department_id, weekday): bookable seats}, from one availability query"""
+    slot_minutes = settings.APPOINTMENT_SLOT_MINUTES
+    by_doctor = {}
+    availabilities = DoctorAvailability.objects.filter(
+        doctor__department_id__isnull=False
+    )
+    if department_ids is not None:
+        availabilities = availabilities.filter(doctor__department_id__in=department_ids)
+    availabilities = availabilities.values_list(
+        "doctor_id", "doctor__department_id", "day", "start_time", "end_time"
+    )
+    for doctor_id, department_id, day, start_time, end_time in availabilities:
+        row = DoctorAvailability(day=day, start_time=start_time, end_time=end_time)
+        by_doctor.setdefault((doctor_id, department_id), []).append(row)
+
+    seats = {}
+    for (_, department_id), rows in by_doctor.items():
+        for weekday, intervals in weekly_slots(rows).items():
+            slots = sum(1 for _ in slot_starts(intervals, slot_minutes))
+            key = (department_id, weekday)
+            seats[key] = seats.get(key, 0) + slots * settings.APPOINTMENT_SLOT_CAPACITY
+    return seats
+
+
+def department_dashboard(first_day, days):
+    last_day = first_day + timedelta(days=days - 1)
+    departments = Department.objects.order_by("created_at", "id")
+    if counters_enabled():
+        departments = departments.select_related("counter")
+        counts = {
+            department.id: (
+                (department.counter.doctor_count, department.counter.patient_count)
+                if hasattr(department, "counter")
+                else (0, 0)
+            )
+            for department in departments
+        }
+        booked = {
+            (row.department_id, row.date): row.appointment_count
+            for row in DepartmentDailyAppointments.objects.filter(
+                date__range=(first_day, last_day)
+            )
+        }
+        seats = {
+            (row.department_id, row.weekday): row.seat_count
+            for row in DepartmentWeekdaySeats.objects.all()
+        }
+    else:
+        counts = count_by_department()
+        booked = appointments_by_day(first_day, last_day)
+        seats = seats_by_weekday()
+
+    dates = [first_day + timedelta(days=offset) for offset in range(days)]
+    results = []
+    for department in departments:
+        doctor_count, patient_count = counts.get(department.id, (0, 0))
+        schedule = []
+        for day in dates:
+            count = booked.get((department.id, day), 0)
+            capacity = seats.get((department.id, day.isoweekday()), 0)
+            schedule.append(
+                {
+                    "date": day,
+                    "appointments": count,
+                    "capacity": capacity,
+                    "utilisation": round(count / capacity, 4) if capacity else None,
+                }
+            )
+        total_booked = sum(entry["appointments"] for entry in schedule)
+        total_capacity = sum(entry["capacity"] for entry in schedule)
+        results.append(
+            {
+                "slug": department.slug,
+                "name": department.name,
+                "doctor_count": doctor_count,
+                "patient_count": patient_count,
+                "utilisation": (
+                    round(total_booked / total_capacity, 4) if total_capacity else None
+                ),
+                "days": schedule,
+            }
+        )
+    return {"from": first_day, "to": last_day, "departments": results}
+
+
+def _lock_departments(department_ids):
+    """Lock the departments' rows (all of them for None) until the transaction ends"""
+    departments = Department.objects.select_for_update().order_by("id")
+    if department_ids is not None:
+        departments = departments.filter(id__in=department_ids)
+    return list(departments.values_list("id", flat=True))
+
+
+def refresh_counters(department_ids=None):
+    """Recount DepartmentCounter rows for the given departments, or all of them"""
+    if department_ids is not None:
+        department_ids = [id_ for id_ in department_ids if id_ is not None]
+    department_ids = _lock_departments(department_ids)
+    counts = count_by_department(department_ids)
+    DepartmentCounter.objects.bulk_create(
+        [
+            DepartmentCounter(
+                department_id=department_id,
+                doctor_count=counts.get(department_id, (0, 0))[0],
+                patient_count=counts.get(department_id, (0, 0))[1],
+            )
+            for department_id in department_ids
+        ],
+        update_conflicts=True,
+        unique_fields=["department"],
+        update_fields=["doctor_count", "patient_count"],
+    )
+
+
+def refresh_daily_appointments(department_ids=None, dates=None):
+    """
+    Recount DepartmentDailyAppointments rows for the given departments and
+    dates; None means all of them.
+    """
+    if department_ids is not None:
+        department_ids = [id_ for id_ in department_ids if id_ is not None]
+    if dates is not None:
+        dates = sorted(day for day in dates if day is not None)
+        if not dates:
+            return
+    department_ids = _lock_departments(department_ids)
+    if not department_ids:
+        return
+    rows = DepartmentDailyAppointments.objects.filter(department_id__in=department_ids)
+    if dates is not None:
+        rows = rows.filter(date__in=dates)
+
+    counts = {
+        key: count
+        for key, count in appointments_by_day(
+            dates[0] if dates else None, dates[-1] if dates else None, department_ids
+        ).items()
+        if dates is None or key[1] in dates
+    }
+    emptied = [
+        pk
+        for pk, department_id, day in rows.values_list("pk", "department_id", "date")
+        if (department_id, day) not in counts
+    ]
+    if emptied:
+        DepartmentDailyAppointments.objects.filter(pk__in=emptied).delete()
+    DepartmentDailyAppointments.objects.bulk_create(
+        [
+            DepartmentDailyAppointments(
+                department_id=department_id, date=day, appointment_count=count
+            )
+            for (department_id, day), count in counts.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["department", "date"],
+        update_fields=["appointment_count"],
+    )
+
+
+def refresh_weekday_seats(department_ids=None):
+    """Recount DepartmentWeekdaySeats rows for the given departments, or all of them"""
+    if department_ids is not None:
+        department_ids = [id_ for id_ in department_ids if id_ is not None]
+    department_ids = _lock_departments(department_ids)
+    if not department_ids:
+        return
+    seats = seats_by_weekday(department_ids)
+    # Every weekday gets a row, so days without seats are zeroed in place
+    DepartmentWeekdaySeats.objects.bulk_create(
+        [
+            DepartmentWeekdaySeats(
+                department_id=department_id,
+                weekday=weekday,
+                seat_count=seats.get((department_id, weekday), 0),
+            )
+            for department_id in department_ids
+            for weekday, _ in DayOfWeek.choices()
+        ],
+        update_conflicts=True,
+        unique_fields=["department", "weekday"],
+        update_fields=["seat_count"],
+    )
+
+
+def rebuild_counters():
+    refresh_counters()
+    refresh_daily_appointments()
+    refresh_weekday_seats()
+
+
+def after_commit(refresh, *args):
+    """
+    Run refresh(*args) in its own transaction once the current one commits.
+    A failure is logged rather than raised: the write it counts has committed.
+    """
+
+    def run():
+        with transaction.atomic():
+            refresh(*args)
+
+    transaction.on_commit(run, robust=True)
+
+
+def schedule_changed(department_id):
+    """Recount a department's seats after a bulk write of its availability"""
+    if counters_enabled():
+        after_commit(refresh_weekday_seats, [department_id])
+
+
+def _department_of_doctor(doctor_id):
+    """The doctor's department id, with a query; None without a doctor"""
+    if doctor_id is None:
+        return None
+    return (
+        Doctor.objects.filter(pk=doctor_id)
+        .values_list("department_id", flat=True)
+        .first()
+    )
+
+
+def _local_date(moment):
+    return timezone.localdate(moment) if moment else None
+
+
+def remember_doctor(sender, instance, **kwargs):
+    if instance.pk:
+        instance._counted_department = _department_of_doctor(instance.pk)
+
+
+def doctor_saved(sender, instance, created, **kwargs):
+    old_department = getattr(instance, "_counted_department", None)
+    if created:
+        after_commit(refresh_counters, [instance.department_id])
+    elif old_department != instance.department_id:
+        departments = [old_department, instance.department_id]
+        after_commit(refresh_counters, departments)
+        # The doctor's patients, appointments and schedule moved with them
+        after_commit(refresh_daily_appointments, departments)
+        after_commit(refresh_weekday_seats, departments)
+
+
+def doctor_deleted(sender, instance, **kwargs):
+    departments = [instance.department_id]
+    after_commit(refresh_counters, departments)
+    # Their appointments lost their doctor, and their schedule is gone
+    after_commit(refresh_daily_appointments, departments)
+    after_commit(refresh_weekday_seats, departments)
+
+
+def availability_changed(sender, instance, **kwargs):
+    # Read now: when the doctor is being deleted, the row is gone after commit
+    department_id = _department_of_doctor(instance.doctor_id)
+    if department_id is not None:
+        after_commit(refresh_weekday_seats, [department_id])
+
+
+def remember_patient(sender, instance, **kwargs):
+    if instance.pk:
+        doctor_id = (
+            Patient.objects.filter(pk=instance.pk)
+            .values_list("doctor_id", flat=True)
+            .first()
+        )
+        instance._counted_department = _department_of_doctor(doctor_id)
+
+
+def patient_saved(sender, instance, created, **kwargs):
+    department = _department_of_doctor(instance.doctor_id)
+    old_department = getattr(instance, "_counted_department", None)
+    if created or old_department != department:
+        after_commit(refresh_counters, [old_department, department])
+
+
+def patient_deleted(sender, instance, **kwargs):
+    after_commit(refresh_counters, [_department_of_doctor(instance.doctor_id)])
+
+
+def remember_appointment(sender, instance, **kwargs):
+    if instance.pk:
+        old = (
+            Appointment.objects.filter(pk=instance.pk)
+            .values_list("doctor__department_id", "slot_start")
+            .first()
+        )
+        if old:
+            instance._counted_day = (old[0], _local_date(old[1]))
+
+
+def appointment_changed(sender, instance, created=True, **kwargs):
+    day = (_department_of_doctor(instance.doctor_id), _local_date(instance.slot_start))
+    old_day = getattr(instance, "_counted_day", day)
+    if not created and old_day == day:
+        # Same department and day: the counts did not change
+        return
+    for department_id, date in {day, old_day}:
+        if department_id is not None and date is not None:
+            after_commit(refresh_daily_appointments, [department_id], [date])
+
+
+def connect_counter_signals():
+    """Keep the counter rows current; called from AppConfig.ready when enabled"""
+    for model, remember, saved, deleted in (
+        (Doctor, remember_doctor, doctor_saved, doctor_deleted),
+        (Patient, remember_patient, patient_saved, patient_deleted),
+        (Appointment, remember_appointment, appointment_changed, appointment_changed),
+    ):
+        pre_save.connect(remember, sender=model, dispatch_uid="dashboard")
+        post_save.connect(saved, sender=model, dispatch_uid="dashboard")
+        post_delete.connect(deleted, sender=model, dispatch_uid="dashboard")
+    for signal in (post_save, post_delete):
+        signal.connect(
+            availability_changed, sender=DoctorAvailability, dispatch_uid="dashboard"
+        )
+
+
+def disconnect_counter_signals():
+    for model in (Doctor, DoctorAvailability, Patient, Appointment):
+        for signal in (pre_save, post_save, post_delete):
+            signal.disconnect(sender=model, dispatch_uid="dashboard")
@@ -0,0 +1,242 @@
+"""
+Synthetic hospital data for benchmarks.
+
+Fills departments, doctors with weekly availability, patients with medical
+histories, and appointments booked into real slots of their doctor's
+schedule, so every endpoint (including slots and the dashboard) has
+representative work to do. Rows are written with bulk_create in batches of
+batch_size patients, each batch in its own transaction. Memory use therefore
+depends on the batch size and the number of doctors, not on the number of
+rows, and a run can be scaled from thousands to millions of rows.
+
+Output is deterministic for a given seed, apart from slugs and timestamps.
+"""
+
+import math
+import random
+from datetime import datetime, time, timedelta
+from itertools import count
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .availability import weekly_slots
+from .bulk import batched
+from .models import (
+    Appointment,
+    Department,
+    Doctor,
+    DoctorAvailability,
+    MedicalHistory,
+    Patient,
+)
+from .schedule import slot_starts
+
+FIRST_NAMES = (
+    "Aarav Aditi Amelia Arjun Chen Diego Fatima Grace Hana Ishaan James Kavya "
+    "Liam Maria Noah Olivia Priya Rahul Sofia Yusuf"
+).split()
+LAST_NAMES = (
+    "Banerjee Brown Das Garcia Gupta Ivanova Khan Kim Lopez Mehta Nguyen Okafor "
+    "Patel Roy Sato Schmidt Sharma Smith Wang Wilson"
+).split()
+DEPARTMENTS = (
+    ("Cardiology", "Cardiologist"),
+    ("Dermatology", "Dermatologist"),
+    ("Neurology", "Neurologist"),
+    ("Oncology", "Oncologist"),
+    ("Orthopaedics", "Orthopaedic Surgeon"),
+    ("Paediatrics", "Paediatrician"),
+    ("Psychiatry", "Psychiatrist"),
+    ("Radiology", "Radiologist"),
+)
+DIAGNOSES = ("Hypertension", "Asthma", "Diabetes", "Migraine", "Fracture", "None")
+ALLERGIES = ("Penicillin", "Peanuts", "Pollen", "Latex", "None")
+MEDICATIONS = ("Paracetamol", "Ibuprofen", "Metformin", "Salbutamol", "None")
+# Weeks before the current one that appointments start from
+HISTORY_WEEKS = 4
+
+
+def random_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def random_phone(rng):
+    return f"+91{rng.randrange(6000000000, 10000000000)}"
+
+
+def specialization(department_index):
+    return DEPARTMENTS[department_index % len(DEPARTMENTS)][1]
+
+
+def department_names(number):
+    """Department names not taken yet, so the generator can run repeatedly"""
+    taken = set(Department.objects.values_list("name", flat=True))
+    names = []
+    for index in range(number):
+        base = DEPARTMENTS[index % len(DEPARTMENTS)][0]
+        for suffix in count(index // len(DEPARTMENTS) + 1):
+            name = base if suffix == 1 else f"{base} {suffix}"
+            if name not in taken:
+                break
+        taken.add(name)
+        names.append(name)
+    return names
+
+
+def random_availability(rng, doctor_id):
+    """Three to five working days, starting between 8:00 and 10:00"""
+    days = sorted(rng.sample(range(1, 8), rng.randint(3, 5)))
+    rows = []
+    for day in days:
+        start_hour = rng.randint(8, 10)
+        # Any date will do: only the time of day is used
+        start = timezone.make_aware(datetime(2024, 1, 1, start_hour))
+        rows.append(
+            DoctorAvailability(
+                doctor_id=doctor_id,
+                day=day,
+                start_time=start,
+                end_time=start + timedelta(hours=rng.randint(6, 8)),
+            )
+        )
+    return rows
+
+
+def bookable_slots(rng, availabilities, first_day, fill):
+    """
+    Endless (slot_start, seat) pairs from the doctor's schedule, week by week
+    from first_day. Each week goes through its slots once per seat, so two
+    consecutive pairs never share a slot, and skips a share 1 - fill of them
+    to spread bookings over several weeks.
+    """
+    slot_minutes = settings.APPOINTMENT_SLOT_MINUTES
+    template = weekly_slots(availabilities)
+    week = []
+    for offset in range(7):
+        day = first_day + timedelta(days=offset)
+        intervals = template.get(day.isoweekday())
+        for minutes in slot_starts(intervals, slot_minutes) if intervals else ():
+            week.append((offset, minutes))
+    if not week:
+        return
+    for week_number in count():
+        week_start = first_day + timedelta(weeks=week_number)
+        for seat in range(settings.APPOINTMENT_SLOT_CAPACITY):
+            for offset, minutes in week:
+                if rng.random() < fill:
+                    start = datetime.combine(
+                        week_start + timedelta(days=offset), time.min
+                    ) + timedelta(minutes=minutes)
+                    yield timezone.make_aware(start), seat
+
+
+def generate(
+    patients=10000,
+    patients_per_doctor=50,
+    doctors_per_department=25,
+    appointments_per_patient=2,
+    fill=0.6,
+    batch_size=5000,
+    seed=0,
+    progress=None,
+):
+    """
+    Insert a dataset of the given size and return the number of rows
+    written per model. progress(counts), if given, is called after each batch.
+    """
+    rng = random.Random(seed)
+    doctor_count = max(1, math.ceil(patients / patients_per_doctor))
+    department_count = max(1, math.ceil(doctor_count / doctors_per_department))
+    counts = dict.fromkeys(
+        (
+            "departments",
+            "doctors",
+            "availabilities",
+            "patients",
+            "medical_histories",
+            "appointments",
+        ),
+        0,
+    )
+
+    with transaction.atomic():
+        departments = Department.objects.bulk_create(
+            Department(name=name, services_offered="General care")
+            for name in department_names(department_count)
+        )
+        counts["departments"] = len(departments)
+
+    today = timezone.localdate()
+    first_day = today - timedelta(days=today.weekday(), weeks=HISTORY_WEEKS)
+    doctor_ids = []
+    schedules = {}
+    for batch in batched(range(doctor_count), batch_size):
+        with transaction.atomic():
+            doctors = Doctor.objects.bulk_create(
+                Doctor(
+                    name=f"Dr. {random_name(rng)}",
+                    specialization=specialization(index % department_count),
+                    contact_information=random_phone(rng),
+                    department=departments[index % department_count],
+                )
+                for index in batch
+            )
+            availabilities = []
+            for doctor in doctors:
+                rows = random_availability(rng, doctor.id)
+                availabilities.extend(rows)
+                schedules[doctor.id] = bookable_slots(rng, rows, first_day, fill)
+                doctor_ids.append(doctor.id)
+            DoctorAvailability.objects.bulk_create(availabilities)
+        counts["doctors"] += len(doctors)
+        counts["availabilities"] += len(availabilities)
+        if progress:
+            progress(counts)
+
+    for batch in batched(range(patients), batch_size):
+        with transaction.atomic():
+            created = Patient.objects.bulk_create(
+                Patient(
+                    name=random_name(rng),
+                    age=rng.randint(1, 95),
+                    gender=rng.choice("MFO"),
+                    contact_information=random_phone(rng),
+                    doctor_id=rng.choice(doctor_ids),
+                )
+                for _ in batch
+            )
+            histories = MedicalHistory.objects.bulk_create(
+                MedicalHistory(
+                    patient_id=patient.id,
+                    previous_diagnoses=rng.choice(DIAGNOSES),
+                    allergies=rng.choice(ALLERGIES),
+                    medications=rng.choice(MEDICATIONS),
+                )
+                for patient in created
+            )
+            appointments = []
+            for patient in created:
+                for _ in range(appointments_per_patient):
+                    slot = next(schedules[patient.doctor_id], None)
+                    if slot is None:
+                        break
+                    slot_start, seat = slot
+                    appointments.append(
+                        Appointment(
+                            patient_id=patient.id,
+                            doctor_id=patient.doctor_id,
+                            date=slot_start,
+                            slot_start=slot_start,
+                            seat=seat,
+                            details="Routine checkup",
+                        )
+                    )
+            Appointment.objects.bulk_create(appointments)
+        counts["patients"] += len(created)
+        counts["medical_histories"] += len(histories)
+        counts["appointments"] += len(appointments)
+        if progress:
+            progress(counts)
+    return counts
@@ -0,0 +1,122 @@
+"""
+In-process database connection pool.
+
+Django 4.2 has no connection pooling of its own: every thread opens its own
+connection and closes it at the end of the request, or keeps it for
+CONN_MAX_AGE seconds. A pool lets connections outlive the thread that opened
+them. Threads borrow a connection when they first touch the database and
+give it back when Django would have closed it. A process therefore holds at
+most max_size connections, however many threads it runs, and a request
+rarely pays for a new connection.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+# psycopg2 and psycopg 3 both report an idle session as 0
+TRANSACTION_STATUS_IDLE = 0
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, max_size=10, timeout=10, max_lifetime=3600):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        # Bounds connections in use plus connections being opened
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = deque()
+        self.opened_at = {}
+        self.stats = {"connections_opened": 0, "connections_reused": 0, "waits": 0}
+
+    def expired(self, connection):
+        with self.lock:
+            opened_at = self.opened_at.get(id(connection))
+        return opened_at is None or time.monotonic() - opened_at > self.max_lifetime
+
+    def discard(self, connection):
+        with self.lock:
+            self.opened_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def getconn(self, connect, check=None):
+        """
+        Borrow an idle connection, or open one with connect(), waiting up to
+        timeout seconds for a free slot. check(connection) -> bool, if given,
+        vets an idle connection before it is handed out.
+        """
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.stats["waits"] += 1
+            if not self.slots.acquire(timeout=self.timeout):
+                raise PoolTimeout(
+                    f"No database connection free after {self.timeout}s "
+                    f"(pool max_size={self.max_size})"
+                )
+        try:
+            while True:
+                with self.lock:
+                    # Most recently used first: it is the most likely to be alive
+                    connection = self.idle.pop() if self.idle else None
+                if connection is None:
+                    break
+                if connection.closed or self.expired(connection):
+                    self.discard(connection)
+                elif check is not None and not check(connection):
+                    self.discard(connection)
+                else:
+                    with self.lock:
+                        self.stats["connections_reused"] += 1
+                    return connection
+            connection = connect()
+            with self.lock:
+                self.opened_at[id(connection)] = time.monotonic()
+                self.stats["connections_opened"] += 1
+            return connection
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def putconn(self, connection):
+        """Return a borrowed connection, or close it if it cannot be reused"""
+        try:
+            if connection.closed or self.expired(connection):
+                self.discard(connection)
+                return
+            if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except Exception:
+                    self.discard(connection)
+                    return
+            with self.lock:
+                self.idle.append(connection)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            connections, self.idle = list(self.idle), deque()
+        for connection in connections:
+            self.discard(connection)
+
+    def status(self):
+        with self.lock:
+            return {
+                "max_size": self.max_size,
+                "idle": len(self.idle),
+                "open": len(self.opened_at),
+                **self.stats,
+            }
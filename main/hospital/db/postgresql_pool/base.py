@@ -0,0 +1,84 @@
+"""
+PostgreSQL backend that borrows connections from an in-process pool.
+
+Selected with ENGINE = "hospital.db.postgresql_pool" and configured through
+OPTIONS["pool"] = {"max_size": ..., "timeout": ..., "max_lifetime": ...},
+the same key Django 5.1's built-in pool uses. Django closes a connection at
+the end of each request (CONN_MAX_AGE = 0); here that returns it to the
+pool, where the next request picks it up. With CONN_HEALTH_CHECKS, idle
+connections are pinged before reuse.
+"""
+
+import os
+import threading
+from functools import partial
+
+from django.db.backends.postgresql import base, creation
+
+from hospital.db.pool import ConnectionPool
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def close_pools(database_name=None):
+    """Close the idle connections of every pool, or of those for one database"""
+    with pools_lock:
+        keys = [key for key in pools if database_name in (None, key[1])]
+        closing = [pools.pop(key) for key in keys]
+    for pool in closing:
+        pool.close()
+
+
+def pool_status():
+    with pools_lock:
+        return {
+            f"{alias}:{name}": pool.status() for (alias, name), pool in pools.items()
+        }
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # DROP DATABASE fails while pooled connections to it are still open
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    def get_pool(self, database_name):
+        key = (self.alias, database_name)
+        with pools_lock:
+            pool = pools.get(key)
+            # A forked worker must not share its parent's sockets
+            if pool is None or pool.pid != os.getpid():
+                options = self.settings_dict["OPTIONS"].get("pool") or {}
+                pool = pools[key] = ConnectionPool(**options)
+        return pool
+
+    def ping(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except self.Database.Error:
+            return False
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params.get("dbname"))
+        self.pool = pool
+        return pool.getconn(
+            partial(super().get_new_connection, conn_params),
+            check=self.ping if self.health_check_enabled else None,
+        )
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
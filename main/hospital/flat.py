@@ -0,0 +1,265 @@
+"""
+Flat serialization of doctor and patient pages.
+
+Builds the same payloads as DoctorSerializer and PatientSerializer, but from
+.values() rows instead of model instances, for the same ?fields= and
+?expand= selection. The page is one query with any expanded to-one relation
+joined in, and each expanded collection is one values_list() query grouped
+by parent id in Python, cut to its first rows per parent by a window
+function. No model instances, prefetch caches or serializer fields are
+created per row, which is where most of the time goes on large pages.
+Enabled with settings.FLAT_SERIALIZATION; the query count matches the
+serializer path.
+"""
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework import serializers
+
+from .enum import DayOfWeek
+from .metrics import timed_serialization
+from .models import Appointment, Doctor, DoctorAvailability, MedicalHistory, Patient
+from .pagination import (
+    APPOINTMENT_ORDERING,
+    KeysetPagination,
+    nested_collection,
+    nested_limit,
+)
+from .serializers import (
+    DepartmentSerializer,
+    DoctorSerializer,
+    PatientSerializer,
+    related_count,
+)
+
+_datetime = serializers.DateTimeField()
+
+
+def flat_serialization():
+    return getattr(settings, "FLAT_SERIALIZATION", False)
+
+
+def model_dict_fields(model):
+    """(key, attname) pairs of the fields model_to_dict() includes, in order"""
+    return [
+        (field.name, field.attname)
+        for field in model._meta.concrete_fields
+        if field.editable
+    ]
+
+
+def department_fields():
+    """(key, is a datetime) for every field DepartmentSerializer outputs"""
+    return [
+        (name, isinstance(field, serializers.DateTimeField))
+        for name, field in DepartmentSerializer().fields.items()
+    ]
+
+
+def datetime_value(value):
+    return None if value is None else _datetime.to_representation(value)
+
+
+def group_by_parent(rows):
+    """{parent id: [remaining columns, ...]} for rows led by the parent id"""
+    groups = {}
+    for parent_id, *columns in rows:
+        groups.setdefault(parent_id, []).append(columns)
+    return groups
+
+
+def first_rows(queryset, parent, ordering):
+    """The first nested_limit() rows per parent in the given ordering"""
+    return (
+        queryset.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F(parent),
+                order_by=[F(column).asc() for column in ordering],
+            )
+        )
+        .filter(position__lte=nested_limit())
+        .order_by(parent, *ordering)
+    )
+
+
+def output_names(serializer_class, fields, expand):
+    """The keys the serializer would output for this selection, in order"""
+    fields = serializer_class.plain_fields() if fields is None else fields
+    selected = set(fields) | set(expand)
+    return [name for name in serializer_class.Meta.fields if name in selected]
+
+
+def doctor_rows(queryset, fields=None, expand=()):
+    """The doctor queryset as .values() rows, for paginating"""
+    fields = DoctorSerializer.plain_fields() if fields is None else fields
+    columns = ["id", "created_at", *fields]
+    if "department_details" in expand:
+        columns.append("department_id")
+        columns.extend(f"department__{name}" for name, _ in department_fields())
+    if "assigned_patients" in expand:
+        columns.append("slug")
+        queryset = queryset.annotate(
+            assigned_patients_count=related_count(Patient, "doctor")
+        )
+        columns.append("assigned_patients_count")
+    return queryset.values(*columns)
+
+
+@timed_serialization()
+def serialize_doctors(rows, fields=None, expand=(), request=None):
+    """
+    DoctorSerializer(..., many=True).data for a page of doctor_rows(); with
+    a request, next links are absolute like the serializer's
+    """
+    ids = [row["id"] for row in rows]
+    availability = patients = {}
+    if "availability" in expand:
+        availability = group_by_parent(
+            DoctorAvailability.objects.filter(doctor_id__in=ids)
+            .order_by("doctor_id", "day", "id")
+            .values_list("doctor_id", "day", "start_time", "end_time")
+        )
+    patient_fields = model_dict_fields(Patient)
+    if "assigned_patients" in expand:
+        # created_at trails the model_to_dict() columns, for the cursor. They
+        # include doctor_id already; selecting it twice confuses the query
+        # Django wraps around the window filter
+        columns = [attname for _, attname in patient_fields] + ["created_at"]
+        parent = columns.index("doctor_id")
+        patients = {}
+        for patient in first_rows(
+            Patient.objects.filter(doctor_id__in=ids),
+            "doctor_id",
+            KeysetPagination.ordering,
+        ).values_list(*columns):
+            patients.setdefault(patient[parent], []).append(patient)
+    days = {day.value: day.name.lower() for day in DayOfWeek}
+    departments = department_fields()
+    patient_keys = [key for key, _ in patient_fields]
+
+    def department_details(row):
+        if row["department_id"] is None:
+            return None
+        return {
+            name: (
+                datetime_value(row[f"department__{name}"])
+                if is_datetime
+                else row[f"department__{name}"]
+            )
+            for name, is_datetime in departments
+        }
+
+    def assigned_patients(row):
+        shown = [
+            dict(zip(patient_keys + ["created_at"], patient))
+            for patient in patients.get(row["id"], ())
+        ]
+        return nested_collection(
+            [{key: patient[key] for key in patient_keys} for patient in shown],
+            shown,
+            row["assigned_patients_count"],
+            "doctor-patients",
+            row["slug"],
+            KeysetPagination.ordering,
+            request,
+        )
+
+    builders = {
+        "department_details": department_details,
+        "availability": lambda row: {
+            days[day]: {
+                "start_time": datetime_value(start_time),
+                "end_time": datetime_value(end_time),
+            }
+            for day, start_time, end_time in availability.get(row["id"], ())
+        },
+        "assigned_patients": assigned_patients,
+    }
+    names = output_names(DoctorSerializer, fields, expand)
+    return [
+        {name: builders[name](row) if name in builders else row[name] for name in names}
+        for row in rows
+    ]
+
+
+def patient_rows(queryset, fields=None, expand=()):
+    """The patient queryset as .values() rows, for paginating"""
+    fields = PatientSerializer.plain_fields() if fields is None else fields
+    columns = ["id", "created_at", *fields]
+    if "doctor" in expand:
+        columns.append("doctor_id")
+        columns.extend(f"doctor__{attname}" for _, attname in model_dict_fields(Doctor))
+    if "appointments" in expand:
+        columns.append("slug")
+        queryset = queryset.annotate(
+            appointments_count=related_count(Appointment, "patient")
+        )
+        columns.append("appointments_count")
+    return queryset.values(*columns)
+
+
+@timed_serialization()
+def serialize_patients(rows, fields=None, expand=(), request=None):
+    """PatientSerializer(..., many=True).data for a page of patient_rows()"""
+    ids = [row["id"] for row in rows]
+    histories = appointments = {}
+    if "medical_history" in expand:
+        histories = {}
+        for patient_id, *history in (
+            MedicalHistory.objects.filter(patient_id__in=ids)
+            .order_by("patient_id", "id")
+            .values_list("patient_id", "previous_diagnoses", "allergies", "medications")
+        ):
+            # The serializer reports a patient's first history only
+            histories.setdefault(patient_id, history)
+    if "appointments" in expand:
+        appointments = group_by_parent(
+            first_rows(
+                Appointment.objects.filter(patient_id__in=ids),
+                "patient_id",
+                APPOINTMENT_ORDERING,
+            ).values_list("patient_id", "date", "details", "id")
+        )
+    doctor_fields = model_dict_fields(Doctor)
+
+    def medical_history(row):
+        history = histories.get(row["id"])
+        if history is None:
+            return None
+        return dict(zip(("previous_diagnoses", "allergies", "medications"), history))
+
+    def doctor(row):
+        if row["doctor_id"] is None:
+            return None
+        return {key: row[f"doctor__{attname}"] for key, attname in doctor_fields}
+
+    def patient_appointments(row):
+        shown = [
+            dict(zip(("date", "details", "id"), appointment))
+            for appointment in appointments.get(row["id"], ())
+        ]
+        return nested_collection(
+            [
+                {"date": datetime_value(item["date"]), "details": item["details"]}
+                for item in shown
+            ],
+            shown,
+            row["appointments_count"],
+            "patient-appointments",
+            row["slug"],
+            APPOINTMENT_ORDERING,
+            request,
+        )
+
+    builders = {
+        "medical_history": medical_history,
+        "appointments": patient_appointments,
+        "doctor": doctor,
+    }
+    names = output_names(PatientSerializer, fields, expand)
+    return [
+        {name: builders[name](row) if name in builders else row[name] for name in names}
+        for row in rows
+    ]
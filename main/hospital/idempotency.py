@@ -0,0 +1,180 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+A client that sends an Idempotency-Key header can retry a POST safely. The
+first request with a key inserts an IdempotencyKey row, runs the view and
+stores its response on that row, all in one transaction, so the write and
+the stored response commit together or not at all. A retry finds the row
+and gets the stored response back without running the view again.
+
+Keys are scoped to the authenticated user (anonymous requests share one
+scope), so two clients picking the same key do not see each other's
+responses. The (scope, key) pair is unique. A duplicate that arrives while
+the first request is still running blocks on its insert until that
+transaction ends. It then replays the committed response and headers, or, if
+the first attempt failed and rolled back, runs the view itself. A database
+that gives up waiting instead, as SQLite does once its busy timeout passes,
+gets a 409 asking the client to retry. Only successful responses are stored;
+a failed attempt leaves nothing behind and the client may retry it with the
+same key. Reusing a key for a different request is rejected with 422.
+
+Because the stored response commits with the write, locks the view takes,
+such as the doctor row locked while booking, are held until the response has
+been stored: one more UPDATE of the key row.
+
+Rows are kept for settings.IDEMPOTENCY_KEY_TTL seconds and removed by the
+purge_idempotency_keys command; an expired key counts as unused.
+"""
+
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Set on a response that was replayed rather than produced by the view
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class IdempotencyError(Exception):
+    status_code = 400
+
+
+class KeyReused(IdempotencyError):
+    status_code = 422
+
+
+class KeyInProgress(IdempotencyError):
+    status_code = 409
+
+
+# View headers that are not replayed; the renderer sets them again
+SKIPPED_HEADERS = {"content-type", "content-length"}
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_KEY_TTL", 86400))
+
+
+def key_scope(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return "anonymous"
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode("utf-8"))
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def claim(scope, key, fingerprint):
+    """
+    The IdempotencyKey row for key, inserted if the key is unused. A row
+    with a status_code belongs to a completed request. Must run inside the
+    transaction that does the write.
+    """
+    while True:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    scope=scope, key=key, fingerprint=fingerprint
+                )
+        except IntegrityError:
+            pass
+        except OperationalError:
+            # Timed out waiting for the request that holds the key
+            raise KeyInProgress(
+                f"A request with this {IDEMPOTENCY_HEADER} is in progress; retry"
+            )
+        # Committed by another request, which may have taken a while
+        record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+        if record is None:
+            # Purged in the meantime
+            continue
+        if record.created_at < timezone.now() - key_ttl():
+            IdempotencyKey.objects.filter(pk=record.pk).delete()
+            continue
+        if record.fingerprint != fingerprint:
+            raise KeyReused(f"{IDEMPOTENCY_HEADER} was used for a different request")
+        return record
+
+
+def replay(record):
+    response = Response(
+        record.response, status=record.status_code, headers=record.headers
+    )
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def stored_headers(response):
+    return {
+        name: value
+        for name, value in response.items()
+        if name.lower() not in SKIPPED_HEADERS
+    }
+
+
+def idempotent(method):
+    """
+    Make a POST handler idempotent for requests that carry an
+    Idempotency-Key header; requests without one run as before
+    """
+
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return method(view, request, *args, **kwargs)
+        max_length = IdempotencyKey._meta.get_field("key").max_length
+        if not 0 < len(key) <= max_length:
+            return Response(
+                {"error": f"{IDEMPOTENCY_HEADER} must be 1 to {max_length} characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = request_fingerprint(request)
+        with transaction.atomic():
+            try:
+                record = claim(key_scope(request), key, fingerprint)
+            except KeyInProgress as error:
+                transaction.set_rollback(True)
+                return Response(
+                    {"error": str(error)},
+                    status=error.status_code,
+                    headers={"Retry-After": "1"},
+                )
+            except IdempotencyError as error:
+                return Response({"error": str(error)}, status=error.status_code)
+            if record.status_code is not None:
+                return replay(record)
+
+            response = method(view, request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                record.status_code = response.status_code
+                record.response = response.data
+                record.headers = stored_headers(response)
+                record.save(update_fields=["status_code", "response", "headers"])
+            else:
+                # Undo any partial write and free the key for a retry
+                transaction.set_rollback(True)
+        return response
+
+    return wrapper
+
+
+def purge_expired():
+    """Delete the keys older than settings.IDEMPOTENCY_KEY_TTL; returns how many"""
+    deleted, _ = IdempotencyKey.objects.filter(
+        created_at__lt=timezone.now() - key_ttl()
+    ).delete()
+    return deleted
@@ -0,0 +1,114 @@
+"""
+Minimal HTTP load generator for comparing deployments, e.g. the WSGI
+endpoints under sync gunicorn workers against the async endpoints under
+uvicorn workers.
+
+Each of `concurrency` clients keeps one HTTP/1.1 keep-alive connection open
+and sends requests back to back until the shared request budget is spent,
+so the server sees a steady number of requests in flight. Only the standard
+library is used, which keeps the client overhead small and the numbers
+comparable between runs.
+"""
+
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from .stats import percentile
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    completed = len(latencies)
+    return {
+        "requests": completed + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(completed / elapsed, 1) if elapsed else None,
+        "mean_ms": round(sum(latencies) / completed * 1000, 2) if completed else None,
+        **{
+            f"p{int(fraction * 100)}_ms": (
+                round(percentile(latencies, fraction) * 1000, 2) if completed else None
+            )
+            for fraction in (0.5, 0.95, 0.99)
+        },
+    }
+
+
+async def read_response(reader):
+    """Read one response, returning its status code; the body is discarded"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by server")
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+        headers["connection"] = "close"
+    return status, headers.get("connection") == "close"
+
+
+async def client(url, budget, latencies, failures, extra_headers):
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    target = parts.path or "/"
+    if parts.query:
+        target += f"?{parts.query}"
+    request = (
+        f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+        + "".join(f"{name}: {value}\r\n" for name, value in extra_headers.items())
+        + "\r\n"
+    ).encode("latin-1")
+
+    writer = None
+    while budget[0] > 0:
+        budget[0] -= 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(
+                    parts.hostname, port, ssl=parts.scheme == "https"
+                )
+            started = time.perf_counter()
+            writer.write(request)
+            status, closed = await read_response(reader)
+            elapsed = time.perf_counter() - started
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            failures.append(None)
+            closed = True
+        else:
+            if status < 400:
+                latencies.append(elapsed)
+            else:
+                failures.append(status)
+        if closed and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run(url, requests=1000, concurrency=50, headers=None):
+    """Send `requests` GETs to url from `concurrency` connections and summarize"""
+    latencies, failures = [], []
+    budget = [requests]
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            client(url, budget, latencies, failures, headers or {})
+            for _ in range(concurrency)
+        )
+    )
+    return summarize(latencies, len(failures), time.perf_counter() - started)
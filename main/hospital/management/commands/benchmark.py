@@ -0,0 +1,132 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from hospital.benchmark import (
+    SCENARIOS,
+    compare,
+    environment,
+    run_http,
+    run_in_process,
+    scenario_paths,
+    serialization_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API endpoints against the current database and report "
+        "requests/sec, latency percentiles and queries per request as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=sorted(SCENARIOS),
+            help="Run only this scenario; repeat for several",
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--warmup", type=int, default=20, help="Unmeasured requests sent first"
+        )
+        parser.add_argument(
+            "--base-url",
+            help="Benchmark a running server, e.g. http://localhost:8000, "
+            "instead of calling the views in-process",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=10,
+            help="Connections kept busy with --base-url",
+        )
+        parser.add_argument(
+            "--cache",
+            action="store_true",
+            help="Keep the response cache on for in-process runs; by default "
+            "every request does the full work",
+        )
+        parser.add_argument("--output", help="Write the JSON results to this file")
+        parser.add_argument(
+            "--compare", help="Earlier JSON results to report relative changes against"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            paths = scenario_paths(options["scenario"])
+        except ValueError as error:
+            raise CommandError(error)
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                baseline = json.load(file)
+
+        base_url = options["base_url"]
+        results = {
+            "environment": environment(),
+            "mode": "http" if base_url else "in-process",
+            "requests": options["requests"],
+            "scenarios": {},
+        }
+        if base_url:
+            results["base_url"] = base_url
+            results["concurrency"] = options["concurrency"]
+        cache = {} if options["cache"] else {"RESPONSE_CACHE_ALIAS": None}
+        for name, path in paths.items():
+            if base_url:
+                result = run_http(
+                    base_url,
+                    path,
+                    options["requests"],
+                    options["warmup"],
+                    options["concurrency"],
+                )
+            else:
+                with override_settings(**cache):
+                    result = run_in_process(
+                        path, options["requests"], options["warmup"]
+                    )
+            results["scenarios"][name] = {"path": path, **result}
+            if options["verbosity"] > 1:
+                self.stderr.write(f"{name}: {result['rps']} req/s")
+        results["serialization"] = serialization_benchmark()
+        if baseline is not None:
+            results["changes"] = compare(results, baseline)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+            self.stderr.write(f"Wrote {options['output']}")
+
+        columns = ("rps", "p50_ms", "p95_ms", "p99_ms", "queries", "errors")
+        self.stdout.write(f"{'scenario':<24}" + "".join(f"{c:>10}" for c in columns))
+        for name, result in results["scenarios"].items():
+            self.stdout.write(
+                f"{name:<24}" + "".join(f"{str(result[c]):>10}" for c in columns)
+            )
+        for name, change in results.get("changes", {}).items():
+            self.stdout.write(
+                f"{name:<24}"
+                + "".join(
+                    f"{'' if change.get(c) is None else f'{change[c]:+}':>10}"
+                    for c in columns[:5]
+                )
+            )
+
+        columns = (
+            "serializer_ms",
+            "flat_ms",
+            "json_renderer_ms",
+            "fast_renderer_ms",
+            "speedup",
+            "identical",
+        )
+        self.stdout.write(
+            f"\n{'serialization':<24}" + "".join(f"{c:>18}" for c in columns)
+        )
+        for name, result in results["serialization"].items():
+            self.stdout.write(
+                f"{name:<24}" + "".join(f"{str(result[c]):>18}" for c in columns)
+            )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from hospital.bulk import EXPORTERS, export_rows
+
+
+class Command(BaseCommand):
+    help = "Export every patient with medical history and appointments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=sorted(EXPORTERS), default="jsonl", dest="file_format"
+        )
+        parser.add_argument(
+            "--output", help="File to write to; defaults to standard output"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, file_format, output, chunk_size, **options):
+        exporter, _ = EXPORTERS[file_format]
+        lines = exporter(export_rows(chunk_size=chunk_size))
+        if output is None:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(output, "w", newline="", encoding="utf-8") as file:
+            file.writelines(lines)
+        self.stderr.write(f"Wrote {output}")
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from hospital.dashboard import counters_enabled, rebuild_counters
+from hospital.dataset import generate
+
+# A doctor brings about four availability rows along with their own
+ROWS_PER_DOCTOR = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic departments, doctors, availability, "
+        "patients, medical histories and appointments for benchmarking"
+    )
+
+    def add_arguments(self, parser):
+        size = parser.add_mutually_exclusive_group()
+        size.add_argument("--patients", type=int, help="Number of patients")
+        size.add_argument(
+            "--rows",
+            type=int,
+            help="Approximate total rows across all tables, e.g. 10000 to 10000000",
+        )
+        parser.add_argument("--patients-per-doctor", type=int, default=50)
+        parser.add_argument("--doctors-per-department", type=int, default=25)
+        parser.add_argument("--appointments-per-patient", type=int, default=2)
+        parser.add_argument(
+            "--fill",
+            type=float,
+            default=0.6,
+            help="Share of each doctor's slots that get booked, week by week",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, patients, rows, **options):
+        if not 0 < options["fill"] <= 1:
+            raise CommandError("--fill must be greater than 0 and at most 1")
+        if patients is None:
+            # Per patient: itself, a medical history and its appointments
+            per_patient = (
+                2
+                + options["appointments_per_patient"]
+                + ROWS_PER_DOCTOR / options["patients_per_doctor"]
+            )
+            patients = max(1, round((rows or 10000) / per_patient))
+
+        def progress(counts):
+            self.stderr.write(
+                f"{counts['doctors']} doctors, {counts['patients']}/{patients} patients"
+            )
+
+        counts = generate(
+            patients=patients,
+            patients_per_doctor=options["patients_per_doctor"],
+            doctors_per_department=options["doctors_per_department"],
+            appointments_per_patient=options["appointments_per_patient"],
+            fill=options["fill"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+            progress=progress if options["verbosity"] > 1 else None,
+        )
+        if counters_enabled():
+            # bulk_create skips the signals that keep the counters current
+            rebuild_counters()
+        for name, number in counts.items():
+            self.stdout.write(f"{name:<20}{number:>12}")
+        self.stdout.write(f"{'total':<20}{sum(counts.values()):>12}")
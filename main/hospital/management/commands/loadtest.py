@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+
+from hospital.loadtest import run
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark GET endpoints at a fixed concurrency and report requests/sec "
+        "and latency percentiles, e.g. the WSGI and ASGI deployments side by side"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="Absolute URLs to benchmark")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument(
+            "--warmup", type=int, default=100, help="Unmeasured requests sent first"
+        )
+        parser.add_argument(
+            "--header", action="append", default=[], help="Extra header, Name: value"
+        )
+        parser.add_argument("--json", action="store_true", help="Print JSON results")
+
+    def handle(self, *args, urls, requests, concurrency, warmup, header, **options):
+        headers = dict(
+            (name.strip(), value.strip())
+            for name, _, value in (item.partition(":") for item in header)
+        )
+        results = {}
+        for url in urls:
+            if warmup:
+                asyncio.run(run(url, warmup, min(concurrency, warmup), headers))
+            results[url] = asyncio.run(run(url, requests, concurrency, headers))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        columns = ("rps", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "errors")
+        self.stdout.write(f"{'url':<50}" + "".join(f"{c:>10}" for c in columns))
+        for url, result in results.items():
+            self.stdout.write(
+                f"{url:<50}" + "".join(f"{str(result[c]):>10}" for c in columns)
+            )
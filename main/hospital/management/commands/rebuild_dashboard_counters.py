@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from hospital.dashboard import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Recount every department's dashboard counter rows"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_counters()
+        self.stdout.write("Dashboard counters rebuilt")
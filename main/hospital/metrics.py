@@ -0,0 +1,286 @@
+"""
+Per-view request timings.
+
+PerformanceMiddleware times every request: wall time, the number of SQL
+queries and the time spent in them, the time spent serializing (building a
+serializer's .data, or the flat serialization, queries it runs included)
+and the time taken to render the response (DRF's JSON encoding). The
+figures go out in a Server-Timing header, so browser dev tools show them, and into rolling summaries per view.
+Each summary keeps the last settings.PERFORMANCE_WINDOW observations for
+its p50/p95/p99 plus a lifetime count and sum, and render_metrics() exposes
+them in the Prometheus text format. Requests slower than
+settings.SLOW_REQUEST_MS are logged to "hospital.performance" with their
+slowest statements.
+
+Queries are timed by an execute wrapper installed on every connection as it
+opens. It finds the current request through a context variable, which also
+reaches the worker threads that run the ORM for async views.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .cache import cache_stats
+from .stats import percentile
+
+logger = logging.getLogger("hospital.performance")
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Statements included in a slow-request log entry, slowest first
+SLOW_REQUEST_STATEMENTS = 10
+
+_current = ContextVar("hospital_request_timer", default=None)
+_lock = threading.Lock()
+_summaries = {}
+
+METRICS = {
+    "request_seconds": "Request wall time",
+    "db_seconds": "Time spent in SQL queries per request",
+    "db_queries": "SQL queries per request",
+    "serialize_seconds": "Serialization time",
+    "render_seconds": "Response rendering (JSON encoding) time",
+}
+# Pool statistics that only ever grow; the rest are gauges
+POOL_COUNTERS = ("connections_opened", "connections_reused", "waits")
+
+
+class RollingSummary:
+    """Quantiles over the last `window` observations, with lifetime count and sum"""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self):
+        samples = sorted(self.samples)
+        return {fraction: percentile(samples, fraction) for fraction in QUANTILES}
+
+
+def observe(view, metric, value):
+    with _lock:
+        summary = _summaries.get((metric, view))
+        if summary is None:
+            summary = RollingSummary(getattr(settings, "PERFORMANCE_WINDOW", 1000))
+            _summaries[(metric, view)] = summary
+        summary.observe(value)
+
+
+def reset():
+    with _lock:
+        _summaries.clear()
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper: time the statement against the current request, if any"""
+    timer = _current.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        timer.db_time += duration
+        # Statements only, never params: they carry patient data
+        timer.queries.append((duration, sql))
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver; a reconnecting wrapper keeps its list"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.view = "unmatched"
+        self.db_time = 0.0
+        self.queries = []
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.render_time = 0.0
+        self.render_start = None
+
+    def render_started(self):
+        self.render_start = time.perf_counter()
+
+    def render_finished(self, response):
+        self.render_time += time.perf_counter() - self.render_start
+        return response
+
+
+@contextmanager
+def timed_serialization():
+    """
+    Count the enclosed block as the current request's serialization time;
+    blocks nested in one another, like a nested serializer's, count once
+    """
+    timer = _current.get()
+    if timer is None or timer.serializing:
+        yield
+        return
+    timer.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.serialize_time += time.perf_counter() - start
+        timer.serializing = False
+
+
+def view_name(view_func):
+    view_class = getattr(view_func, "cls", None) or getattr(
+        view_func, "view_class", None
+    )
+    if view_class is None:
+        return view_func.__name__
+    return view_class.__name__
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = RequestTimer()
+        request._timer = timer
+        token = _current.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timer)
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        request._timer = timer
+        token = _current.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timer)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = view_name(view_func)
+        # Viewsets serve several actions from one class
+        action = getattr(view_func, "actions", {}).get(request.method.lower())
+        request._timer.view = f"{name}.{action}" if action else name
+
+    def process_template_response(self, request, response):
+        # Runs just before rendering; the callback runs just after
+        request._timer.render_started()
+        response.add_post_render_callback(request._timer.render_finished)
+        return response
+
+    def finish(self, request, response, timer):
+        total = time.perf_counter() - timer.start
+        observe(timer.view, "request_seconds", total)
+        observe(timer.view, "db_seconds", timer.db_time)
+        observe(timer.view, "db_queries", len(timer.queries))
+        observe(timer.view, "serialize_seconds", timer.serialize_time)
+        observe(timer.view, "render_seconds", timer.render_time)
+
+        response["Server-Timing"] = (
+            f"total;dur={total * 1000:.1f}, "
+            f'db;dur={timer.db_time * 1000:.1f};desc="{len(timer.queries)} queries", '
+            f"serialize;dur={timer.serialize_time * 1000:.1f}, "
+            f"render;dur={timer.render_time * 1000:.1f}"
+        )
+
+        threshold = getattr(settings, "SLOW_REQUEST_MS", 0)
+        if threshold and total * 1000 >= threshold:
+            slowest = sorted(timer.queries, key=lambda query: query[0], reverse=True)
+            logger.warning(
+                "Slow request: %s %s (%s) %.1f ms, %d queries in %.1f ms%s",
+                request.method,
+                request.get_full_path(),
+                timer.view,
+                total * 1000,
+                len(timer.queries),
+                timer.db_time * 1000,
+                "".join(
+                    f"\n  {duration * 1000:.1f} ms  {sql}"
+                    for duration, sql in slowest[:SLOW_REQUEST_STATEMENTS]
+                ),
+            )
+        return response
+
+
+def pool_status():
+    """Pool statistics when the pooled PostgreSQL backend is in use"""
+    engines = {database["ENGINE"] for database in settings.DATABASES.values()}
+    if "hospital.db.postgresql_pool" not in engines:
+        return {}
+    from .db.postgresql_pool.base import pool_status
+
+    return pool_status()
+
+
+def _format(value):
+    return "NaN" if value is None else repr(float(value))
+
+
+def render_metrics():
+    """Every metric in the Prometheus text exposition format"""
+    with _lock:
+        summaries = {
+            key: (summary.quantiles(), summary.count, summary.total)
+            for key, summary in _summaries.items()
+        }
+
+    lines = []
+    for metric, description in METRICS.items():
+        name = f"hospital_{metric}"
+        lines.append(f"# HELP {name} {description}, by view")
+        lines.append(f"# TYPE {name} summary")
+        for (summary_metric, view), (quantiles, count, total) in sorted(
+            summaries.items()
+        ):
+            if summary_metric != metric:
+                continue
+            for fraction, value in quantiles.items():
+                lines.append(
+                    f'{name}{{view="{view}",quantile="{fraction}"}} {_format(value)}'
+                )
+            lines.append(f'{name}_sum{{view="{view}"}} {_format(total)}')
+            lines.append(f'{name}_count{{view="{view}"}} {count}')
+
+    for outcome, count in cache_stats().items():
+        name = f"hospital_response_cache_{outcome}_total"
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {count}")
+
+    pools = pool_status()
+    if pools:
+        for key in next(iter(pools.values())):
+            if key in POOL_COUNTERS:
+                name = f"hospital_db_pool_{key}_total"
+                lines.append(f"# TYPE {name} counter")
+            else:
+                name = f"hospital_db_pool_{key}"
+                lines.append(f"# TYPE {name} gauge")
+            for pool, status in sorted(pools.items()):
+                lines.append(f'{name}{{pool="{pool}"}} {status[key]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hospital", "0002_remove_appointment_doctor_appointment_created_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="department",
+            index=models.Index(
+                fields=["created_at", "id"], name="department_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(
+                fields=["created_at", "id"], name="doctor_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patient",
+            index=models.Index(
+                fields=["created_at", "id"], name="patient_created_id_idx"
+            ),
+        ),
+    ]
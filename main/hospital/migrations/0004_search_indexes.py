@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:40
+
+from django.db import migrations
+
+TABLES = ("hospital_department", "hospital_doctor", "hospital_patient")
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in TABLES:
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx "
+                f"ON {table} USING gin (name gin_trgm_ops)"
+            )
+    elif vendor == "sqlite":
+        for table in TABLES:
+            fts_table = f"{table}_fts"
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+                f"name, content='{table}', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+            schema_editor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} "
+                f"BEGIN INSERT INTO {fts_table}(rowid, name) "
+                "VALUES (new.id, new.name); END"
+            )
+            schema_editor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} "
+                f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+                "VALUES ('delete', old.id, old.name); END"
+            )
+            schema_editor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au "
+                f"AFTER UPDATE OF name ON {table} "
+                f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+                "VALUES ('delete', old.id, old.name); "
+                f"INSERT INTO {fts_table}(rowid, name) VALUES (new.id, new.name); END"
+            )
+            schema_editor.execute(
+                f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"
+            )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for table in TABLES:
+        if vendor == "postgresql":
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_name_trgm_idx")
+        elif vendor == "sqlite":
+            for suffix in ("ai", "ad", "au"):
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+            schema_editor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hospital", "0003_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
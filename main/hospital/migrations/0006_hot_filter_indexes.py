@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hospital", "0005_appointment_slots"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["patient", "date"], name="appointment_patient_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(
+                fields=["specialization", "created_at", "id"],
+                name="doctor_specialization_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="doctoravailability",
+            index=models.Index(
+                fields=["doctor", "day"], name="availability_doctor_day_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patient",
+            index=models.Index(
+                fields=["doctor", "created_at", "id"], name="patient_doctor_created_idx"
+            ),
+        ),
+        # The composite indexes above lead with these foreign keys
+        migrations.AlterField(
+            model_name="appointment",
+            name="patient",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="hospital.patient",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="doctoravailability",
+            name="doctor",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="hospital.doctor",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="patient",
+            name="doctor",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="hospital.doctor",
+            ),
+        ),
+    ]
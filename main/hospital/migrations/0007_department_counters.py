@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hospital", "0006_hot_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DepartmentDailyAppointments",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("appointment_count", models.PositiveIntegerField(default=0)),
+                (
+                    "department",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="hospital.department",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DepartmentCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("doctor_count", models.PositiveIntegerField(default=0)),
+                ("patient_count", models.PositiveIntegerField(default=0)),
+                (
+                    "department",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="counter",
+                        to="hospital.department",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="departmentdailyappointments",
+            constraint=models.UniqueConstraint(
+                fields=("department", "date"), name="unique_department_day"
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hospital", "0008_idempotency_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DepartmentWeekdaySeats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "weekday",
+                    models.IntegerField(
+                        choices=[
+                            (1, "MONDAY"),
+                            (2, "TUESDAY"),
+                            (3, "WEDNESDAY"),
+                            (4, "THURSDAY"),
+                            (5, "FRIDAY"),
+                            (6, "SATURDAY"),
+                            (7, "SUNDAY"),
+                        ]
+                    ),
+                ),
+                ("seat_count", models.PositiveIntegerField(default=0)),
+                (
+                    "department",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="hospital.department",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="departmentweekdayseats",
+            constraint=models.UniqueConstraint(
+                fields=("department", "weekday"), name="unique_department_weekday"
+            ),
+        ),
+    ]
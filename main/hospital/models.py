@@ -1,7 +1,8 @@
 from django.db import models
-from django.utils.text import slugify
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
 from .enum import DayOfWeek, Gender
+from .slugs import SlugManager, save_with_slug
 
 # Phone Number Regex
 phone_regex = RegexValidator(
@@ -28,13 +29,19 @@ class Department(BaseModel):
     services_offered = models.TextField()
     slug = models.SlugField(null=True, unique=True, db_index=True)
 
+    objects = SlugManager()
+
+    class Meta:
+        indexes = [
+            # Backs the (created_at, id) ordering used by keyset pagination
+            models.Index(fields=["created_at", "id"], name="department_created_id_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        save_with_slug(self, super().save, *args, **kwargs)
 
 
 class Doctor(BaseModel):
@@ -44,21 +51,37 @@ class Doctor(BaseModel):
     contact_information = models.CharField(validators=[phone_regex], max_length=255)
     department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True)
 
+    objects = SlugManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="doctor_created_id_idx"),
+            # Specialization filter, still in list order
+            models.Index(
+                fields=["specialization", "created_at", "id"],
+                name="doctor_specialization_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        save_with_slug(self, super().save, *args, **kwargs)
 
 
 class DoctorAvailability(BaseModel):
     day = models.IntegerField(choices=DayOfWeek.choices())
-    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    # Indexed by availability_doctor_day_idx, which leads with doctor
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, db_index=False)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["doctor", "day"], name="availability_doctor_day_idx"),
+        ]
+
     def __str__(self):
         day_string = dict(self.DAY_CHOICES).get(self.day)
         return f"{self.doctor.name} available on {day_string} from {self.start_time} to {self.end_time}"
@@ -70,15 +93,28 @@ class Patient(BaseModel):
     age = models.PositiveIntegerField()
     gender = models.CharField(max_length=1, choices=Gender.choices())
     contact_information = models.CharField(validators=[phone_regex], max_length=255)
-    doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, null=True)
+    # Indexed by patient_doctor_created_idx, which leads with doctor
+    doctor = models.ForeignKey(
+        Doctor, on_delete=models.SET_NULL, null=True, db_index=False
+    )
+
+    objects = SlugManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="patient_created_id_idx"),
+            # A doctor's patients, in list order
+            models.Index(
+                fields=["doctor", "created_at", "id"], name="patient_doctor_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        save_with_slug(self, super().save, *args, **kwargs)
+
 
 class MedicalHistory(BaseModel):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
@@ -91,9 +127,94 @@ class MedicalHistory(BaseModel):
 
 
 class Appointment(BaseModel):
-    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    # Indexed by appointment_patient_date_idx, which leads with patient
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, db_index=False)
     date = models.DateTimeField()
     details = models.TextField()
+    # Filled in by the booking engine; legacy rows leave them empty
+    doctor = models.ForeignKey(Doctor, on_delete=models.SET_NULL, null=True)
+    slot_start = models.DateTimeField(null=True)
+    seat = models.PositiveSmallIntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            # A patient's appointments by date
+            models.Index(
+                fields=["patient", "date"], name="appointment_patient_date_idx"
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["doctor", "slot_start", "seat"], name="unique_appointment_seat"
+            ),
+            models.UniqueConstraint(
+                fields=["patient", "slot_start"], name="unique_patient_slot"
+            ),
+        ]
 
     def __str__(self):
         return f"Appointment on {self.date} for {self.patient.name}"
+
+
+class DepartmentCounter(models.Model):
+    """Dashboard counts per department, kept current by hospital.dashboard"""
+
+    department = models.OneToOneField(
+        Department, on_delete=models.CASCADE, related_name="counter"
+    )
+    doctor_count = models.PositiveIntegerField(default=0)
+    patient_count = models.PositiveIntegerField(default=0)
+
+
+class DepartmentDailyAppointments(models.Model):
+    """Appointments per department and day, kept current by hospital.dashboard"""
+
+    department = models.ForeignKey(Department, on_delete=models.CASCADE)
+    date = models.DateField()
+    appointment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["department", "date"], name="unique_department_day"
+            ),
+        ]
+
+
+class DepartmentWeekdaySeats(models.Model):
+    """Bookable seats per department and weekday, kept current by hospital.dashboard"""
+
+    department = models.ForeignKey(Department, on_delete=models.CASCADE)
+    weekday = models.IntegerField(choices=DayOfWeek.choices())
+    seat_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["department", "weekday"], name="unique_department_weekday"
+            ),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """A POST's response, replayed for retries that send the same Idempotency-Key"""
+
+    # Whose key it is ("user:<id>" or "anonymous"), so clients cannot collide
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    # Hash of the method, path and body the key was first used with
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    # Headers set by the view, such as Location, sent again on replay
+    headers = models.JSONField(default=dict)
+    # Purged settings.IDEMPOTENCY_KEY_TTL seconds after this
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            # A concurrent duplicate waits on the first request's insert
+            models.UniqueConstraint(
+                fields=["scope", "key"], name="unique_idempotency_key"
+            ),
+        ]
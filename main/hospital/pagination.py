@@ -0,0 +1,242 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .cache import cached_count
+
+# Keyset ordering of a patient's appointments, backed by (patient, date)
+APPOINTMENT_ORDERING = ("date", "id")
+
+
+class OptionalCountLimitOffsetPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination whose COUNT(*) can be skipped with ?count=false.
+    Without a count one extra row is fetched to decide whether a next page exists.
+    A view with a count_entity has its count cached until that entity changes.
+    """
+
+    count_query_param = "count"
+
+    def include_count(self, request):
+        value = request.query_params.get(self.count_query_param, "true")
+        return value.lower() not in ("0", "false", "no")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.include_count(request):
+            self.count_entity = getattr(view, "count_entity", None)
+            return super().paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = None
+        self.offset = self.get_offset(request)
+        page = list(queryset[self.offset : self.offset + self.limit + 1])
+        self.has_next = len(page) > self.limit
+        return page[: self.limit]
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset for async views, fetching through the async ORM"""
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.offset = self.get_offset(request)
+        if not self.include_count(request):
+            self.count = None
+            end = self.offset + self.limit + 1
+            page = [obj async for obj in queryset[self.offset : end]]
+            self.has_next = len(page) > self.limit
+            return page[: self.limit]
+
+        self.count = await queryset.acount()
+        if self.count == 0 or self.offset > self.count:
+            return []
+        end = self.offset + self.limit
+        # async for runs the query, prefetches included, in a worker thread
+        return [obj async for obj in queryset[self.offset : end]]
+
+    def get_count(self, queryset):
+        if self.count_entity is None:
+            return super().get_count(queryset)
+        return cached_count(queryset, self.count_entity, self.request)
+
+    def get_next_link(self):
+        if self.count is None and not self.has_next:
+            return None
+        if self.count is not None and self.offset + self.limit >= self.count:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is None:
+            del response.data["count"]
+        return response
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a (column, id) key, e.g. ?cursor=&limit=50.
+    Each page is a range scan on the matching composite index, so its cost
+    does not depend on how deep the client has paged.
+    """
+
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    ordering = ("created_at", "id")
+    max_limit = 1000
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = ordering
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        if limit <= 0:
+            return api_settings.PAGE_SIZE
+        return min(limit, self.max_limit)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound("Invalid cursor")
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound("Invalid cursor")
+        return position
+
+    def encode_cursor(self, instance):
+        # A model instance, or a .values() row in flat serialization
+        if isinstance(instance, dict):
+            position = [str(instance[field]) for field in self.ordering]
+        else:
+            position = [str(getattr(instance, field)) for field in self.ordering]
+        return urlsafe_b64encode(json.dumps(position).encode("ascii")).decode("ascii")
+
+    def get_page_queryset(self, queryset, request):
+        """The rows after the cursor, plus one to tell whether a next page exists"""
+        self.request = request
+        self.limit = self.get_limit(request)
+        column, tiebreak = self.ordering
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, last_id = position
+            queryset = queryset.filter(
+                Q(**{f"{column}__gt": value})
+                | Q(**{column: value, f"{tiebreak}__gt": last_id})
+            )
+        return queryset[: self.limit + 1]
+
+    def get_page(self, page):
+        self.next_instance = page[self.limit - 1] if len(page) > self.limit else None
+        return page[: self.limit]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        try:
+            page = list(self.get_page_queryset(queryset, request))
+        except (ValidationError, ValueError):
+            raise NotFound("Invalid cursor")
+        return self.get_page(page)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        try:
+            page = [obj async for obj in self.get_page_queryset(queryset, request)]
+        except (ValidationError, ValueError):
+            raise NotFound("Invalid cursor")
+        return self.get_page(page)
+
+    def get_next_link(self):
+        if self.next_instance is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.next_instance)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+
+class HospitalPagination(BasePagination):
+    """
+    Offset pagination by default; passing ?cursor (empty for the first page)
+    switches the listing to keyset pagination ordered by (created_at, id).
+    That order would discard the ranking of ?search=, so the two cannot be
+    combined; search results page by offset.
+    """
+
+    search_query_param = "search"
+
+    def get_paginator(self, request):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            if request.query_params.get(self.search_query_param, "").strip():
+                raise ParseError(
+                    "?cursor= cannot be combined with ?search=; "
+                    "page search results with ?offset="
+                )
+            return KeysetPagination()
+        return OptionalCountLimitOffsetPagination()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return self.paginator.paginate_queryset(queryset, request, view=view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.paginator = self.get_paginator(request)
+        return await self.paginator.apaginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+
+def nested_limit():
+    """How many rows of a nested collection a doctor or patient payload carries"""
+    return getattr(settings, "NESTED_COLLECTION_LIMIT", 20)
+
+
+def nested_collection(results, rows, count, url_name, slug, ordering, request=None):
+    """
+    A bounded nested collection: the serialized first rows of a relation,
+    its total count, and a link to the sub-resource page that continues
+    after the last of them (None when they are all there). rows are the
+    instances or dicts results was built from, for the cursor.
+    """
+    next_link = None
+    if count > len(rows):
+        url = reverse(
+            f"Hospital Management:{url_name}", kwargs={"slug": slug}, request=request
+        )
+        next_link = replace_query_param(
+            url,
+            KeysetPagination.cursor_query_param,
+            KeysetPagination(ordering).encode_cursor(rows[-1]),
+        )
+    return {"count": count, "next": next_link, "results": results}
@@ -0,0 +1,102 @@
+"""
+Free appointment slots for a doctor over a range of days.
+
+The weekly DoctorAvailability template is expanded day by day into the
+booking engine's slots (settings.APPOINTMENT_SLOT_MINUTES long, aligned to
+midnight, APPOINTMENT_SLOT_CAPACITY seats each). Bookings for the range are
+read in slot order, and one sweep over both sorted sequences subtracts them.
+That takes two queries, both on indexes: the template, and the bookings
+between the first and last day. The work is O(slots + appointments).
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .availability import weekly_slots
+from .models import Appointment, Doctor, DoctorAvailability
+
+MINUTES_PER_DAY = 24 * 60
+# Longest range one request may ask for, in days
+MAX_RANGE_DAYS = 62
+
+
+def _minutes(value, round_up=False):
+    if value == time.max:
+        return MINUTES_PER_DAY
+    minutes = value.hour * 60 + value.minute
+    if round_up and (value.second or value.microsecond):
+        minutes += 1
+    return minutes
+
+
+def slot_starts(intervals, slot_minutes):
+    """Minutes past midnight of every slot lying wholly inside the intervals"""
+    starts, ends = intervals
+    for start, end in zip(starts, ends):
+        start = -(-_minutes(start, round_up=True) // slot_minutes) * slot_minutes
+        end = _minutes(end)
+        yield from range(start, end - slot_minutes + 1, slot_minutes)
+
+
+def free_slots(slug, first_day, last_day):
+    """
+    Slots with a free seat from first_day through last_day (dates, local
+    time), as dicts with start, end and seats. Raises Doctor.DoesNotExist.
+    """
+    slot_minutes = settings.APPOINTMENT_SLOT_MINUTES
+    capacity = settings.APPOINTMENT_SLOT_CAPACITY
+
+    availabilities = list(
+        DoctorAvailability.objects.filter(doctor__slug=slug).only(
+            "doctor_id", "day", "start_time", "end_time"
+        )
+    )
+    if not availabilities:
+        # Only a doctor with no schedule at all needs this second look
+        Doctor.objects.only("id").get(slug=slug)
+        return []
+    doctor_id = availabilities[0].doctor_id
+    template = weekly_slots(availabilities)
+
+    range_start = timezone.make_aware(datetime.combine(first_day, time.min))
+    range_end = timezone.make_aware(
+        datetime.combine(last_day + timedelta(days=1), time.min)
+    )
+    booked = iter(
+        Appointment.objects.filter(
+            doctor_id=doctor_id,
+            slot_start__gte=range_start,
+            slot_start__lt=range_end,
+        )
+        .order_by("slot_start")
+        .values_list("slot_start", flat=True)
+    )
+    next_booked = next(booked, None)
+
+    slots = []
+    day = first_day
+    while day <= last_day:
+        intervals = template.get(day.isoweekday())
+        for minutes in slot_starts(intervals, slot_minutes) if intervals else ():
+            start = timezone.make_aware(
+                datetime.combine(day, time.min) + timedelta(minutes=minutes)
+            )
+            # Sweep: skip bookings before this slot, count the ones in it
+            while next_booked is not None and next_booked < start:
+                next_booked = next(booked, None)
+            taken = 0
+            while next_booked is not None and next_booked == start:
+                taken += 1
+                next_booked = next(booked, None)
+            if taken < capacity:
+                slots.append(
+                    {
+                        "start": start,
+                        "end": start + timedelta(minutes=slot_minutes),
+                        "seats": capacity - taken,
+                    }
+                )
+        day += timedelta(days=1)
+    return slots
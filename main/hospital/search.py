@@ -0,0 +1,138 @@
+"""
+Index-backed name search for departments, doctors and patients.
+
+PostgreSQL uses a pg_trgm GIN index on ``name``: ILIKE and the trigram
+``%`` operator are both answered from the index and results are ranked by
+prefix match, then trigram similarity. SQLite uses external-content FTS5
+tables with prefix queries ranked by bm25. Both indexes are maintained by
+the database itself (GIN natively, FTS5 through triggers), so they stay in
+sync with ``save()``, ``update()`` and ``bulk_create()`` alike.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLES = ("hospital_department", "hospital_doctor", "hospital_patient")
+
+
+def search_by_name(queryset, term):
+    """Filter the queryset to rows whose name matches term, best matches first"""
+    term = term.strip()
+    if not term:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _postgresql_search(queryset, term)
+    if vendor == "sqlite":
+        return _sqlite_search(queryset, term)
+    return queryset.filter(name__icontains=term)
+
+
+def _postgresql_search(queryset, term):
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    return (
+        queryset.filter(
+            Q(name__icontains=term) | Q(TrigramSimilar(F("name"), Value(term)))
+        )
+        .annotate(
+            search_prefix=Case(
+                When(name__istartswith=term, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            search_rank=TrigramSimilarity("name", term),
+        )
+        .order_by("-search_prefix", "-search_rank", "id")
+    )
+
+
+def _sqlite_search(queryset, term):
+    tokens = re.findall(r"\w+", term)
+    if not tokens:
+        return queryset.none()
+    # Every token must match, each as a prefix: "gre hou" finds "Gregory House"
+    match = " ".join(f'"{token}"*' for token in tokens)
+    table = queryset.model._meta.db_table
+    fts_table = f"{table}_fts"
+    return (
+        queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s", [match]
+            )
+        )
+        .annotate(
+            search_rank=RawSQL(
+                f"SELECT bm25({fts_table}) FROM {fts_table} "
+                f"WHERE {fts_table} MATCH %s AND rowid = {table}.id",
+                [match],
+            )
+        )
+        .order_by("search_rank", "id")
+    )
+
+
+def install_search_indexes(connection):
+    """Create the search indexes for the connection's backend; safe to call repeatedly"""
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for table in SEARCH_TABLES:
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx "
+                    f"ON {table} USING gin (name gin_trgm_ops)"
+                )
+    elif connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            for table in SEARCH_TABLES:
+                _install_sqlite_fts(cursor, table)
+
+
+def uninstall_search_indexes(connection):
+    with connection.cursor() as cursor:
+        for table in SEARCH_TABLES:
+            if connection.vendor == "postgresql":
+                cursor.execute(f"DROP INDEX IF EXISTS {table}_name_trgm_idx")
+            elif connection.vendor == "sqlite":
+                for suffix in ("ai", "ad", "au"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+                cursor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+
+
+def _install_sqlite_fts(cursor, table):
+    fts_table = f"{table}_fts"
+    cursor.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s "
+        "AND name LIKE %s",
+        [table, f"{fts_table}_%"],
+    )
+    if cursor.fetchone()[0] == 3:
+        return
+
+    # SQLite drops triggers together with their table, which Django does
+    # whenever a migration has to rebuild it, so recreate them and reindex
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"name, content='{table}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, name) VALUES (new.id, new.name); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, name) "
+        "VALUES ('delete', old.id, old.name); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF name ON {table} "
+        f"BEGIN INSERT INTO {fts_table}({fts_table}, rowid, name) "
+        "VALUES ('delete', old.id, old.name); "
+        f"INSERT INTO {fts_table}(rowid, name) VALUES (new.id, new.name); END"
+    )
+    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
@@ -1,4 +1,7 @@
 from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from django.forms.models import model_to_dict
 from .models import (
     Department,
@@ -9,12 +12,98 @@ from .models import (
     Appointment,
 )
 from .enum import DayOfWeek
+from .metrics import timed_serialization
+from .pagination import (
+    APPOINTMENT_ORDERING,
+    KeysetPagination,
+    nested_collection,
+    nested_limit,
+)
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+
+class TimedDataMixin:
+    """
+    Count building .data as the request's serialization time; Meta sets
+    list_serializer_class = TimedListSerializer for many=True
+    """
 
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
 
-class DepartmentSerializer(serializers.ModelSerializer):
+
+class DepartmentSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Department
         fields = "__all__"
+        list_serializer_class = TimedListSerializer
+
+
+def related_count(model, field):
+    """COUNT(*) of the model rows whose `field` is the outer row, 0 for none"""
+    rows = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def split_param(value):
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets and opt-in nested relations. Without arguments the
+    serializer outputs its plain fields only. `fields` narrows those down,
+    and `expand` adds relations from `expandable_fields`. Output keeps the
+    Meta.fields order.
+    """
+
+    expandable_fields = ()
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = set(self.plain_fields() if fields is None else fields) | set(expand)
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+    @classmethod
+    def plain_fields(cls):
+        return [name for name in cls.Meta.fields if name not in cls.expandable_fields]
+
+    @classmethod
+    def get_selection(cls, query_params):
+        """
+        (fields, expand) from ?fields=a,b&expand=c. An expandable name in
+        ?fields= expands it as well. Raises ParseError for unknown names.
+        """
+        requested = split_param(query_params.get("fields"))
+        expand = set(split_param(query_params.get("expand")))
+        unknown = sorted(
+            (set(requested) - set(cls.Meta.fields))
+            | (expand - set(cls.expandable_fields))
+        )
+        if unknown:
+            raise ParseError(f"Unknown fields: {', '.join(unknown)}")
+        expand |= set(requested) & set(cls.expandable_fields)
+        fields = [name for name in cls.plain_fields() if name in requested]
+        return (
+            fields if requested else cls.plain_fields(),
+            [name for name in cls.expandable_fields if name in expand],
+        )
 
 
 class DoctorAvailabilitySerializer(serializers.ModelSerializer):
@@ -23,15 +112,18 @@ class DoctorAvailabilitySerializer(serializers.ModelSerializer):
         fields = ["day", "start_time", "end_time"]
 
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ("department_details", "availability", "assigned_patients")
     department_details = DepartmentSerializer(source="department", read_only=True)
     availability = serializers.SerializerMethodField()
     assigned_patients = serializers.SerializerMethodField()
 
     class Meta:
         model = Doctor
+        list_serializer_class = TimedListSerializer
         fields = [
             "name",
+            "slug",
             "specialization",
             "contact_information",
             "department_details",
@@ -39,8 +131,49 @@ class DoctorSerializer(serializers.ModelSerializer):
             "assigned_patients",
         ]
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=()):
+        """
+        Load only the columns and relations the selected fields use, the
+        relations in bulk so each page costs a fixed number of queries
+        """
+        fields = cls.plain_fields() if fields is None else fields
+        # id and created_at back the ordering and keyset cursors
+        columns = ["id", "created_at", *fields]
+        lookups = []
+        if "department_details" in expand:
+            columns.append("department")
+            queryset = queryset.select_related("department")
+        # Ordered so the nested lists come out the same on every database
+        if "availability" in expand:
+            lookups.append(
+                Prefetch(
+                    "doctoravailability_set",
+                    queryset=DoctorAvailability.objects.order_by("day", "id"),
+                )
+            )
+        if "assigned_patients" in expand:
+            # The first patients per doctor and their count; the slug links
+            # the rest, at /doctor/<slug>/patients/
+            columns.append("slug")
+            queryset = queryset.annotate(
+                assigned_patients_count=related_count(Patient, "doctor")
+            )
+            lookups.append(
+                Prefetch(
+                    "patient_set",
+                    queryset=Patient.objects.order_by(*KeysetPagination.ordering)[
+                        : nested_limit()
+                    ],
+                    # Django can only prefetch a sliced queryset into a list
+                    to_attr="first_patients",
+                )
+            )
+        return queryset.only(*columns).prefetch_related(*lookups)
+
     def get_availability(self, obj):
-        availabilities = DoctorAvailability.objects.filter(doctor=obj)
+        # Reads the prefetch cache when the queryset went through setup_eager_loading
+        availabilities = obj.doctoravailability_set.all()
         availabilities_data = DoctorAvailabilitySerializer(
             availabilities, many=True
         ).data
@@ -53,10 +186,16 @@ class DoctorSerializer(serializers.ModelSerializer):
         }
 
     def get_assigned_patients(self, obj):
-        assigned_patients = Patient.objects.filter(doctor=obj)
-        return [
-            model_to_dict(assigned_patient) for assigned_patient in assigned_patients
-        ]
+        assigned_patients = obj.first_patients
+        return nested_collection(
+            [model_to_dict(assigned_patient) for assigned_patient in assigned_patients],
+            assigned_patients,
+            obj.assigned_patients_count,
+            "doctor-patients",
+            obj.slug,
+            KeysetPagination.ordering,
+            self.context.get("request"),
+        )
 
 
 class MedicalHistorySerializer(serializers.ModelSerializer):
@@ -72,15 +211,18 @@ class AppointmentSerializer(serializers.ModelSerializer):
         fields = ["date", "details"]
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(TimedDataMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ("medical_history", "appointments", "doctor")
     medical_history = serializers.SerializerMethodField()
     appointments = serializers.SerializerMethodField()
     doctor = serializers.SerializerMethodField()
 
     class Meta:
         model = Patient
+        list_serializer_class = TimedListSerializer
         fields = [
             "name",
+            "slug",
             "age",
             "gender",
             "contact_information",
@@ -89,15 +231,59 @@ class PatientSerializer(serializers.ModelSerializer):
             "doctor",
         ]
 
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, expand=()):
+        """Load the selected columns, and the expanded relations in bulk"""
+        fields = cls.plain_fields() if fields is None else fields
+        columns = ["id", "created_at", *fields]
+        lookups = []
+        if "doctor" in expand:
+            columns.append("doctor")
+            queryset = queryset.select_related("doctor")
+        if "medical_history" in expand:
+            lookups.append(
+                Prefetch(
+                    "medicalhistory_set", queryset=MedicalHistory.objects.order_by("id")
+                )
+            )
+        if "appointments" in expand:
+            columns.append("slug")
+            queryset = queryset.annotate(
+                appointments_count=related_count(Appointment, "patient")
+            )
+            lookups.append(
+                Prefetch(
+                    "appointment_set",
+                    queryset=Appointment.objects.order_by(*APPOINTMENT_ORDERING)[
+                        : nested_limit()
+                    ],
+                    to_attr="first_appointments",
+                )
+            )
+        return queryset.only(*columns).prefetch_related(*lookups)
+
     def get_medical_history(self, obj):
-        medical_histories = MedicalHistory.objects.get(patient=obj)
-        medical_histories_serializer = MedicalHistorySerializer(medical_histories)
+        # A patient created without history has none; report it as null
+        medical_histories = obj.medicalhistory_set.all()
+        if not medical_histories:
+            return None
+        medical_histories_serializer = MedicalHistorySerializer(medical_histories[0])
         return medical_histories_serializer.data
 
     def get_appointments(self, obj):
-        appointments = Appointment.objects.filter(patient=obj)
+        appointments = obj.first_appointments
         appointments_serializer = AppointmentSerializer(appointments, many=True)
-        return appointments_serializer.data
+        return nested_collection(
+            appointments_serializer.data,
+            appointments,
+            obj.appointments_count,
+            "patient-appointments",
+            obj.slug,
+            APPOINTMENT_ORDERING,
+            self.context.get("request"),
+        )
 
     def get_doctor(self, obj):
+        if obj.doctor is None:
+            return None
         return model_to_dict(obj.doctor)
@@ -0,0 +1,143 @@
+"""
+Unique slugs without probing the database.
+
+A slug is the slugified name followed by a base-36 token such as
+``john-smith-2k4z8h1q0c9d7e3f``. Tokens come from a Snowflake-style
+generator: milliseconds since 2024-01-01, then a node id, then a
+per-millisecond sequence. A process never issues the same token twice.
+
+The node id is a host id (settings.SLUG_NODE_ID, or a hash of the host name)
+followed by the process id. Linux pids fit in PID_BITS, so two processes on
+one host never share a node id, and hosts with distinct SLUG_NODE_IDs never
+collide with each other. Hashed host ids can clash, as can pids on other
+systems, so save() still replaces a slug that hits the unique constraint
+and retries the insert. A new row needs no lookup first, and the slug can
+be assigned before bulk_create.
+"""
+
+import os
+import socket
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils.text import slugify
+
+EPOCH_MS = 1704067200000
+HOST_BITS = 16
+# PID_MAX_LIMIT on Linux is 2**22
+PID_BITS = 22
+NODE_BITS = HOST_BITS + PID_BITS
+SEQUENCE_BITS = 8
+ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+# Inserts tried by save_with_slug before a slug collision is re-raised
+SLUG_ATTEMPTS = 3
+
+
+def default_host_id():
+    return zlib.crc32(socket.gethostname().encode("utf-8")) % (1 << HOST_BITS)
+
+
+def to_base36(number):
+    digits = []
+    while True:
+        number, remainder = divmod(number, 36)
+        digits.append(ALPHABET[remainder])
+        if not number:
+            return "".join(reversed(digits))
+
+
+class SlugTokenGenerator:
+    def __init__(self, host_id=None):
+        self.host_id = host_id
+        self.node_id = None
+        self.lock = threading.Lock()
+        self.last_ms = -1
+        self.sequence = 0
+
+    def get_node_id(self):
+        if self.node_id is None:
+            host_id = self.host_id
+            if host_id is None:
+                host_id = getattr(settings, "SLUG_NODE_ID", None)
+            if host_id is None:
+                host_id = default_host_id()
+            host_id %= 1 << HOST_BITS
+            self.node_id = host_id << PID_BITS | os.getpid() % (1 << PID_BITS)
+        return self.node_id
+
+    def after_fork(self):
+        # The child has a new pid; the lock may have been held mid-fork
+        self.node_id = None
+        self.lock = threading.Lock()
+
+    def next_token(self):
+        node_id = self.get_node_id()
+        with self.lock:
+            # Never step backwards, even if the wall clock does
+            now_ms = max(int(time.time() * 1000) - EPOCH_MS, self.last_ms)
+            if now_ms == self.last_ms:
+                self.sequence = (self.sequence + 1) % (1 << SEQUENCE_BITS)
+                if self.sequence == 0:
+                    # Sequence exhausted for this millisecond: borrow the next one
+                    now_ms += 1
+            else:
+                self.sequence = 0
+            self.last_ms = now_ms
+            value = (
+                (now_ms << (NODE_BITS + SEQUENCE_BITS))
+                | (node_id << SEQUENCE_BITS)
+                | self.sequence
+            )
+        return to_base36(value)
+
+
+token_generator = SlugTokenGenerator()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=token_generator.after_fork)
+
+
+def unique_slug(name, max_length=50):
+    token = token_generator.next_token()
+    base = slugify(name)[: max_length - len(token) - 1].strip("-")
+    return f"{base}-{token}" if base else token
+
+
+def save_with_slug(instance, save, *args, **kwargs):
+    """
+    Call save() for a model with name and slug fields, giving it a slug first
+    if it has none. A new slug that is already taken is replaced and the
+    insert retried; any other IntegrityError is raised as usual.
+    """
+    if instance.slug:
+        return save(*args, **kwargs)
+    model = type(instance)
+    max_length = model._meta.get_field("slug").max_length
+    for attempt in range(SLUG_ATTEMPTS):
+        instance.slug = unique_slug(instance.name, max_length)
+        try:
+            # A savepoint keeps an enclosing transaction usable after a clash
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            taken = model._base_manager.filter(slug=instance.slug).exists()
+            instance.slug = None
+            if not taken or attempt == SLUG_ATTEMPTS - 1:
+                raise
+
+
+class SlugManager(models.Manager):
+    """
+    Assigns slugs to objects passed to bulk_create, which bypasses save();
+    a colliding slug fails the whole insert rather than being retried
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        max_length = self.model._meta.get_field("slug").max_length
+        for obj in objs:
+            if not obj.slug:
+                obj.slug = unique_slug(obj.name, max_length)
+        return super().bulk_create(objs, *args, **kwargs)
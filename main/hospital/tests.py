@@ -1,3 +1,2102 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from itertools import count, takewhile
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import force_authenticate
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from rest_framework.response import Response
+
+from .availability import availability_index
+from .benchmark import scenario_paths
+from .booking import DoctorUnavailable, SlotFull, book_appointment
+from .conditional import get_last_modified
+from .slugs import SlugTokenGenerator, unique_slug
+from .views import PatientImportAPIView
+from .cache import (
+    check_version_cache,
+    get_response_cache,
+    get_version_cache,
+    get_versions,
+    invalidate,
+)
+from .dashboard import connect_counter_signals, disconnect_counter_signals
+from .dataset import generate
+from .idempotency import idempotent
+from . import renderers
+from .db.pool import ConnectionPool, PoolTimeout
+from .metrics import reset as reset_metrics
+from .models import (
+    Appointment,
+    Department,
+    DepartmentCounter,
+    DepartmentWeekdaySeats,
+    Doctor,
+    DoctorAvailability,
+    IdempotencyKey,
+    MedicalHistory,
+    Patient,
+)
+
+
+def create_department(name="Cardiology"):
+    return Department.objects.create(name=name, services_offered="Heart care")
+
+
+def create_doctor(name, department=None, specialization="Cardiologist"):
+    doctor = Doctor.objects.create(
+        name=name,
+        specialization=specialization,
+        contact_information="+919876543210",
+        department=department,
+    )
+    for day in (1, 3, 5):
+        DoctorAvailability.objects.create(
+            doctor=doctor,
+            day=day,
+            start_time=datetime(2024, 1, 1, 9, 0, tzinfo=timezone.utc),
+            end_time=datetime(2024, 1, 1, 17, 0, tzinfo=timezone.utc),
+        )
+    return doctor
+
+
+def create_patient(name, doctor=None, age=40, gender="M"):
+    return Patient.objects.create(
+        name=name,
+        age=age,
+        gender=gender,
+        contact_information="+919876543211",
+        doctor=doctor,
+    )
+
+
+# Versions in local memory, so the query counts below are the views' own;
+# the suite runs in one process
+@override_settings(VERSION_CACHE_ALIAS="default")
+class HospitalTestCase(TestCase):
+    def setUp(self):
+        # Rows created through the ORM in tests do not bump cache versions
+        get_response_cache().clear()
+        get_version_cache().clear()
+        availability_index.clear()
+
+
+class DoctorAPIViewTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.department = create_department()
+
+    def create_doctors(self, count):
+        start = Doctor.objects.count()
+        for index in range(start, start + count):
+            doctor = create_doctor(f"Doctor {index}", department=self.department)
+            create_patient(f"Patient {index} A", doctor=doctor)
+            create_patient(f"Patient {index} B", doctor=doctor)
+
+    def test_list_returns_nested_details(self):
+        self.create_doctors(1)
+        response = self.client.get(
+            "/api/doctor/?limit=50&expand=department_details,availability,assigned_patients"
+        )
+        self.assertEqual(response.status_code, 200)
+        doctor = response.json()["results"][0]
+        self.assertEqual(doctor["department_details"]["name"], "Cardiology")
+        self.assertEqual(set(doctor["availability"]), {"monday", "wednesday", "friday"})
+        self.assertEqual(
+            [patient["name"] for patient in doctor["assigned_patients"]["results"]],
+            ["Patient 0 A", "Patient 0 B"],
+        )
+        self.assertEqual(doctor["assigned_patients"]["count"], 2)
+        self.assertIsNone(doctor["assigned_patients"]["next"])
+
+    def test_list_query_count_is_constant(self):
+        # Count + page + availability + the capped assigned patients
+        url = "/api/doctor/?limit=50&expand=department_details,availability,assigned_patients"
+        self.create_doctors(1)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+        self.create_doctors(20)
+        invalidate("doctor")
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()["results"]), 21)
+
+    def test_default_payload_is_lean(self):
+        self.create_doctors(2)
+        # Count + page, with no relation loaded
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/doctor/")
+        self.assertEqual(
+            list(response.json()["results"][0]),
+            ["name", "slug", "specialization", "contact_information"],
+        )
+
+    def test_fields_and_expand(self):
+        self.create_doctors(1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/doctor/?fields=name,availability")
+        self.assertEqual(list(response.json()["results"][0]), ["name", "availability"])
+        # Only the selected columns are read, and only availability is prefetched
+        page = queries[1]["sql"]
+        self.assertNotIn("contact_information", page)
+        self.assertEqual(len(queries), 3)
+
+        response = self.client.get("/api/doctor/?fields=slug&expand=department_details")
+        self.assertEqual(
+            list(response.json()["results"][0]), ["slug", "department_details"]
+        )
+        response = self.client.get("/api/doctor/?fields=name,salary&expand=friends")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "Unknown fields: friends, salary"})
+
+
+class PatientAPIViewTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House", department=create_department())
+
+    def create_patients(self, count):
+        start = Patient.objects.count()
+        for index in range(start, start + count):
+            patient = create_patient(f"Patient {index}", doctor=self.doctor)
+            MedicalHistory.objects.create(
+                patient=patient,
+                previous_diagnoses="Flu",
+                allergies="None",
+                medications="Paracetamol",
+            )
+            for hour in (10, 11):
+                Appointment.objects.create(
+                    patient=patient,
+                    date=datetime(2024, 1, 1, hour, 0, tzinfo=timezone.utc),
+                    details="Checkup",
+                )
+
+    def test_list_query_count_is_constant(self):
+        # Count + page with doctor + history + the capped appointments
+        url = "/api/patient/?limit=50&expand=medical_history,appointments,doctor"
+        self.create_patients(1)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+        self.create_patients(20)
+        invalidate("patient")
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        patients = response.json()["results"]
+        self.assertEqual(len(patients), 21)
+        self.assertEqual(patients[0]["medical_history"]["allergies"], "None")
+        self.assertEqual(patients[0]["appointments"]["count"], 2)
+        self.assertEqual(len(patients[0]["appointments"]["results"]), 2)
+        self.assertEqual(patients[0]["doctor"]["name"], "Gregory House")
+
+    def test_detail_query_count(self):
+        self.create_patients(1)
+        patient = Patient.objects.get()
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/patient/{patient.slug}/")
+        self.assertEqual(
+            response.json()["results"][0],
+            {
+                "name": patient.name,
+                "slug": patient.slug,
+                "age": 40,
+                "gender": "M",
+                "contact_information": patient.contact_information,
+            },
+        )
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                f"/api/patient/{patient.slug}/?fields=name,medical_history,appointments"
+            )
+        self.assertEqual(
+            list(response.json()["results"][0]),
+            ["name", "medical_history", "appointments"],
+        )
+
+    def test_missing_medical_history_and_doctor_are_null(self):
+        create_patient("Walk In")
+        response = self.client.get("/api/patient/?expand=medical_history,doctor")
+        self.assertEqual(response.status_code, 200)
+        patient = response.json()["results"][0]
+        self.assertIsNone(patient["medical_history"])
+        self.assertIsNone(patient["doctor"])
+
+
+class NestedCollectionTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House")
+        for index in range(5):
+            create_patient(f"Patient {index}", doctor=self.doctor)
+        self.patient = Patient.objects.get(name="Patient 0")
+        for day in range(1, 5):
+            Appointment.objects.create(
+                patient=self.patient,
+                date=datetime(2024, 1, day, 10, 0, tzinfo=timezone.utc),
+                details=f"Visit {day}",
+            )
+
+    @override_settings(NESTED_COLLECTION_LIMIT=2)
+    def test_nested_collections_link_to_sub_resources(self):
+        body = self.client.get("/api/doctor/?expand=assigned_patients").json()
+        patients = body["results"][0]["assigned_patients"]
+        self.assertEqual(patients["count"], 5)
+        self.assertEqual(
+            [patient["name"] for patient in patients["results"]],
+            ["Patient 0", "Patient 1"],
+        )
+        self.assertTrue(
+            patients["next"].startswith(
+                f"http://testserver/api/doctor/{self.doctor.slug}/patients/?cursor="
+            )
+        )
+        # The link continues after the nested rows; each page is lookup + page
+        with self.assertNumQueries(2):
+            rest = self.client.get(patients["next"]).json()
+        self.assertEqual(
+            [patient["name"] for patient in rest["results"]],
+            ["Patient 2", "Patient 3", "Patient 4"],
+        )
+        self.assertIsNone(rest["next"])
+
+        url = f"/api/patient/{self.patient.slug}/?expand=appointments"
+        appointments = self.client.get(url).json()["results"][0]["appointments"]
+        self.assertEqual(appointments["count"], 4)
+        self.assertEqual(
+            [row["details"] for row in appointments["results"]], ["Visit 1", "Visit 2"]
+        )
+        rest = self.client.get(appointments["next"] + "&limit=1").json()
+        self.assertEqual([row["details"] for row in rest["results"]], ["Visit 3"])
+        rest = self.client.get(rest["next"]).json()
+        self.assertEqual([row["details"] for row in rest["results"]], ["Visit 4"])
+        self.assertIsNone(rest["next"])
+
+    def test_date_range_filters(self):
+        url = f"/api/patient/{self.patient.slug}/appointments/"
+        body = self.client.get(url + "?from=2024-01-02&to=2024-01-03").json()
+        self.assertEqual(
+            [row["details"] for row in body["results"]], ["Visit 2", "Visit 3"]
+        )
+
+        url = f"/api/doctor/{self.doctor.slug}/patients/"
+        body = self.client.get(url + "?to=2024-01-01").json()
+        self.assertEqual(body["results"], [])
+        self.assertEqual(
+            len(self.client.get(url + "?from=2024-01-01").json()["results"]), 5
+        )
+
+        response = self.client.get(url + "?from=yesterday")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/api/doctor/missing/patients/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/api/patient/missing/appointments/")
+        self.assertEqual(response.status_code, 404)
+
+
+class BatchTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House", department=create_department())
+        self.patients = []
+        for index in range(6):
+            patient = create_patient(f"Patient {index}", doctor=self.doctor)
+            Appointment.objects.create(
+                patient=patient,
+                date=datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc),
+                details="Checkup",
+            )
+            self.patients.append(patient)
+
+    def test_results_are_keyed_by_slug(self):
+        slugs = [self.patients[3].slug, "missing", self.patients[0].slug]
+        url = "/api/patient/batch/?expand=appointments,doctor&slugs=" + ",".join(slugs)
+        # slug__in page with doctor + appointments
+        with self.assertNumQueries(2):
+            body = self.client.get(url).json()
+        self.assertEqual(list(body["results"]), slugs)
+        self.assertEqual(body["not_found"], ["missing"])
+        self.assertIsNone(body["results"]["missing"])
+        patient = body["results"][self.patients[3].slug]
+        self.assertEqual(patient["name"], "Patient 3")
+        self.assertEqual(patient["appointments"]["count"], 1)
+        self.assertEqual(patient["doctor"]["name"], "Gregory House")
+
+        # The same queries for every patient at once
+        url = "/api/patient/batch/?expand=appointments,doctor&slugs=" + ",".join(
+            patient.slug for patient in self.patients
+        )
+        with self.assertNumQueries(2):
+            body = self.client.get(url).json()
+        self.assertEqual(body["not_found"], [])
+
+    def test_doctor_batch_with_selected_fields(self):
+        url = f"/api/doctor/batch/?slugs={self.doctor.slug},{self.doctor.slug}"
+        with self.assertNumQueries(1):
+            body = self.client.get(url + "&fields=name").json()
+        self.assertEqual(
+            body,
+            {"results": {self.doctor.slug: {"name": "Gregory House"}}, "not_found": []},
+        )
+        body = self.client.get(url + "&expand=assigned_patients").json()
+        patients = body["results"][self.doctor.slug]["assigned_patients"]
+        self.assertEqual(patients["count"], 6)
+
+    @override_settings(BATCH_MAX_SLUGS=2)
+    def test_invalid_requests(self):
+        response = self.client.get("/api/doctor/batch/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"detail": "slugs is required"})
+        response = self.client.get("/api/patient/batch/?slugs=a,b,c")
+        self.assertEqual(response.json(), {"detail": "At most 2 slugs per request"})
+        response = self.client.get("/api/patient/batch/?slugs=a&expand=friends")
+        self.assertEqual(response.status_code, 400)
+
+
+class PaginationTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(5):
+            create_department(f"Department {index}")
+
+    def test_offset_mode_is_default(self):
+        response = self.client.get("/api/department/?limit=2&offset=2")
+        body = response.json()
+        self.assertEqual(body["count"], 5)
+        self.assertEqual(
+            [row["name"] for row in body["results"]], ["Department 2", "Department 3"]
+        )
+
+    def test_offset_mode_without_count(self):
+        # Only the page
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/department/?limit=2&offset=2&count=false")
+        body = response.json()
+        self.assertNotIn("count", body)
+        self.assertIn("offset=4", body["next"])
+
+        body = self.client.get("/api/department/?limit=2&offset=4&count=false").json()
+        self.assertEqual(len(body["results"]), 1)
+        self.assertIsNone(body["next"])
+
+    def test_cursor_mode_walks_every_row_once(self):
+        names = []
+        url = "/api/department/?cursor=&limit=2"
+        while url:
+            with self.assertNumQueries(1):
+                body = self.client.get(url).json()
+            self.assertNotIn("count", body)
+            names.extend(row["name"] for row in body["results"])
+            url = body["next"]
+        self.assertEqual(names, [f"Department {index}" for index in range(5)])
+
+    def test_cursor_mode_on_doctor_and_patient_views(self):
+        doctor = create_doctor("Gregory House")
+        create_patient("Patient 0", doctor=doctor)
+        create_patient("Patient 1", doctor=doctor)
+
+        body = self.client.get("/api/doctor/?cursor=").json()
+        self.assertEqual([row["name"] for row in body["results"]], ["Gregory House"])
+        body = self.client.get("/api/patient/?cursor=&limit=1").json()
+        self.assertEqual(body["results"][0]["name"], "Patient 0")
+        body = self.client.get(body["next"]).json()
+        self.assertEqual(body["results"][0]["name"], "Patient 1")
+        self.assertIsNone(body["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/department/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.department = create_department("Cardiology")
+        create_department("Neurology")
+        self.doctor = create_doctor("Gregory House", department=self.department)
+        create_doctor("Lisa Cuddy", department=self.department)
+        create_doctor("James Wilson House", department=self.department)
+
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [row["name"] for row in response.json()["results"]]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.names("/api/department/?search=card"), ["Cardiology"])
+        self.assertEqual(self.names("/api/doctor/?search=gre ho"), ["Gregory House"])
+
+    def test_results_are_ranked(self):
+        names = self.names("/api/doctor/?search=house")
+        self.assertEqual(sorted(names), ["Gregory House", "James Wilson House"])
+        # The shorter name is the closer match
+        self.assertEqual(names[0], "Gregory House")
+
+    def test_search_cannot_use_cursor(self):
+        # Keyset pages are ordered by creation, not by rank
+        for path in ("department", "doctor", "patient"):
+            response = self.client.get(f"/api/{path}/?search=house&cursor=")
+            self.assertEqual(response.status_code, 400, path)
+
+    def test_patient_search_with_count(self):
+        create_patient("John Smith", doctor=self.doctor)
+        create_patient("Jane Doe", doctor=self.doctor)
+        body = self.client.get("/api/patient/?search=smi").json()
+        self.assertEqual(body["count"], 1)
+        self.assertEqual(body["results"][0]["name"], "John Smith")
+
+    def test_index_follows_renames(self):
+        self.doctor.name = "Allison Cameron"
+        self.doctor.save()
+        invalidate("doctor")
+        self.assertEqual(self.names("/api/doctor/?search=gregory"), [])
+        self.assertEqual(self.names("/api/doctor/?search=allison"), ["Allison Cameron"])
+
+        Doctor.objects.filter(pk=self.doctor.pk).update(name="Robert Chase")
+        invalidate("doctor")
+        self.assertEqual(self.names("/api/doctor/?search=allison"), [])
+        self.assertEqual(self.names("/api/doctor/?search=chase"), ["Robert Chase"])
+
+        self.doctor.delete()
+        invalidate("doctor")
+        self.assertEqual(self.names("/api/doctor/?search=chase"), [])
+
+
+class ResponseCacheTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House", department=create_department())
+
+    def test_repeated_get_is_served_from_cache(self):
+        response = self.client.get("/api/doctor/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        # Nothing reaches the database
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/doctor/")
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.json()["results"][0]["name"], "Gregory House")
+
+    def test_query_params_are_normalized(self):
+        self.client.get("/api/doctor/?limit=10&offset=0")
+        response = self.client.get("/api/doctor/?offset=0&limit=10")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_writes_invalidate_dependent_payloads(self):
+        self.client.get("/api/doctor/?expand=assigned_patients")
+        response = self.client.post(
+            "/api/patient/",
+            {
+                "name": "John Smith",
+                "age": 30,
+                "gender": "M",
+                "contact_information": "+919876543211",
+                "assigned_doctor": self.doctor.id,
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get("/api/doctor/?expand=assigned_patients")
+        self.assertEqual(response["X-Cache"], "MISS")
+        patients = response.json()["results"][0]["assigned_patients"]["results"]
+        self.assertEqual([patient["name"] for patient in patients], ["John Smith"])
+
+    @override_settings(VERSION_CACHE_ALIAS="versions")
+    def test_versions_are_shared_through_the_database(self):
+        (before,) = get_versions(["doctor"])
+        invalidate("doctor")
+        # A cache object of another worker reads the same row
+        other_worker = caches.create_connection("versions")
+        self.assertNotEqual(other_worker.get("version:doctor"), before)
+        self.assertEqual(other_worker.get("version:doctor"), *get_versions(["doctor"]))
+
+    @override_settings(VERSION_CACHE_ALIAS="versions")
+    def test_versions_are_read_once_per_request(self):
+        self.client.get("/api/doctor/")
+        # One read of the shared versions serves the ETag and the cache key
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/doctor/")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        # ... and the list count, which is still cached: versions + page
+        invalidate("patient")
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/doctor/")
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_workers_refuse_versions_in_local_memory(self):
+        with mock.patch.dict(os.environ, {"WEB_CONCURRENCY": "4"}):
+            with self.assertRaises(ImproperlyConfigured):
+                check_version_cache()
+            with override_settings(VERSION_CACHE_ALIAS="versions"):
+                check_version_cache()
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.get("/api/doctor/")
+        self.client.get("/api/doctor/")
+        self.assertEqual(self.client.get("/api/cache/stats/").status_code, 403)
+
+        admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        self.client.force_login(admin)
+        stats = self.client.get("/api/cache/stats/").json()
+        self.assertGreaterEqual(stats["hits"], 1)
+        self.assertGreaterEqual(stats["misses"], 1)
+
+
+class PerformanceMetricsTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+        create_doctor("Gregory House", department=create_department())
+
+    def server_timing(self, response):
+        return dict(
+            re.match(r"(\w+);dur=([\d.]+)(?:;desc=\"(\d+) queries\")?", part).group(
+                1, 3
+            )
+            for part in response["Server-Timing"].split(", ")
+        )
+
+    def test_server_timing_counts_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/doctor/")
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {"total", "db", "serialize", "render"})
+        self.assertEqual(int(timing["db"]), len(queries))
+
+    def test_serialization_is_timed(self):
+        create_patient("John Smith", doctor=Doctor.objects.get())
+        url = "/api/doctor/?expand=availability,assigned_patients"
+        durations = {}
+        for flat in (False, True):
+            # A clock that ticks one second per reading
+            with self.settings(FLAT_SERIALIZATION=flat), mock.patch(
+                "hospital.metrics.time.perf_counter", side_effect=count()
+            ):
+                invalidate("doctor")
+                response = self.client.get(url)
+            duration = re.search(r"serialize;dur=([\d.]+)", response["Server-Timing"])
+            durations[flat] = float(duration.group(1))
+        # Prefetched: one pair of readings around building the page's .data
+        self.assertEqual(durations[False], 1000.0)
+        # The flat path runs its collection queries while serializing
+        self.assertGreater(durations[True], 1000.0)
+
+    async def test_async_views_are_timed(self):
+        response = await self.async_client.get(
+            "/api/async/doctor/?expand=availability,assigned_patients"
+        )
+        self.assertEqual(response.status_code, 200)
+        # count + page + availability + patients
+        self.assertEqual(self.server_timing(response)["db"], "4")
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.client.get("/api/doctor/")
+        self.client.get("/api/doctor/")
+        self.client.get("/api/department/")
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+
+        admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        self.client.force_login(admin)
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn('hospital_request_seconds_count{view="DoctorAPIView"} 2', body)
+        self.assertIn(
+            'hospital_request_seconds_count{view="DepartmentViewSet.list"} 1', body
+        )
+        self.assertIn('hospital_db_queries{view="DoctorAPIView",quantile="0.99"}', body)
+        self.assertRegex(body, r"hospital_response_cache_hits_total \d+")
+
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.settings(SLOW_REQUEST_MS=0.001):
+            with self.assertLogs("hospital.performance", "WARNING") as logs:
+                self.client.get("/api/doctor/")
+        (message,) = logs.output
+        self.assertIn("GET /api/doctor/ (DoctorAPIView)", message)
+        self.assertIn('FROM "hospital_doctor"', message)
+
+        with self.settings(SLOW_REQUEST_MS=0):
+            with self.assertNoLogs("hospital.performance"):
+                self.client.get("/api/doctor/")
+
+
+class DatasetTests(HospitalTestCase):
+    def test_generated_rows(self):
+        counts = generate(
+            patients=60, patients_per_doctor=20, doctors_per_department=2, batch_size=25
+        )
+        self.assertEqual(
+            counts,
+            {
+                "departments": 2,
+                "doctors": 3,
+                "availabilities": DoctorAvailability.objects.count(),
+                "patients": 60,
+                "medical_histories": 60,
+                "appointments": 120,
+            },
+        )
+        self.assertFalse(Patient.objects.filter(slug=None).exists())
+        # Every appointment sits in a slot of its doctor's schedule
+        availability_index.clear()
+        for appointment in Appointment.objects.all():
+            self.assertEqual(appointment.doctor_id, appointment.patient.doctor_id)
+            self.assertTrue(
+                availability_index.is_available(
+                    appointment.doctor_id, appointment.slot_start
+                )
+            )
+
+        # Runs again without clashing on unique department names
+        self.assertEqual(generate(patients=10)["departments"], 1)
+
+    def test_benchmark_writes_json_results(self):
+        generate(patients=20)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            call_command(
+                "benchmark",
+                scenario=["doctor-list", "patient-detail"],
+                requests=3,
+                warmup=1,
+                output=output,
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+            call_command(
+                "benchmark",
+                scenario=["doctor-list"],
+                requests=3,
+                warmup=0,
+                compare=output,
+                output=output,
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+            with open(output, encoding="utf-8") as file:
+                results = json.load(file)
+        self.assertEqual(results["environment"]["rows"]["patient"], 20)
+        result = results["scenarios"]["doctor-list"]
+        self.assertEqual(result["requests"], 3)
+        self.assertEqual(result["errors"], 0)
+        # Count + page
+        self.assertEqual(result["queries"], 2)
+        self.assertEqual(results["changes"]["doctor-list"]["queries"], 0)
+
+    def test_scenarios_request_what_they_name(self):
+        generate(patients=20)
+        paths = scenario_paths()
+        for name, path in paths.items():
+            self.assertEqual(self.client.get(path).status_code, 200, name)
+        slots = self.client.get(paths["doctor-slots"]).json()
+        days = date.fromisoformat(slots["to"]) - date.fromisoformat(slots["from"])
+        self.assertEqual(days.days, 13)
+
+
+DOCTOR_RELATIONS = "department_details,availability,assigned_patients"
+PATIENT_RELATIONS = "medical_history,appointments,doctor"
+
+
+class FlatSerializationTests(HospitalTestCase):
+    # A low limit puts next links into the nested collections
+    @override_settings(RESPONSE_CACHE_ALIAS=None, NESTED_COLLECTION_LIMIT=3)
+    def test_flat_payloads_match_serializers(self):
+        generate(patients=30, patients_per_doctor=10)
+        patient = create_patient("Walk In")
+        doctor = Doctor.objects.first()
+        patients = ",".join(Patient.objects.values_list("slug", flat=True)[:5])
+        for url in (
+            "/api/doctor/",
+            f"/api/doctor/{doctor.slug}/?expand={DOCTOR_RELATIONS}",
+            f"/api/doctor/?cursor=&limit=2&expand={DOCTOR_RELATIONS}",
+            "/api/doctor/?search=dr&fields=slug,availability",
+            f"/api/patient/?limit=50&expand={PATIENT_RELATIONS}",
+            "/api/patient/?count=false&offset=20&fields=age&expand=doctor",
+            f"/api/patient/?cursor=&limit=7&expand={PATIENT_RELATIONS}",
+            f"/api/patient/{patient.slug}/?expand={PATIENT_RELATIONS}",
+            f"/api/doctor/batch/?slugs={doctor.slug},x&expand={DOCTOR_RELATIONS}",
+            f"/api/patient/batch/?slugs=x,{patients}&fields=age&expand=appointments",
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                expected = self.client.get(url)
+            with self.settings(FLAT_SERIALIZATION=True):
+                with self.assertNumQueries(len(queries)):
+                    response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.content, expected.content, url)
+
+    RENDERED = {
+        "when": datetime(2024, 1, 1, 9, 30, 0, 120000, tzinfo=timezone.utc),
+        "amount": Decimal("1.50"),
+        "text": "line\u2028separator café",
+        1: [None, True, 2.5],
+    }
+
+    @skipUnless(renderers.orjson, "orjson is not installed")
+    def test_orjson_output_matches_json_renderer(self):
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(self.RENDERED),
+            JSONRenderer().render(self.RENDERED),
+        )
+
+    def test_fast_renderer_falls_back_to_json_renderer(self):
+        # Indented output and a missing orjson go through the standard library
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(
+                self.RENDERED, "application/json; indent=2"
+            ),
+            JSONRenderer().render(self.RENDERED, "application/json; indent=2"),
+        )
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(
+                renderers.FastJSONRenderer().render(self.RENDERED),
+                JSONRenderer().render(self.RENDERED),
+            )
+
+
+class ConditionalGetTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House", department=create_department())
+        self.patient = create_patient("John Smith", doctor=self.doctor)
+
+    def test_if_none_match_returns_304_without_serializing(self):
+        response = self.client.get("/api/doctor/")
+        etag = response["ETag"]
+
+        # No query at all, the versions are in the cache
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/doctor/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_if_modified_since(self):
+        # Versions from writes ten seconds ago
+        ten_seconds_ago = int((datetime.now().timestamp() - 10) * 1e9)
+        with mock.patch("hospital.cache.new_version", return_value=ten_seconds_ago):
+            invalidate("doctor", "department", "patient")
+        response = self.client.get("/api/doctor/")
+        last_modified = response["Last-Modified"]
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                "/api/doctor/", HTTP_IF_MODIFIED_SINCE=last_modified
+            )
+        self.assertEqual(response.status_code, 304)
+        # If-None-Match takes precedence
+        response = self.client.get(
+            "/api/doctor/",
+            HTTP_IF_MODIFIED_SINCE=last_modified,
+            HTTP_IF_NONE_MATCH='"stale"',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.name = "Lisa Cuddy"
+            self.doctor.save()
+        response = self.client.get("/api/doctor/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+        # Withheld until the second of the newest write is over
+        with mock.patch("time.time", return_value=1000.5):
+            self.assertIsNone(get_last_modified([1000_200_000_000]))
+            self.assertEqual(get_last_modified([999_900_000_000, 10]), 999)
+
+    def test_detail(self):
+        url = f"/api/patient/{self.patient.slug}/"
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_data_and_query(self):
+        etag = self.client.get("/api/patient/")["ETag"]
+        self.assertNotEqual(self.client.get("/api/patient/?limit=1")["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.age = 41
+            self.patient.save()
+        response = self.client.get("/api/patient/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_deleting_a_row_changes_etag(self):
+        create_patient("Jane Doe", doctor=self.doctor)
+        etag = self.client.get("/api/patient/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Patient.objects.filter(name="Jane Doe").delete()
+        response = self.client.get("/api/patient/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(RESPONSE_CACHE_ALIAS=None)
+    def test_embedded_rows_change_etag(self):
+        url = f"/api/patient/{self.patient.slug}/?expand=appointments,medical_history"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                patient=self.patient,
+                date=datetime(2024, 1, 8, 10, 0, tzinfo=timezone.utc),
+                details="Checkup",
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            MedicalHistory.objects.create(
+                patient=self.patient,
+                previous_diagnoses="Flu",
+                allergies="None",
+                medications="-",
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_department_list_and_detail(self):
+        department = Department.objects.get()
+        for url in ("/api/department/", f"/api/department/{department.slug}/"):
+            etag = self.client.get(url)["ETag"]
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+
+class AppointmentBookingTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        # Available Monday, Wednesday and Friday from 09:00 to 17:00
+        self.doctor = create_doctor("Gregory House")
+        self.patient = create_patient("John Smith", doctor=self.doctor)
+        self.url = f"/api/patient/{self.patient.slug}/appointment/"
+
+    def book(self, date):
+        return self.client.post(
+            self.url,
+            {"date": date, "details": "Checkup"},
+            content_type="application/json",
+        )
+
+    def test_booking_inside_a_slot(self):
+        response = self.book("2024-01-08 10:30:00.000000")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.filter(patient=self.patient).count(), 1)
+
+    def test_booking_outside_a_slot_is_rejected(self):
+        for date in (
+            "2024-01-08 08:59:00.000000",  # Monday before the slot
+            "2024-01-08 17:00:00.000000",  # Monday at the end of the slot
+            "2024-01-09 10:30:00.000000",  # Tuesday
+        ):
+            response = self.book(date)
+            self.assertEqual(response.status_code, 400, date)
+            self.assertEqual(
+                response.json()["error"],
+                "Doctor is not available at the requested time",
+            )
+        self.assertFalse(Appointment.objects.exists())
+
+    def test_index_follows_availability_updates(self):
+        self.assertEqual(self.book("2024-01-09 10:30:00.000000").status_code, 400)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/doctor/{self.doctor.slug}/",
+                {
+                    "availability": {
+                        "tuesday": {
+                            "start_time": "2024-01-01T22:00:00Z",
+                            "end_time": "2024-01-01T06:00:00Z",
+                        }
+                    }
+                },
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        # Overnight shift starting Tuesday evening
+        self.assertEqual(self.book("2024-01-09 23:30:00.000000").status_code, 201)
+        self.assertEqual(self.book("2024-01-10 05:30:00.000000").status_code, 201)
+        self.assertEqual(self.book("2024-01-08 10:30:00.000000").status_code, 400)
+
+    def test_patient_without_doctor(self):
+        patient = create_patient("Walk In")
+        response = self.client.post(
+            f"/api/patient/{patient.slug}/appointment/",
+            {"date": "2024-01-08 10:30:00.000000", "details": "Checkup"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class AvailabilityUpdateTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House")
+        self.rows = {
+            row.day: row
+            for row in DoctorAvailability.objects.filter(doctor=self.doctor)
+        }
+
+    def patch(self, availability):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.patch(
+                f"/api/doctor/{self.doctor.slug}/",
+                {"availability": availability},
+                content_type="application/json",
+            )
+
+    def timing(self, start_hour, end_hour):
+        return {
+            "start_time": f"2024-01-01T{start_hour:02}:00:00Z",
+            "end_time": f"2024-01-01T{end_hour:02}:00:00Z",
+        }
+
+    def test_only_changed_days_are_written(self):
+        availability_index.load(self.doctor.id)
+        wednesday = availability_index._slots[(self.doctor.id, 3)]
+        with CaptureQueriesContext(connection) as context:
+            response = self.patch(
+                {
+                    "monday": self.timing(10, 18),
+                    "wednesday": self.timing(9, 17),
+                    "saturday": self.timing(9, 12),
+                }
+            )
+        self.assertEqual(response.status_code, 200)
+        writes = [
+            query["sql"].split()[0]
+            for query in context.captured_queries
+            if query["sql"].split()[0] in ("INSERT", "UPDATE", "DELETE")
+        ]
+        # Friday dropped, Monday moved, Saturday added; Wednesday untouched
+        self.assertEqual(writes, ["DELETE", "UPDATE", "INSERT"])
+
+        rows = {row.day: row for row in DoctorAvailability.objects.all()}
+        self.assertEqual(set(rows), {1, 3, 6})
+        self.assertEqual(rows[1].id, self.rows[1].id)
+        self.assertEqual(rows[1].start_time.hour, 10)
+        self.assertEqual(rows[3].updated_at, self.rows[3].updated_at)
+
+        # Untouched days keep their index entries; changed ones are rebuilt
+        self.assertIs(availability_index._slots[(self.doctor.id, 3)], wednesday)
+        self.assertNotIn((self.doctor.id, 5), availability_index._slots)
+        # The index is at the bumped version, so lookups do not reload
+        moment = datetime(2024, 1, 6, 10, 0, tzinfo=timezone.utc)
+        with self.assertNumQueries(0):
+            self.assertTrue(availability_index.is_available(self.doctor.id, moment))
+        self.assertIs(availability_index._slots[(self.doctor.id, 3)], wednesday)
+
+    def test_update_over_stale_days_reloads(self):
+        monday = datetime(2024, 1, 8, 10, 0, tzinfo=timezone.utc)
+        availability_index.load(self.doctor.id)
+        # Another worker drops Monday; this index has not looked since
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rows[1].delete()
+        self.patch({"wednesday": self.timing(10, 18), "friday": self.timing(9, 17)})
+        with self.assertNumQueries(1):
+            self.assertFalse(availability_index.is_available(self.doctor.id, monday))
+
+    def test_other_workers_writes_are_picked_up(self):
+        monday = datetime(2024, 1, 8, 10, 0, tzinfo=timezone.utc)
+        self.assertTrue(availability_index.is_available(self.doctor.id, monday))
+        # Written without telling this process's index, as another worker
+        # would; only the shared version moves
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rows[1].delete()
+        self.assertFalse(availability_index.is_available(self.doctor.id, monday))
+
+        # An unchanged version costs no query, an evicted one a reload
+        with self.assertNumQueries(0):
+            availability_index.is_available(self.doctor.id, monday)
+        get_version_cache().clear()
+        with self.assertNumQueries(1):
+            availability_index.is_available(self.doctor.id, monday)
+
+    def test_missing_availability_keeps_schedule(self):
+        response = self.client.patch(
+            f"/api/doctor/{self.doctor.slug}/",
+            {"specialization": "Nephrologist"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DoctorAvailability.objects.count(), 3)
+
+    def test_invalid_availability_changes_nothing(self):
+        response = self.patch(
+            {"monday": self.timing(10, 18), "tuesday": {"start_time": "noon"}}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Invalid availability data")
+        row = DoctorAvailability.objects.get(day=1)
+        self.assertEqual(row.start_time.hour, 9)
+
+
+class PatchTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House")
+        self.patient = create_patient("Patient 0")
+        MedicalHistory.objects.create(
+            patient=self.patient,
+            previous_diagnoses="Flu",
+            allergies="None",
+            medications="Paracetamol",
+        )
+
+    def patch(self, url, payload):
+        return self.client.patch(url, payload, content_type="application/json")
+
+    def test_patient_patch_returns_updated_row(self):
+        url = f"/api/patient/{self.patient.slug}/"
+        payload = {
+            "age": 41,
+            "assigned_doctor": self.doctor.id,
+            "medical_history": {"allergies": "Penicillin"},
+        }
+        # Savepoint, locked fetch, doctor FK check, patient and history updates, release
+        with self.assertNumQueries(6):
+            response = self.patch(url, payload)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["age"], body["doctor"]), (41, self.doctor.id))
+        self.assertEqual(MedicalHistory.objects.get().allergies, "Penicillin")
+
+    def test_doctor_patch_returns_updated_row(self):
+        response = self.patch(
+            f"/api/doctor/{self.doctor.slug}/", {"specialization": "Nephrologist"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["specialization"], "Nephrologist")
+        self.assertEqual(Doctor.objects.get().specialization, "Nephrologist")
+
+    def test_unknown_and_invalid_fields_are_rejected(self):
+        url = f"/api/patient/{self.patient.slug}/"
+        for payload, error in (
+            ({"slug": "taken"}, "Unknown fields: slug"),
+            ({"gender": "X"}, "gender: Value 'X' is not a valid choice."),
+            ({"assigned_doctor": 999}, "doctor: doctor instance with id 999"),
+            ({"medical_history": {"patient_id": 1}}, "Invalid medical_history"),
+        ):
+            response = self.patch(url, payload)
+            self.assertEqual(response.status_code, 400)
+            self.assertTrue(response.json()["error"].startswith(error), payload)
+        response = self.patch(
+            f"/api/doctor/{self.doctor.slug}/", {"contact_information": "call me"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Patient.objects.get().gender, "M")
+
+    def test_missing_row(self):
+        response = self.patch("/api/patient/missing/", {"age": 30})
+        self.assertEqual(response.status_code, 400)
+
+
+class DoctorSlotsTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House")
+        self.patient = create_patient("Patient 0", doctor=self.doctor)
+        self.url = f"/api/doctor/{self.doctor.slug}/slots/"
+
+    def test_booked_slots_are_subtracted(self):
+        book_appointment(
+            self.patient, datetime(2024, 1, 8, 10, 5, tzinfo=timezone.utc), "Checkup"
+        )
+        with self.assertNumQueries(2):
+            response = self.client.get(f"{self.url}?from=2024-01-08&to=2024-01-14")
+        self.assertEqual(response.status_code, 200)
+        starts = [slot["start"] for slot in response.json()["slots"]]
+        # Monday, Wednesday and Friday, 09:00-17:00 in 15 minute slots, less one
+        self.assertEqual(len(starts), 3 * 32 - 1)
+        self.assertEqual(starts[0], "2024-01-08T09:00:00Z")
+        self.assertNotIn("2024-01-08T10:00:00Z", starts)
+        self.assertEqual(starts[-1], "2024-01-12T16:45:00Z")
+
+    @override_settings(APPOINTMENT_SLOT_MINUTES=60, APPOINTMENT_SLOT_CAPACITY=2)
+    def test_partly_booked_slots_report_free_seats(self):
+        book_appointment(
+            self.patient, datetime(2024, 1, 8, 9, 0, tzinfo=timezone.utc), "Checkup"
+        )
+        slots = self.client.get(f"{self.url}?from=2024-01-08&to=2024-01-08").json()
+        self.assertEqual(len(slots["slots"]), 8)
+        self.assertEqual(slots["slots"][0]["seats"], 1)
+        self.assertEqual(slots["slots"][1]["seats"], 2)
+
+    def test_month_range(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f"{self.url}?from=2024-01-01&to=2024-01-31")
+        # January 2024 has 5 Mondays, 5 Wednesdays and 4 Fridays
+        self.assertEqual(len(response.json()["slots"]), 14 * 32)
+
+    def test_invalid_requests(self):
+        for query, status_code in (
+            ("from=yesterday", 400),
+            ("from=2024-02-30", 400),
+            ("from=2024-01-10&to=2024-01-09", 400),
+            ("from=2024-01-01&to=2024-06-01", 400),
+        ):
+            response = self.client.get(f"{self.url}?{query}")
+            self.assertEqual(response.status_code, status_code, query)
+        response = self.client.get("/api/doctor/missing/slots/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_doctor_without_schedule(self):
+        doctor = Doctor.objects.create(
+            name="New Doctor", specialization="GP", contact_information="+919876543210"
+        )
+        response = self.client.get(f"/api/doctor/{doctor.slug}/slots/")
+        self.assertEqual(response.json()["slots"], [])
+
+
+class DashboardTests(HospitalTestCase):
+    url = "/api/department/dashboard/?from=2024-01-08&days=3"
+
+    def create_data(self):
+        cardiology = create_department("Cardiology")
+        create_department("Radiology")
+        for index in range(2):
+            doctor = create_doctor(f"Doctor {index}", department=cardiology)
+            for letter in "AB":
+                patient = create_patient(f"Patient {index} {letter}", doctor=doctor)
+                book_appointment(
+                    patient,
+                    datetime(
+                        2024, 1, 8, 9 if letter == "A" else 10, tzinfo=timezone.utc
+                    ),
+                    "Checkup",
+                )
+        return cardiology
+
+    def test_grouped_aggregates(self):
+        self.create_data()
+        # Departments, doctor counts, patient counts, bookings, availability
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        cardiology, radiology = response.json()["departments"]
+        self.assertEqual(
+            (cardiology["doctor_count"], cardiology["patient_count"]), (2, 4)
+        )
+        monday, tuesday, wednesday = cardiology["days"]
+        # Two doctors with 32 fifteen-minute slots each on Mondays
+        self.assertEqual(
+            monday,
+            {
+                "date": "2024-01-08",
+                "appointments": 4,
+                "capacity": 64,
+                "utilisation": 0.0625,
+            },
+        )
+        self.assertEqual((tuesday["capacity"], tuesday["utilisation"]), (0, None))
+        self.assertEqual(wednesday["appointments"], 0)
+        self.assertEqual(cardiology["utilisation"], round(4 / 128, 4))
+        self.assertEqual(radiology["doctor_count"], 0)
+
+    def test_invalid_parameters(self):
+        for query in ("days=0", "days=100", "days=x", "from=2024-13-01"):
+            response = self.client.get(f"/api/department/dashboard/?{query}")
+            self.assertEqual(response.status_code, 400, query)
+
+    @override_settings(DASHBOARD_COUNTERS=True)
+    def test_counters_match_aggregates(self):
+        connect_counter_signals()
+        self.addCleanup(disconnect_counter_signals)
+        # The counters are refreshed once each write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            cardiology = self.create_data()
+        radiology = Department.objects.get(name="Radiology")
+
+        def compare():
+            with self.assertNumQueries(3):
+                counted = self.client.get(self.url).json()
+            with self.settings(DASHBOARD_COUNTERS=False):
+                self.assertEqual(counted, self.client.get(self.url).json())
+            return counted
+
+        self.assertEqual(compare()["departments"][0]["patient_count"], 4)
+
+        # Move a doctor with their patients and bookings, then remove a patient
+        doctor = Doctor.objects.get(name="Doctor 0")
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.department = radiology
+            doctor.save()
+            Patient.objects.get(name="Patient 1 A").delete()
+        cardiology_row, radiology_row = compare()["departments"]
+        self.assertEqual(cardiology_row["patient_count"], 1)
+        self.assertEqual(radiology_row["days"][0]["appointments"], 2)
+        self.assertEqual(radiology_row["days"][0]["capacity"], 32)
+
+        # Schedule changes move the capacity
+        with self.captureOnCommitCallbacks(execute=True):
+            DoctorAvailability.objects.filter(doctor=doctor).delete()
+        self.assertEqual(compare()["departments"][1]["days"][0]["capacity"], 0)
+
+        # Bulk writes skip the signals until the counters are rebuilt
+        DepartmentCounter.objects.all().delete()
+        DepartmentWeekdaySeats.objects.all().delete()
+        call_command("rebuild_dashboard_counters", stdout=StringIO())
+        compare()
+        self.assertEqual(
+            DepartmentCounter.objects.get(department=cardiology).doctor_count, 1
+        )
+
+    @override_settings(DASHBOARD_COUNTERS=True)
+    def test_failed_recount_keeps_the_write(self):
+        connect_counter_signals()
+        self.addCleanup(disconnect_counter_signals)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_data()
+        patient = Patient.objects.get(name="Patient 0 A")
+        url = f"/api/patient/{patient.slug}/appointment/"
+        payload = {"date": "2024-01-08 11:00:00.000000", "details": "Checkup"}
+        with mock.patch(
+            "hospital.dashboard.refresh_daily_appointments",
+            side_effect=OperationalError("database is locked"),
+        ), self.assertLogs("django", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    url, payload, content_type="application/json"
+                )
+        self.assertEqual(response.status_code, 201)
+
+        # Saves that leave the department and day alone recount nothing
+        appointment = Appointment.objects.get(
+            patient=patient, details="Checkup", slot_start__hour=11
+        )
+        appointment.details = "Follow-up"
+        with mock.patch("hospital.dashboard.after_commit") as after_commit:
+            appointment.save()
+        after_commit.assert_not_called()
+
+
+@override_settings(APPOINTMENT_SLOT_MINUTES=30, APPOINTMENT_SLOT_CAPACITY=2)
+class BookingEngineTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House")
+        self.patients = [
+            create_patient(f"Patient {index}", doctor=self.doctor) for index in range(3)
+        ]
+
+    def test_bookings_fill_slot_seats(self):
+        first = book_appointment(
+            self.patients[0], datetime(2024, 1, 8, 10, 5, tzinfo=timezone.utc), "A"
+        )
+        second = book_appointment(
+            self.patients[1], datetime(2024, 1, 8, 10, 25, tzinfo=timezone.utc), "B"
+        )
+        self.assertEqual(
+            first.slot_start, datetime(2024, 1, 8, 10, 0, tzinfo=timezone.utc)
+        )
+        self.assertEqual(second.slot_start, first.slot_start)
+        self.assertEqual({first.seat, second.seat}, {0, 1})
+
+        with self.assertRaises(SlotFull):
+            book_appointment(
+                self.patients[2], datetime(2024, 1, 8, 10, 10, tzinfo=timezone.utc), "C"
+            )
+        # The next slot is free
+        book_appointment(
+            self.patients[2], datetime(2024, 1, 8, 10, 30, tzinfo=timezone.utc), "C"
+        )
+
+    def test_slot_must_fit_before_the_schedule_ends(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            monday = DoctorAvailability.objects.get(doctor=self.doctor, day=1)
+            monday.end_time = datetime(2024, 1, 1, 16, 45, tzinfo=timezone.utc)
+            monday.save()
+        # 16:40 is inside the schedule, but its 16:30 slot runs to 17:00
+        with self.assertRaises(DoctorUnavailable):
+            book_appointment(
+                self.patients[0], datetime(2024, 1, 8, 16, 40, tzinfo=timezone.utc), "A"
+            )
+        book_appointment(
+            self.patients[0], datetime(2024, 1, 8, 16, 10, tzinfo=timezone.utc), "A"
+        )
+        # The slot listing agrees
+        slots = self.client.get(
+            f"/api/doctor/{self.doctor.slug}/slots/?from=2024-01-08&to=2024-01-08"
+        ).json()["slots"]
+        self.assertEqual(slots[-1]["start"], "2024-01-08T16:00:00Z")
+
+    def test_patient_cannot_double_book_a_slot(self):
+        url = f"/api/patient/{self.patients[0].slug}/appointment/"
+        payload = {"date": "2024-01-08 10:05:00.000000", "details": "Checkup"}
+        response = self.client.post(url, payload, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(url, payload, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+
+
+# The in-memory test database reports lock contention immediately instead of
+# waiting, so allow more retries than a file or server database needs
+@override_settings(
+    APPOINTMENT_SLOT_MINUTES=15,
+    APPOINTMENT_SLOT_CAPACITY=2,
+    APPOINTMENT_BOOKING_RETRIES=50,
+)
+class ConcurrentBookingTests(TransactionTestCase):
+    def setUp(self):
+        availability_index.clear()
+
+    def test_concurrent_bookings_never_exceed_capacity(self):
+        doctors = [create_doctor(f"Doctor {index}") for index in range(2)]
+        patients = [
+            create_patient(f"Patient {doctor.id} {index}", doctor=doctor)
+            for doctor in doctors
+            for index in range(8)
+        ]
+        moment = datetime(2024, 1, 8, 10, 0, tzinfo=timezone.utc)
+        barrier = threading.Barrier(len(patients))
+        outcomes = []
+
+        def book(patient):
+            try:
+                barrier.wait()
+                book_appointment(patient, moment, "Checkup")
+                outcomes.append("booked")
+            except Exception as error:
+                outcomes.append(type(error).__name__)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=book, args=(patient,)) for patient in patients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for doctor in doctors:
+            seats = list(
+                Appointment.objects.filter(
+                    doctor=doctor, slot_start=moment
+                ).values_list("seat", flat=True)
+            )
+            self.assertEqual(sorted(seats), [0, 1])
+        self.assertEqual(outcomes.count("booked"), 4, outcomes)
+        self.assertEqual(outcomes.count("SlotFull"), len(patients) - 4, outcomes)
+
+
+class IdempotencyTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House")
+        self.patient_payload = {
+            "name": "John Smith",
+            "age": 30,
+            "gender": "M",
+            "contact_information": "+919876543211",
+            "assigned_doctor": self.doctor.id,
+        }
+
+    def post(self, url, payload, key):
+        return self.client.post(
+            url, payload, content_type="application/json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retries_replay_the_stored_response(self):
+        first = self.post("/api/patient/", self.patient_payload, "patient-1")
+        retry = self.post("/api/patient/", self.patient_payload, "patient-1")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+        self.assertEqual(Patient.objects.count(), 1)
+
+        url = f"/api/patient/{first.json()['slug']}/appointment/"
+        booking = {"date": "2024-01-08 10:30:00.000000", "details": "Checkup"}
+        for _ in range(2):
+            response = self.post(url, booking, "appointment-1")
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+        # Without a key every request runs
+        response = self.client.post(url, booking, content_type="application/json")
+        self.assertEqual(response.status_code, 409)
+
+    def test_reused_keys_and_failed_attempts(self):
+        self.post("/api/patient/", self.patient_payload, "patient-1")
+        response = self.post(
+            "/api/patient/", dict(self.patient_payload, age=31), "patient-1"
+        )
+        self.assertEqual(response.status_code, 422)
+
+        # The doctor row of a failed attempt is rolled back and the key freed
+        payload = {
+            "name": "James Wilson",
+            "specialization": "Oncologist",
+            "contact_information": "+919876543212",
+            "department": None,
+            "availability": {"monday": {}},
+        }
+        response = self.post("/api/doctor/", payload, "doctor-1")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Doctor.objects.filter(name="James Wilson").exists())
+        payload["availability"] = {}
+        response = self.post("/api/doctor/", payload, "doctor-1")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+        response = self.post("/api/patient/", self.patient_payload, "k" * 256)
+        self.assertEqual(response.status_code, 400)
+
+    def test_keys_are_scoped_to_the_user(self):
+        first = self.post("/api/patient/", self.patient_payload, "patient-1")
+        user = User.objects.create_user("clerk", "clerk@example.com", "secret")
+        self.client.force_login(user)
+        second = self.post("/api/patient/", self.patient_payload, "patient-1")
+        self.assertEqual(second.status_code, 201)
+        self.assertFalse(second.has_header("Idempotent-Replayed"))
+        self.assertNotEqual(second.json()["slug"], first.json()["slug"])
+        self.assertEqual(
+            set(IdempotencyKey.objects.values_list("scope", flat=True)),
+            {"anonymous", f"user:{user.pk}"},
+        )
+
+    def test_replays_keep_the_view_headers(self):
+        @idempotent
+        def post(view, request):
+            response = Response({"slug": "john-smith"}, status=201)
+            response["Location"] = "/api/patient/john-smith/"
+            return response
+
+        request = RequestFactory().post(
+            "/api/patient/", {}, content_type="application/json"
+        )
+        request.META["HTTP_IDEMPOTENCY_KEY"] = "patient-1"
+        post(None, request)
+        retry = post(None, request)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry["Location"], "/api/patient/john-smith/")
+
+    def test_key_held_by_a_running_request(self):
+        # What SQLite raises when the busy timeout passes during the insert
+        locked = OperationalError("database is locked")
+        with mock.patch.object(IdempotencyKey.objects, "create", side_effect=locked):
+            response = self.post("/api/patient/", self.patient_payload, "patient-1")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertFalse(Patient.objects.exists())
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=60)
+    def test_expired_keys_are_purged(self):
+        self.post("/api/patient/", self.patient_payload, "patient-1")
+        IdempotencyKey.objects.update(
+            created_at=datetime(2024, 1, 1, tzinfo=timezone.utc)
+        )
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Purged 1 idempotency keys")
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+# SQLite's in-memory test database fails a concurrent writer at once
+# ("database table is locked") where PostgreSQL makes it wait on the key
+@skipUnless(connection.vendor == "postgresql", "needs blocking unique inserts")
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    def test_concurrent_duplicates_are_coalesced(self):
+        doctor = create_doctor("Gregory House")
+        payload = {
+            "name": "John Smith",
+            "age": 30,
+            "gender": "M",
+            "contact_information": "+919876543211",
+            "assigned_doctor": doctor.id,
+        }
+        barrier = threading.Barrier(4)
+        responses = []
+
+        def post():
+            try:
+                barrier.wait()
+                response = self.client_class().post(
+                    "/api/patient/",
+                    payload,
+                    content_type="application/json",
+                    HTTP_IDEMPOTENCY_KEY="patient-1",
+                )
+                responses.append((response.status_code, response.json()))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(Patient.objects.count(), 1)
+        slug = Patient.objects.get().slug
+        self.assertEqual(
+            responses,
+            [(201, {"message": "Patient Created Successfully", "slug": slug})] * 4,
+        )
+
+
+class PatientImportTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = create_doctor("Gregory House")
+        admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        self.client.force_login(admin)
+
+    def upload(self, body, content_type, batch_size=2):
+        return self.client.generic(
+            "POST",
+            f"/api/patient/import/?batch_size={batch_size}",
+            body,
+            content_type=content_type,
+        )
+
+    def test_json_lines_import(self):
+        history = {"previous_diagnoses": "Flu", "allergies": "None", "medications": "-"}
+        rows = [
+            {"name": "Patient 0", "assigned_doctor": self.doctor.id},
+            {"name": "Patient 1", "assigned_doctor": self.doctor.slug},
+            {"name": "Patient 2", "medical_history": history},
+            {"name": "Patient 3", "assigned_doctor": 999},
+            {"name": "Patient 0"},
+            {"name": "Patient 5", "gender": "X"},
+        ]
+        lines = [
+            json.dumps(
+                {
+                    "age": 30,
+                    "gender": "F",
+                    "contact_information": "+919876543211",
+                    **row,
+                }
+            )
+            for row in rows
+        ]
+        lines.insert(3, "{not json")
+        response = self.upload("\n".join(lines), "application/x-ndjson")
+
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual(summary["created"], 4)
+        self.assertEqual(
+            summary["errors"],
+            [
+                {"row": 4, "error": "Invalid JSON"},
+                {"row": 5, "error": "Unknown assigned_doctor"},
+                {
+                    "row": 7,
+                    "error": "gender: Value 'X' is not a valid choice.",
+                },
+            ],
+        )
+        self.assertEqual(Patient.objects.filter(doctor=self.doctor).count(), 2)
+        # Namesakes get distinct slugs, allocated without a save() call
+        slugs = Patient.objects.filter(name="Patient 0").values_list("slug", flat=True)
+        self.assertEqual(len(set(slugs)), 2)
+        self.assertEqual(
+            MedicalHistory.objects.get().patient, Patient.objects.get(name="Patient 2")
+        )
+
+    def test_csv_import(self):
+        body = (
+            "name,age,gender,contact_information,assigned_doctor,"
+            "previous_diagnoses,allergies,medications\n"
+            f"Jane Doe,41,F,+919876543211,{self.doctor.slug},Asthma,Pollen,Inhaler\n"
+            "John Doe,,M,+919876543211,,,,\n"
+        )
+        summary = self.upload(body, "text/csv").json()
+        self.assertEqual(summary["created"], 1)
+        self.assertEqual(
+            summary["errors"], [{"row": 3, "error": "Missing fields: age"}]
+        )
+        self.assertEqual(MedicalHistory.objects.get().allergies, "Pollen")
+
+    def test_unsupported_content_type(self):
+        response = self.upload("{}", "application/json")
+        self.assertEqual(response.status_code, 415)
+
+    def test_import_is_admin_only(self):
+        self.client.logout()
+        response = self.upload('{"name": "Jane Doe"}', "application/x-ndjson")
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_utf8_is_rejected(self):
+        row = json.dumps(
+            {"name": "Jane Doe", "age": 41, "gender": "F", "contact_information": "-"}
+        )
+        body = "\n".join([row] * 3).encode() + b'\n{"name": "Jos\xe9"}\n'
+        response = self.upload(body, "application/x-ndjson")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Line 4 is not valid UTF-8"})
+        # Checked before the first batch commits
+        self.assertFalse(Patient.objects.exists())
+
+    def test_csv_keeps_blank_history_cells(self):
+        body = (
+            "name,age,gender,contact_information,"
+            "previous_diagnoses,allergies,medications\n"
+            "Jane Doe,41,F,+919876543211,Asthma,,Inhaler\n"
+            "John Doe,40,M,+919876543211,,,\n"
+        )
+        summary = self.upload(body, "text/csv").json()
+        self.assertEqual((summary["created"], summary["errors"]), (2, []))
+        # A blank row is no history at all, as in JSON Lines
+        history = MedicalHistory.objects.get()
+        self.assertEqual((history.patient.name, history.allergies), ("Jane Doe", ""))
+
+    def test_rejected_batch_is_saved_row_by_row(self):
+        rows = [
+            {
+                "name": name,
+                "age": 41,
+                "gender": "F",
+                "contact_information": "+919876543211",
+            }
+            for name in ("Jane Doe", "Broken", "John Doe")
+        ]
+        bulk_create = Patient.objects.bulk_create
+
+        def reject_broken(patients, *args, **kwargs):
+            if any(patient.name == "Broken" for patient in patients):
+                raise IntegrityError("rejected")
+            return bulk_create(patients, *args, **kwargs)
+
+        with mock.patch.object(
+            Patient.objects, "bulk_create", side_effect=reject_broken
+        ):
+            response = self.upload(
+                "\n".join(json.dumps(row) for row in rows),
+                "application/x-ndjson",
+                batch_size=3,
+            )
+        summary = response.json()
+        self.assertEqual(summary["created"], 2)
+        self.assertEqual(
+            summary["errors"], [{"row": 2, "error": "Row could not be saved"}]
+        )
+
+    def test_upload_without_content_length(self):
+        row = {
+            "name": "Jane Doe",
+            "age": 41,
+            "gender": "F",
+            "contact_information": "+919876543211",
+        }
+        request = RequestFactory().post(
+            "/api/patient/import/", json.dumps(row), content_type="application/x-ndjson"
+        )
+        # A chunked upload carries no Content-Length; under ASGI the body
+        # is still readable from the request
+        del request.META["CONTENT_LENGTH"]
+        request._stream = BytesIO(json.dumps(row).encode())
+        force_authenticate(request, user=User.objects.get(username="admin"))
+        response = PatientImportAPIView.as_view()(request)
+        self.assertEqual(response.data["created"], 1)
+
+
+class PatientExportTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        doctor = create_doctor("Gregory House")
+        for index in range(5):
+            patient = create_patient(f"Patient {index}", doctor=doctor)
+            Appointment.objects.create(
+                patient=patient,
+                date=datetime(2024, 1, 8, 10, index, tzinfo=timezone.utc),
+                details="Checkup",
+            )
+        MedicalHistory.objects.create(
+            patient=patient, previous_diagnoses="Flu", allergies="None", medications="-"
+        )
+        admin = User.objects.create_superuser("admin", "admin@example.com", "secret")
+        self.client.force_login(admin)
+
+    def test_export_is_admin_only(self):
+        self.client.logout()
+        response = self.client.get("/api/patient/export/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_json_lines_export(self):
+        response = self.client.get("/api/patient/export/?chunk_size=2")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        # Patients, then histories and appointments for each of the three chunks
+        with self.assertNumQueries(7):
+            rows = [
+                json.loads(line)
+                for line in b"".join(response.streaming_content).splitlines()
+            ]
+        self.assertEqual(
+            [row["name"] for row in rows], [f"Patient {index}" for index in range(5)]
+        )
+        self.assertEqual(rows[0]["doctor"], Doctor.objects.get().slug)
+        self.assertIsNone(rows[0]["medical_history"])
+        self.assertEqual(rows[4]["medical_history"]["previous_diagnoses"], "Flu")
+        self.assertEqual(
+            rows[4]["appointments"],
+            [{"date": "2024-01-08T10:04:00+00:00", "details": "Checkup"}],
+        )
+
+    def test_csv_export(self):
+        response = self.client.get("/api/patient/export/?file_format=csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["slug", "name", "age"])
+        self.assertEqual(len(lines), 6)
+
+    def test_management_command(self):
+        output = StringIO()
+        call_command("export_patients", "--format", "jsonl", stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 5)
+
+
+class SlugAllocationTests(HospitalTestCase):
+    def test_namesakes_get_distinct_slugs(self):
+        payload = {
+            "name": "John Smith",
+            "age": 30,
+            "gender": "M",
+            "contact_information": "+919876543211",
+            "assigned_doctor": create_doctor("Gregory House").id,
+        }
+        slugs = []
+        for _ in range(2):
+            response = self.client.post(
+                "/api/patient/", payload, content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 201)
+            slugs.append(response.json()["slug"])
+        self.assertNotEqual(slugs[0], slugs[1])
+        self.assertTrue(all(slug.startswith("john-smith-") for slug in slugs))
+
+    def test_single_insert_per_patient(self):
+        with CaptureQueriesContext(connection) as queries:
+            create_patient("John Smith")
+        # Only the savepoint around the INSERT, no lookup of the slug
+        statements = [query["sql"].split()[0] for query in queries]
+        self.assertEqual(statements, ["SAVEPOINT", "INSERT", "RELEASE"])
+
+    def test_taken_slug_is_replaced(self):
+        taken = create_patient("John Smith").slug
+        fresh = unique_slug("John Smith")
+        with mock.patch("hospital.slugs.unique_slug", side_effect=[taken, fresh]):
+            patient = create_patient("John Smith")
+        self.assertEqual(patient.slug, fresh)
+        self.assertEqual(Patient.objects.count(), 2)
+
+    def test_node_ids_differ_by_pid(self):
+        generator = SlugTokenGenerator(host_id=7)
+        with mock.patch("os.getpid", return_value=1234):
+            first = generator.get_node_id()
+        generator.after_fork()
+        with mock.patch("os.getpid", return_value=1235):
+            self.assertNotEqual(generator.get_node_id(), first)
+
+    def test_bulk_create_assigns_slugs(self):
+        patients = Patient.objects.bulk_create(
+            [
+                Patient(name="Jane Doe", age=30, gender="F", contact_information="1")
+                for _ in range(3)
+            ]
+        )
+        self.assertEqual(len({patient.slug for patient in patients}), 3)
+
+    def test_tokens_are_unique_and_slugs_fit_the_column(self):
+        slugs = {unique_slug("Jane Doe") for _ in range(5000)}
+        self.assertEqual(len(slugs), 5000)
+        slug = unique_slug("x" * 200)
+        self.assertLessEqual(len(slug), 50)
+
+
+class AsyncViewTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        doctor = create_doctor("Gregory House", department=create_department())
+        for index in range(3):
+            patient = create_patient(f"Patient {index}", doctor=doctor)
+            MedicalHistory.objects.create(
+                patient=patient,
+                previous_diagnoses="Flu",
+                allergies="None",
+                medications="Paracetamol",
+            )
+            Appointment.objects.create(
+                patient=patient,
+                date=datetime(2024, 1, 1, 10 + index, 0, tzinfo=timezone.utc),
+                details="Checkup",
+            )
+        self.doctor = doctor
+
+    def assertSamePayload(self, url):
+        sync_body = self.client.get(f"/api/{url}").json()
+        async_body = self.client.get(f"/api/async/{url}").json()
+        for key in ("next", "previous"):
+            if sync_body.get(key):
+                sync_body[key] = sync_body[key].replace("/api/", "/api/async/")
+        self.assertEqual(async_body, sync_body)
+
+    def test_doctor_and_patient_payloads_match_sync_views(self):
+        self.assertSamePayload("doctor/?limit=50")
+        self.assertSamePayload(f"doctor/{self.doctor.slug}/")
+        self.assertSamePayload("patient/?limit=2&offset=1")
+        self.assertSamePayload("patient/?limit=2&count=false")
+        self.assertSamePayload("patient/?cursor=&limit=2")
+        self.assertSamePayload("patient/?search=Patient")
+        self.assertSamePayload(
+            "doctor/?expand=department_details,availability,assigned_patients"
+        )
+        self.assertSamePayload("patient/?fields=name,doctor&expand=appointments")
+
+    def test_query_count_is_constant(self):
+        # count + page + medical histories + appointments
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                "/api/async/patient/?limit=50&expand=medical_history,appointments"
+            )
+        self.assertEqual(len(response.json()["results"]), 3)
+
+    def test_patient_appointments(self):
+        patient = Patient.objects.get(name="Patient 1")
+        response = self.client.get(f"/api/async/patient/{patient.slug}/appointments/")
+        body = response.json()
+        self.assertEqual(body["results"][0]["details"], "Checkup")
+        self.assertIsNone(body["next"])
+        self.assertEqual(
+            self.client.get(f"/api/patient/{patient.slug}/appointments/").json(), body
+        )
+
+        response = self.client.get("/api/async/patient/missing/appointments/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/async/patient/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=0)
+
+    def rollback(self):
+        if self.info.transaction_status == 4:
+            raise OSError("connection lost")
+        self.info.transaction_status = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_returned_connections_are_reused(self):
+        pool = ConnectionPool(max_size=2)
+        first = pool.getconn(FakeConnection)
+        pool.putconn(first)
+        self.assertIs(pool.getconn(FakeConnection), first)
+        self.assertEqual(pool.status()["connections_opened"], 1)
+        self.assertEqual(pool.status()["connections_reused"], 1)
+
+    def test_waits_for_a_free_connection_then_times_out(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.getconn(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(FakeConnection)
+
+    def test_unusable_connections_are_closed_not_reused(self):
+        pool = ConnectionPool(max_size=3, max_lifetime=60)
+        in_transaction, broken, stale = (pool.getconn(FakeConnection) for _ in range(3))
+        in_transaction.info.transaction_status = 2
+        broken.info.transaction_status = 4
+        for connection in (in_transaction, broken, stale):
+            pool.putconn(connection)
+        self.assertEqual((in_transaction.closed, broken.closed), (0, 1))
+
+        # Idle connections failing the health check are replaced
+        connection = pool.getconn(FakeConnection, check=lambda connection: False)
+        self.assertNotIn(connection, (in_transaction, stale))
+        self.assertTrue(in_transaction.closed and stale.closed)
+
+    def test_stats_count_every_borrow_across_threads(self):
+        pool = ConnectionPool(max_size=4)
+
+        def borrow():
+            for _ in range(500):
+                pool.putconn(pool.getconn(FakeConnection))
+
+        threads = [threading.Thread(target=borrow) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        status = pool.status()
+        self.assertEqual(
+            status["connections_opened"] + status["connections_reused"], 4000
+        )
+        self.assertEqual(status["open"], status["connections_opened"])
+
+
+def full_scans(sql):
+    """
+    Plan steps in which the database reads a whole table, or a whole index
+    without a LIMIT to stop it, to run sql
+    """
+    limited = re.search(r"\bLIMIT\b", sql) is not None
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            with transaction.atomic():
+                # Make a sequential scan the last resort, so one means no usable index
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+                plan = [row[0] for row in cursor]
+            scans = []
+            for index, step in enumerate(plan):
+                if "Seq Scan" in step:
+                    scans.append(step)
+                elif "Index" in step and "Scan" in step and not limited:
+                    # An index scan with no condition walks the whole index
+                    details = takewhile(
+                        lambda line: "->" not in line, plan[index + 1 :]
+                    )
+                    if not any("Index Cond" in line for line in details):
+                        scans.append(step)
+            return scans
+        # "SCAN table" is a full table scan, and "SCAN table USING [COVERING]
+        # INDEX" a full index scan unless a LIMIT ends it early; a scan of a
+        # subquery, like the one around a window filter, reads its rows
+        tables = set(connection.introspection.table_names(cursor))
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        scans = []
+        for row in cursor.fetchall():
+            match = re.fullmatch(
+                r"SCAN (?:TABLE )?(\w+)(?: AS \w+)?( USING (?:COVERING )?INDEX \w+)?",
+                row[-1],
+            )
+            if match and match.group(1) in tables:
+                if not match.group(2) or not limited:
+                    scans.append(row[-1])
+        return scans
+
+
+class QueryPlanTests(HospitalTestCase):
+    """Every query on the hot paths must be answered from an index"""
+
+    def setUp(self):
+        super().setUp()
+        department = create_department()
+        for index in range(3):
+            doctor = create_doctor(f"Doctor {index}", department=department)
+            for letter in "AB":
+                patient = create_patient(f"Patient {index} {letter}", doctor=doctor)
+                MedicalHistory.objects.create(
+                    patient=patient,
+                    previous_diagnoses="Flu",
+                    allergies="None",
+                    medications="Paracetamol",
+                )
+                Appointment.objects.create(
+                    patient=patient,
+                    date=datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc),
+                    details="Checkup",
+                )
+        self.doctor = doctor
+        self.patient = patient
+
+    def assertIndexedQueries(self, run, warm_up=None):
+        if warm_up is not None:
+            # Fill the caches the steady state reads from, such as list counts
+            warm_up()
+        with CaptureQueriesContext(connection) as context:
+            run()
+        queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+        self.assertTrue(queries)
+        for sql in queries:
+            with self.subTest(sql=sql):
+                self.assertEqual(full_scans(sql), [])
+
+    def test_doctor_detail(self):
+        self.assertIndexedQueries(
+            lambda: self.client.get(f"/api/doctor/{self.doctor.slug}/")
+        )
+
+    def test_doctor_specialization_filter(self):
+        self.assertIndexedQueries(
+            lambda: self.client.get("/api/doctor/?specialization=Cardiologist")
+        )
+
+    def test_patient_detail(self):
+        self.assertIndexedQueries(
+            lambda: self.client.get(f"/api/patient/{self.patient.slug}/")
+        )
+
+    def test_doctor_slots(self):
+        self.assertIndexedQueries(
+            lambda: self.client.get(
+                f"/api/doctor/{self.doctor.slug}/slots/?from=2024-01-01&to=2024-01-31"
+            )
+        )
+
+    def test_keyset_page(self):
+        def walk():
+            body = self.client.get("/api/patient/?cursor=&limit=2").json()
+            self.client.get(body["next"])
+
+        self.assertIndexedQueries(walk)
+
+    def test_sub_resource_pages(self):
+        def walk():
+            url = f"/api/doctor/{self.doctor.slug}/patients/?limit=1&from=2024-01-01"
+            self.client.get(self.client.get(url).json()["next"])
+            url = f"/api/patient/{self.patient.slug}/appointments/?to=2024-01-31"
+            self.client.get(url)
+
+        self.assertIndexedQueries(walk)
+
+    def test_capped_nested_collections(self):
+        for url in (
+            "/api/doctor/?expand=assigned_patients",
+            "/api/patient/?expand=appointments",
+        ):
+            # Another page of the same listing first, which caches its count
+            self.assertIndexedQueries(
+                lambda: self.client.get(url + "&offset=0"),
+                warm_up=lambda: self.client.get(url + "&offset=1"),
+            )
+
+    def test_list_pages_reuse_the_count(self):
+        def page(offset):
+            response = self.client.get(f"/api/patient/?limit=1&offset={offset}")
+            self.assertEqual(response["X-Cache"], "MISS")
+            self.assertEqual(response.json()["count"], 6)
+
+        self.assertIndexedQueries(lambda: page(1), warm_up=lambda: page(0))
+
+    def test_booking(self):
+        self.assertIndexedQueries(
+            lambda: book_appointment(
+                self.patient,
+                datetime(2024, 1, 3, 10, 0, tzinfo=timezone.utc),
+                "Follow-up",
+            )
+        )
@@ -4,8 +4,18 @@ from .views import (
     DepartmentViewSet,
     DoctorAPIView,
     PatientAPIView,
+    PatientImportAPIView,
+    PatientExportAPIView,
     DoctorAppointmentAPIView,
+    DoctorBatchAPIView,
+    PatientBatchAPIView,
+    DoctorSlotsAPIView,
+    DoctorPatientsAPIView,
+    PatientAppointmentsAPIView,
+    CacheStatsAPIView,
+    MetricsAPIView,
 )
+from .async_views import AsyncAppointmentView, AsyncDoctorView, AsyncPatientView
 
 app_name = "Hospital Management"
 
@@ -14,19 +24,56 @@ router.register(r"department", DepartmentViewSet, basename="department")
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("cache/stats/", CacheStatsAPIView.as_view(), name="cache-stats"),
+    path("metrics/", MetricsAPIView.as_view(), name="metrics"),
     path(
         "patient/<slug:slug>/appointment/",
         DoctorAppointmentAPIView.as_view(),
         name="doctor-appointment",
     ),
+    path(
+        "doctor/<slug:slug>/slots/", DoctorSlotsAPIView.as_view(), name="doctor-slots"
+    ),
+    path(
+        "doctor/<slug:slug>/patients/",
+        DoctorPatientsAPIView.as_view(),
+        name="doctor-patients",
+    ),
+    path(
+        "patient/<slug:slug>/appointments/",
+        PatientAppointmentsAPIView.as_view(),
+        name="patient-appointments",
+    ),
+    # Must precede doctor-view, whose optional slug would match it
+    path("doctor/batch/", DoctorBatchAPIView.as_view(), name="doctor-batch"),
     re_path(
         r"^doctor/(?P<slug>[a-zA-Z0-9_-]+)?/?$",
         DoctorAPIView.as_view(),
         name="doctor-view",
     ),
+    # Must precede patient-view, whose optional slug would match these
+    path("patient/batch/", PatientBatchAPIView.as_view(), name="patient-batch"),
+    path("patient/import/", PatientImportAPIView.as_view(), name="patient-import"),
+    path("patient/export/", PatientExportAPIView.as_view(), name="patient-export"),
     re_path(
         r"^patient/(?P<slug>[a-zA-Z0-9_-]+)?/?$",
         PatientAPIView.as_view(),
         name="patient-view",
     ),
+    # Async read-only mirrors of the GET endpoints, for ASGI deployments
+    path(
+        "async/patient/<slug:slug>/appointments/",
+        AsyncAppointmentView.as_view(),
+        name="async-patient-appointments",
+    ),
+    re_path(
+        r"^async/doctor/(?P<slug>[a-zA-Z0-9_-]+)?/?$",
+        AsyncDoctorView.as_view(),
+        name="async-doctor-view",
+    ),
+    re_path(
+        r"^async/patient/(?P<slug>[a-zA-Z0-9_-]+)?/?$",
+        AsyncPatientView.as_view(),
+        name="async-patient-view",
+    ),
 ]
@@ -1,10 +1,17 @@
-from datetime import datetime
+from datetime import datetime, time, timedelta
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.forms.models import model_to_dict
-from django.db import IntegrityError
-from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.pagination import LimitOffsetPagination
 
 from .models import (
@@ -15,29 +22,193 @@ from .models import (
     MedicalHistory,
     Appointment,
 )
-from .serializers import DepartmentSerializer, PatientSerializer, DoctorSerializer
+from .serializers import (
+    AppointmentSerializer,
+    DepartmentSerializer,
+    PatientSerializer,
+    DoctorSerializer,
+    split_param,
+)
 from .enum import DayOfWeek
+from .pagination import APPOINTMENT_ORDERING, HospitalPagination, KeysetPagination
+from .availability import (
+    availability_changed,
+    availability_index,
+    parse_availability,
+    update_availability,
+)
+from .booking import BookingError, book_appointment
+from .bulk import (
+    EXPORTERS,
+    HISTORY_FIELDS,
+    PatientImporter,
+    UndecodableLine,
+    decode_lines,
+    export_rows,
+    parse_csv,
+    parse_jsonl,
+    spool_upload,
+)
+from .cache import cache_stats, cached_response, invalidate, invalidates
+from .conditional import conditional_response
+from .dashboard import (
+    counters_enabled,
+    department_dashboard,
+    refresh_counters,
+    schedule_changed,
+)
+from .flat import (
+    doctor_rows,
+    flat_serialization,
+    patient_rows,
+    serialize_doctors,
+    serialize_patients,
+)
+from .idempotency import idempotent
+from .metrics import render_metrics
+from .schedule import MAX_RANGE_DAYS, free_slots
+from .search import search_by_name
+
+# PATCH payload keys each model accepts, and the attribute each one sets
+DOCTOR_UPDATE_FIELDS = {
+    "name": "name",
+    "specialization": "specialization",
+    "contact_information": "contact_information",
+    "department": "department_id",
+}
+PATIENT_UPDATE_FIELDS = {
+    "name": "name",
+    "age": "age",
+    "gender": "gender",
+    "contact_information": "contact_information",
+    "assigned_doctor": "doctor_id",
+}
+
+
+def apply_updates(instance, payload, allowed_fields):
+    """
+    Copy the whitelisted payload keys onto instance and validate just those
+    fields. Returns the attributes set, for save(update_fields=...).
+    """
+    unknown = sorted(set(payload) - set(allowed_fields))
+    if unknown:
+        raise ValidationError(f"Unknown fields: {', '.join(unknown)}")
+    updated = [allowed_fields[key] for key in payload]
+    for key, value in payload.items():
+        setattr(instance, allowed_fields[key], value)
+    instance.clean_fields(
+        exclude=[
+            field.name
+            for field in instance._meta.concrete_fields
+            if field.attname not in updated
+        ]
+    )
+    return updated
+
+
+def get_query_date(request, name, default):
+    """A YYYY-MM-DD query param, or default when absent; ValueError if invalid"""
+    value = request.GET.get(name)
+    if not value:
+        return default
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid date: {value}")
+    return day
+
+
+def filter_dates(queryset, request, column):
+    """
+    Rows whose datetime `column` falls between ?from= and ?to=, inclusive
+    dates and each optional; ValueError if either is invalid
+    """
+    first_day = get_query_date(request, "from", None)
+    last_day = get_query_date(request, "to", None)
+    if first_day is not None:
+        start = timezone.make_aware(datetime.combine(first_day, time.min))
+        queryset = queryset.filter(**{f"{column}__gte": start})
+    if last_day is not None:
+        end = timezone.make_aware(
+            datetime.combine(last_day + timedelta(days=1), time.min)
+        )
+        queryset = queryset.filter(**{f"{column}__lt": end})
+    return queryset
+
+
+def describe_validation_error(error):
+    if not hasattr(error, "error_dict"):
+        return " ".join(error.messages)
+    return "; ".join(
+        f"{field}: {' '.join(messages)}"
+        for field, messages in error.message_dict.items()
+    )
 
 
 class DepartmentViewSet(viewsets.ModelViewSet):
     queryset = Department.objects.all()
     serializer_class = DepartmentSerializer
-    pagination_class = LimitOffsetPagination
+    pagination_class = HospitalPagination
     lookup_field = "slug"
+    # The listing's count only changes with the department table
+    count_entity = "department"
 
     def get_queryset(self):
         """Filter using slug"""
-        queryset = Department.objects.all()
+        queryset = Department.objects.order_by("created_at", "id")
         slug = self.request.query_params.get("slug", None)
         search = self.request.query_params.get("search", None)
         if slug is not None:
             queryset = queryset.filter(slug=slug)
         elif search is not None:
-            queryset = queryset.filter(Q(name__icontains=search))
+            queryset = search_by_name(queryset, search)
         return queryset
 
+    @conditional_response("department")
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_response("department")
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=["get"])
+    def dashboard(self, request, *args, **kwargs):
+        """Per-department counts, bookings and utilisation for the next ?days="""
+        try:
+            days = int(request.GET.get("days", 7))
+            first_day = get_query_date(request, "from", timezone.localdate())
+        except ValueError:
+            days = 0
+        if not 0 < days <= MAX_RANGE_DAYS:
+            return Response(
+                {
+                    "error": f"days must be between 1 and {MAX_RANGE_DAYS} "
+                    "and from a date (YYYY-MM-DD)"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            department_dashboard(first_day, days), status=status.HTTP_200_OK
+        )
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidate("department")
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate("department")
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate("department")
+
 
 class DoctorAPIView(APIView, LimitOffsetPagination):
+    count_entity = "doctor"
+
+    @invalidates("doctor")
+    @idempotent
     def post(self, request, *args, **kwargs):
         try:
             payload = request.data
@@ -77,6 +248,9 @@ class DoctorAPIView(APIView, LimitOffsetPagination):
 
             # Bulk Create Availability
             DoctorAvailability.objects.bulk_create(availability_instances)
+            availability_changed(doctor.id)
+            schedule_changed(doctor.department_id)
+            availability_index.load(doctor.id)
 
             return Response(model_to_dict(doctor), status=status.HTTP_201_CREATED)
         except Exception as _:
@@ -84,53 +258,54 @@ class DoctorAPIView(APIView, LimitOffsetPagination):
                 {"error": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+    @invalidates("doctor")
     def patch(self, request, *args, **kwargs):
         try:
             payload = request.data
             slug = kwargs.get("slug")
-            availability_data = payload.pop("availability", {})
-
-            # Update Doctor Entry
-            doctor = Doctor.objects.filter(slug=slug)
-            if len(doctor) == 0:
-                return Response(
-                    {"error": "No Doctor matches the given slug."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            doctor.update(**payload)
+            # A missing availability key leaves the schedule as it is
+            availability_data = payload.pop("availability", None)
+            schedule = None
+            if availability_data is not None:
+                try:
+                    schedule = parse_availability(availability_data)
+                except ValueError:
+                    return Response(
+                        {"error": "Invalid availability data"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
 
-            # Delete all Doctor Availability
-            DoctorAvailability.objects.filter(doctor_id=doctor[0].id).delete()
-            # Prepare Availability Data
-            availability_instances = []
-            for day, timing in availability_data.items():
+            with transaction.atomic():
+                # One locked fetch: concurrent PATCHes of the doctor queue here
                 try:
-                    day_value = DayOfWeek.from_string(day).value
-                    availability_instance = DoctorAvailability(
-                        doctor_id=doctor[0].id,
-                        day=day_value,
-                        start_time=timing["start_time"],
-                        end_time=timing["end_time"],
+                    doctor = Doctor.objects.select_for_update().get(slug=slug)
+                except Doctor.DoesNotExist:
+                    return Response(
+                        {"error": "No Doctor matches the given slug."},
+                        status=status.HTTP_400_BAD_REQUEST,
                     )
-                    availability_instances.append(availability_instance)
-                except KeyError:
+                try:
+                    update_fields = apply_updates(doctor, payload, DOCTOR_UPDATE_FIELDS)
+                except ValidationError as error:
                     return Response(
-                        {"error": "Invalid availability data"},
+                        {"error": describe_validation_error(error)},
                         status=status.HTTP_400_BAD_REQUEST,
                     )
+                if update_fields:
+                    doctor.save(update_fields=update_fields + ["updated_at"])
 
-            # Bulk Create Availability
-            DoctorAvailability.objects.bulk_create(availability_instances)
+                # Apply only the per-day differences to the schedule
+                if schedule is not None:
+                    if update_availability(doctor.id, schedule):
+                        schedule_changed(doctor.department_id)
 
-            return Response(
-                {"message": "Doctor Details Updated Successfully"},
-                status=status.HTTP_200_OK,
-            )
+            return Response(model_to_dict(doctor), status=status.HTTP_200_OK)
         except Exception as _:
             return Response(
                 {"error": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+    @invalidates("doctor")
     def delete(self, request, *args, **kwargs):
         try:
             slug = kwargs.get("slug")
@@ -144,6 +319,7 @@ class DoctorAPIView(APIView, LimitOffsetPagination):
                 )
 
             # Delete Doctor Entry
+            availability_index.discard(doctor.id)
             doctor.delete()
 
             return Response(
@@ -155,35 +331,62 @@ class DoctorAPIView(APIView, LimitOffsetPagination):
                 {"error": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-    def get(self, request, *args, **kwargs):
-        # Initialize the base queryset
-        queryset = Doctor.objects.all()
+    def get_queryset(self):
+        """Doctors matching the slug and query params, before eager loading"""
+        queryset = Doctor.objects.order_by("created_at", "id")
 
         # Get query params
-        slug = kwargs.get("slug")
-        search = request.GET.get("search")
-        specialization = request.GET.get("specialization")
+        slug = self.kwargs.get("slug")
+        search = self.request.GET.get("search")
+        specialization = self.request.GET.get("specialization")
 
         # Apply filters based on query params
         if slug:
             queryset = queryset.filter(slug=slug)
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = search_by_name(queryset, search)
         if specialization:
             queryset = queryset.filter(specialization=specialization)
+        return queryset
+
+    @conditional_response("doctor", "department", "patient")
+    @cached_response("doctor", "department", "patient")
+    def get(self, request, *args, **kwargs):
+        # ?fields= and ?expand=; nested relations are only loaded when expanded
+        fields, expand = DoctorSerializer.get_selection(request.query_params)
+        paginator = HospitalPagination()
+        if flat_serialization():
+            rows = doctor_rows(self.get_queryset(), fields, expand)
+            page = paginator.paginate_queryset(rows, request, view=self)
+            return paginator.get_paginated_response(
+                serialize_doctors(page, fields, expand, request)
+            )
+
+        queryset = DoctorSerializer.setup_eager_loading(
+            self.get_queryset(), fields, expand
+        )
 
         # Paginate the queryset before serialization
-        paginator = LimitOffsetPagination()
         result_page = paginator.paginate_queryset(queryset, request, view=self)
 
         # Serialize the paginated data
-        serializer = DoctorSerializer(result_page, many=True)
+        serializer = DoctorSerializer(
+            result_page,
+            many=True,
+            fields=fields,
+            expand=expand,
+            context={"request": request},
+        )
 
         # Return the paginated response
         return paginator.get_paginated_response(serializer.data)
 
 
 class PatientAPIView(APIView):
+    count_entity = "patient"
+
+    @invalidates("patient")
+    @idempotent
     def post(self, request, *args, **kwargs):
         try:
             payload = request.data
@@ -211,7 +414,7 @@ class PatientAPIView(APIView):
                     medications=medical_history["medications"],
                 )
             return Response(
-                {"message": "Patient Created Successfully"},
+                {"message": "Patient Created Successfully", "slug": patient.slug},
                 status=status.HTTP_201_CREATED,
             )
         except Exception as _:
@@ -219,37 +422,54 @@ class PatientAPIView(APIView):
                 {"error": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+    @invalidates("patient")
     def patch(self, request, *args, **kwargs):
         try:
             slug = kwargs.get("slug")
             payload = request.data
             medical_history = payload.pop("medical_history", None)
-            assigned_doctor = payload.pop("assigned_doctor", None)
-            if assigned_doctor:
-                payload["doctor_id"] = assigned_doctor
-
-            # Update Patient
-            patient = Patient.objects.filter(slug=slug)
-            if len(patient) == 0:
+            if medical_history is not None and (
+                not isinstance(medical_history, dict)
+                or not set(medical_history) <= set(HISTORY_FIELDS)
+            ):
                 return Response(
-                    {"error": "No Patient matches the given slug."},
+                    {"error": "Invalid medical_history"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            patient.update(**payload)
-            # Update Medical History Entry
-            if medical_history:
-                MedicalHistory.objects.filter(patient_id=patient[0].id).update(
-                    **medical_history
-                )
-            return Response(
-                {"message": "Patient Updated Successfully"},
-                status=status.HTTP_200_OK,
-            )
+
+            with transaction.atomic():
+                # Update Patient
+                try:
+                    patient = Patient.objects.select_for_update().get(slug=slug)
+                except Patient.DoesNotExist:
+                    return Response(
+                        {"error": "No Patient matches the given slug."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                try:
+                    update_fields = apply_updates(
+                        patient, payload, PATIENT_UPDATE_FIELDS
+                    )
+                except ValidationError as error:
+                    return Response(
+                        {"error": describe_validation_error(error)},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                if update_fields:
+                    patient.save(update_fields=update_fields + ["updated_at"])
+
+                # Update Medical History Entry
+                if medical_history:
+                    MedicalHistory.objects.filter(patient_id=patient.id).update(
+                        **medical_history, updated_at=timezone.now()
+                    )
+            return Response(model_to_dict(patient), status=status.HTTP_200_OK)
         except Exception as error:
             return Response(
                 {"error": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+    @invalidates("patient")
     def delete(self, request, *args, **kwargs):
         try:
             slug = kwargs.get("slug")
@@ -271,48 +491,234 @@ class PatientAPIView(APIView):
                 {"error": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-    def get(self, request, *args, **kwargs):
-        queryset = Patient.objects.all()
+    def get_queryset(self):
+        """Patients matching the slug and query params, before eager loading"""
+        queryset = Patient.objects.order_by("created_at", "id")
         # Fetch data from the database
-        slug = kwargs.get("slug", None)
-        search = request.GET.get("search", None)
+        slug = self.kwargs.get("slug", None)
+        search = self.request.GET.get("search", None)
         if slug:
             queryset = queryset.filter(slug=slug)
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = search_by_name(queryset, search)
+        return queryset
+
+    @conditional_response("patient", "doctor", "appointment")
+    @cached_response("patient", "doctor", "appointment")
+    def get(self, request, *args, **kwargs):
+        # ?fields= and ?expand=; nested relations are only loaded when expanded
+        fields, expand = PatientSerializer.get_selection(request.query_params)
+        paginator = HospitalPagination()
+        if flat_serialization():
+            rows = patient_rows(self.get_queryset(), fields, expand)
+            page = paginator.paginate_queryset(rows, request, view=self)
+            return paginator.get_paginated_response(
+                serialize_patients(page, fields, expand, request)
+            )
+
+        queryset = PatientSerializer.setup_eager_loading(
+            self.get_queryset(), fields, expand
+        )
 
         # Paginate the queryset before serialization
-        paginator = LimitOffsetPagination()
         result_page = paginator.paginate_queryset(queryset, request, view=self)
 
         # Serialize the paginated data
-        serializer = PatientSerializer(result_page, many=True)
+        serializer = PatientSerializer(
+            result_page,
+            many=True,
+            fields=fields,
+            expand=expand,
+            context={"request": request},
+        )
 
         # Return the paginated response
         return paginator.get_paginated_response(serializer.data)
 
 
+class BatchAPIView(APIView):
+    """
+    Many records by slug in one request: ?slugs=a,b,c, plus ?fields= and
+    ?expand= as on the list endpoint. One slug__in query loads the page and
+    each expanded relation is one more, however many slugs are asked for.
+    Results are keyed by slug in request order, null for slugs that match
+    nothing, which are also listed under not_found.
+    """
+
+    serializer_class = None
+    # The flat serialization functions for the model
+    rows = None
+    serialize = None
+
+    def get_slugs(self):
+        slugs = list(dict.fromkeys(split_param(self.request.query_params.get("slugs"))))
+        max_slugs = settings.BATCH_MAX_SLUGS
+        if not slugs:
+            raise ParseError("slugs is required")
+        if len(slugs) > max_slugs:
+            raise ParseError(f"At most {max_slugs} slugs per request")
+        return slugs
+
+    def get_queryset(self):
+        model = self.serializer_class.Meta.model
+        return model.objects.filter(slug__in=self.get_slugs()).order_by(
+            "created_at", "id"
+        )
+
+    def get(self, request, *args, **kwargs):
+        slugs = self.get_slugs()
+        fields, expand = self.serializer_class.get_selection(request.query_params)
+        # The results are keyed by slug, so it is read even when not selected
+        columns = fields if "slug" in fields else [*fields, "slug"]
+        if flat_serialization():
+            rows = list(self.rows(self.get_queryset(), columns, expand))
+            found = [row["slug"] for row in rows]
+            data = self.serialize(rows, fields, expand, request)
+        else:
+            instances = list(
+                self.serializer_class.setup_eager_loading(
+                    self.get_queryset(), columns, expand
+                )
+            )
+            found = [instance.slug for instance in instances]
+            data = self.serializer_class(
+                instances,
+                many=True,
+                fields=fields,
+                expand=expand,
+                context={"request": request},
+            ).data
+
+        results = dict.fromkeys(slugs)
+        results.update(zip(found, data))
+        return Response(
+            {
+                "results": results,
+                "not_found": [slug for slug in slugs if results[slug] is None],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class DoctorBatchAPIView(BatchAPIView):
+    serializer_class = DoctorSerializer
+    rows = staticmethod(doctor_rows)
+    serialize = staticmethod(serialize_doctors)
+
+    @conditional_response("doctor", "department", "patient")
+    @cached_response("doctor", "department", "patient")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class PatientBatchAPIView(BatchAPIView):
+    serializer_class = PatientSerializer
+    rows = staticmethod(patient_rows)
+    serialize = staticmethod(serialize_patients)
+
+    @conditional_response("patient", "doctor", "appointment")
+    @cached_response("patient", "doctor", "appointment")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class PatientImportAPIView(APIView):
+    permission_classes = [IsAdminUser]
+    parsers = {
+        "application/x-ndjson": parse_jsonl,
+        "application/jsonl": parse_jsonl,
+        "text/csv": parse_csv,
+    }
+
+    def post(self, request, *args, **kwargs):
+        """Import patients from a JSON Lines or CSV upload, streamed in batches"""
+        content_type = request.content_type.split(";")[0].strip()
+        parser = self.parsers.get(content_type)
+        if parser is None:
+            return Response(
+                {"error": "Upload JSON Lines or CSV"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        try:
+            batch_size = int(request.GET.get("batch_size", 500))
+        except ValueError:
+            batch_size = 0
+        if not 0 < batch_size <= 5000:
+            return Response(
+                {"error": "batch_size must be between 1 and 5000"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Read the body line by line instead of loading it through request.data.
+        # DRF has no stream without a Content-Length, as in a chunked upload.
+        stream = request.stream or request._request
+        try:
+            # Checked before any batch commits, so a bad line rejects the upload
+            spool = spool_upload(stream)
+        except UndecodableLine as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        with spool:
+            # Each batch commits on its own
+            summary = PatientImporter(batch_size=batch_size).run(
+                parser(decode_lines(spool))
+            )
+        if summary["created"]:
+            invalidate("patient")
+            # bulk_create skips the signals that maintain the counters
+            if counters_enabled():
+                refresh_counters()
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+class PatientExportAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """Stream every patient with history and appointments as JSON Lines or CSV"""
+        file_format = request.GET.get("file_format", "jsonl")
+        if file_format not in EXPORTERS:
+            return Response(
+                {"error": "file_format must be jsonl or csv"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            chunk_size = int(request.GET.get("chunk_size", 2000))
+        except ValueError:
+            chunk_size = 0
+        if not 0 < chunk_size <= 10000:
+            return Response(
+                {"error": "chunk_size must be between 1 and 10000"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        exporter, content_type = EXPORTERS[file_format]
+        response = StreamingHttpResponse(
+            exporter(export_rows(chunk_size=chunk_size)), content_type=content_type
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="patients.{file_format}"'
+        )
+        return response
+
+
 class DoctorAppointmentAPIView(APIView):
+    @invalidates("appointment")
+    @idempotent
     def post(self, request, *args, **kwargs):
         try:
-            slug = kwargs.get("patient_slug", None)
+            slug = kwargs.get("slug", None)
             payload = request.data
             # Current time
-            appointment_date = datetime.strptime(
-                payload["date"], "%Y-%m-%d %H:%M:%S.%f"
+            appointment_date = timezone.make_aware(
+                datetime.strptime(payload["date"], "%Y-%m-%d %H:%M:%S.%f")
             )
-            day_of_week = appointment_date.weekday()
 
             # Fetch Patient
             patient = Patient.objects.get(slug=slug)
-            doctor_availability = DoctorAvailability.objects.filter(
-                doctor_id=patient.doctor, day=day_of_week
-            )
-
-            if len(doctor_availability) > 0:
-                Appointment.objects.create(
-                    patient=patient, date=payload["date"], details=payload["details"]
-                )
+            try:
+                book_appointment(patient, appointment_date, payload["details"])
+            except BookingError as error:
+                return Response({"error": str(error)}, status=error.status_code)
             return Response(
                 {"message": "Appointment Created Successfullly"},
                 status=status.HTTP_201_CREATED,
@@ -321,3 +727,119 @@ class DoctorAppointmentAPIView(APIView):
             return Response(
                 {"error": "Something went wrong"}, status=status.HTTP_400_BAD_REQUEST
             )
+
+
+class DoctorSlotsAPIView(APIView):
+    def get(self, request, *args, **kwargs):
+        """Free appointment slots between ?from= and ?to= (inclusive dates)"""
+        try:
+            first_day = get_query_date(request, "from", timezone.localdate())
+            last_day = get_query_date(request, "to", first_day + timedelta(days=6))
+        except ValueError:
+            return Response(
+                {"error": "from and to must be dates (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 0 <= (last_day - first_day).days < MAX_RANGE_DAYS:
+            return Response(
+                {"error": f"to must be within {MAX_RANGE_DAYS} days after from"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            slots = free_slots(kwargs["slug"], first_day, last_day)
+        except Doctor.DoesNotExist:
+            return Response(
+                {"error": "No Doctor matches the given slug."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(
+            {
+                "from": first_day,
+                "to": last_day,
+                "slot_minutes": settings.APPOINTMENT_SLOT_MINUTES,
+                "slots": slots,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class DoctorPatientsAPIView(APIView):
+    def get(self, request, *args, **kwargs):
+        """
+        A doctor's patients by (created_at, id), keyset paginated, created
+        between ?from= and ?to=; each page is a range scan on
+        (doctor, created_at, id)
+        """
+        doctor_id = (
+            Doctor.objects.filter(slug=kwargs["slug"])
+            .values_list("id", flat=True)
+            .first()
+        )
+        if doctor_id is None:
+            return Response(
+                {"error": "No Doctor matches the given slug."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        try:
+            queryset = filter_dates(
+                Patient.objects.filter(doctor_id=doctor_id), request, "created_at"
+            )
+        except ValueError:
+            return Response(
+                {"error": "from and to must be dates (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(
+            [model_to_dict(patient) for patient in page]
+        )
+
+
+class PatientAppointmentsAPIView(APIView):
+    def get(self, request, *args, **kwargs):
+        """
+        A patient's appointments by (date, id), keyset paginated, dated
+        between ?from= and ?to=; each page is a range scan on (patient, date)
+        """
+        patient_id = (
+            Patient.objects.filter(slug=kwargs["slug"])
+            .values_list("id", flat=True)
+            .first()
+        )
+        if patient_id is None:
+            return Response(
+                {"error": "No Patient matches the given slug."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        try:
+            queryset = filter_dates(
+                Appointment.objects.filter(patient_id=patient_id), request, "date"
+            )
+        except ValueError:
+            return Response(
+                {"error": "from and to must be dates (YYYY-MM-DD)"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        paginator = KeysetPagination(APPOINTMENT_ORDERING)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(
+            AppointmentSerializer(page, many=True).data
+        )
+
+
+class CacheStatsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(cache_stats(), status=status.HTTP_200_OK)
+
+
+class MetricsAPIView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
@@ -50,6 +50,8 @@ THIRD_PARTY_APPS = []
 INSTALLED_APPS = THIRD_PARTY_APPS + LOCAL_APPS + SYSTEM_APPS
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    "hospital.metrics.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -91,14 +93,127 @@ DATABASES = {
         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
         "HOST": os.environ.get("SQL_HOST", "localhost"),
         "PORT": os.environ.get("SQL_PORT", "5432"),
+        # Seconds a connection outlives its request; 0 closes it after every
+        # request and "none" keeps it open for the life of the worker
+        "CONN_MAX_AGE": (
+            None
+            if os.environ.get("SQL_CONN_MAX_AGE", "").lower() == "none"
+            else int(os.environ.get("SQL_CONN_MAX_AGE") or 60)
+        ),
+        # Ping a reused connection before the first query of each request
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("SQL_CONN_HEALTH_CHECKS", 1))),
+        "OPTIONS": {},
     }
 }
 
-# Limit Offset Pagination
+# In-process connection pool for PostgreSQL; see "Database connections" in the
+# README for sizing. Connections go back to the pool after each request.
+if int(os.environ.get("SQL_POOL", 0)):
+    DATABASES["default"].update(
+        ENGINE="hospital.db.postgresql_pool",
+        CONN_MAX_AGE=0,
+        OPTIONS={
+            "pool": {
+                "max_size": int(os.environ.get("SQL_POOL_MAX_SIZE", 10)),
+                "timeout": float(os.environ.get("SQL_POOL_TIMEOUT", 10)),
+                "max_lifetime": float(os.environ.get("SQL_POOL_MAX_LIFETIME", 3600)),
+            }
+        },
+    )
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Read-through cache for doctor and patient GET responses (LRU + TTL)
+    "responses": {
+        "BACKEND": os.environ.get(
+            "RESPONSE_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("RESPONSE_CACHE_LOCATION", "responses"),
+        "TIMEOUT": int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 300)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1000)),
+        },
+    },
+    # Entity versions the response cache keys embed. Every worker process
+    # must see the same ones, so they live in the database by default (run
+    # createcachetable); Redis or Memcached work as well
+    "versions": {
+        "BACKEND": os.environ.get(
+            "VERSION_CACHE_BACKEND", "django.core.cache.backends.db.DatabaseCache"
+        ),
+        "LOCATION": os.environ.get("VERSION_CACHE_LOCATION", "hospital_versions"),
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
+# Set RESPONSE_CACHE_ALIAS to an empty string to disable response caching
+RESPONSE_CACHE_ALIAS = os.environ.get("RESPONSE_CACHE_ALIAS", "responses") or None
+VERSION_CACHE_ALIAS = "versions"
+
+# Appointment booking: slot length, patients per slot and retries on lock contention
+APPOINTMENT_SLOT_MINUTES = int(os.environ.get("APPOINTMENT_SLOT_MINUTES", 15))
+APPOINTMENT_SLOT_CAPACITY = int(os.environ.get("APPOINTMENT_SLOT_CAPACITY", 1))
+APPOINTMENT_BOOKING_RETRIES = int(os.environ.get("APPOINTMENT_BOOKING_RETRIES", 5))
+
+# Keep per-department counter rows for the dashboard up to date on every
+# write, so it reads them instead of counting; run rebuild_dashboard_counters
+# after turning this on or after bulk writes
+DASHBOARD_COUNTERS = bool(int(os.environ.get("DASHBOARD_COUNTERS", 0)))
+
+# Request timings: observations kept per view for the p50/p95/p99 served at
+# /api/metrics/, and the wall time (ms) above which a request is logged with
+# its slowest SQL statements; 0 turns the log off
+PERFORMANCE_WINDOW = int(os.environ.get("PERFORMANCE_WINDOW", 1000))
+SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", 500))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "hospital.performance": {"handlers": ["console"], "level": "WARNING"},
+    },
+}
+
+# Host id (0-65535) mixed into slug tokens next to the process id. Workers
+# on one host already differ by pid, so give each host or container its own
+# value; unset, it is hashed from the host name and may clash across hosts
+SLUG_NODE_ID = (
+    int(os.environ["SLUG_NODE_ID"]) if os.environ.get("SLUG_NODE_ID") else None
+)
+
+# Limit Offset Pagination, with opt-in keyset (?cursor=) mode; JSON is
+# encoded with orjson when it is installed
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_PAGINATION_CLASS": "hospital.pagination.HospitalPagination",
+    "PAGE_SIZE": int(os.environ.get("PAGE_SIZE", 100)),
+    "DEFAULT_RENDERER_CLASSES": [
+        "hospital.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
+# Build doctor and patient list payloads from .values() rows rather than
+# model instances and serializers; the output is the same
+FLAT_SERIALIZATION = bool(int(os.environ.get("FLAT_SERIALIZATION", 0)))
+
+# Rows of an expanded assigned_patients or appointments collection; the rest
+# are paged through /doctor/<slug>/patients/ and /patient/<slug>/appointments/
+NESTED_COLLECTION_LIMIT = int(os.environ.get("NESTED_COLLECTION_LIMIT", 20))
+
+# Most slugs one /doctor/batch/ or /patient/batch/ request may ask for
+BATCH_MAX_SLUGS = int(os.environ.get("BATCH_MAX_SLUGS", 100))
+
+# Seconds a POST response is kept for replay to retries with the same
+# Idempotency-Key; older ones are removed by purge_idempotency_keys
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 86400))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators